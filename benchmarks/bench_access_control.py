@@ -0,0 +1,129 @@
+"""Costo de las consultas de correos no autorizados y de actualizar ``last_used``.
+
+1. Rechazo: consultas de direcciones con dominios no autorizados (erratas)
+   a concurrencia fija. Sin índice cada una llega a IMAP (caché desactivada,
+   IMAP falso con latencia); con ``AccessIndex`` se rechazan en memoria.
+2. ``last_used``: ``--requests`` consultas de cuentas activas. La versión
+   anterior haría un UPDATE y un commit por petición; con el índice las
+   fechas se acumulan y se escriben con un UPDATE por lotes cada
+   LAST_USED_FLUSH_INTERVAL segundos.
+
+La base es un SQLite temporal en lugar de PostgreSQL para no depender de red.
+
+Uso:
+    python -m benchmarks.bench_access_control --concurrency 16 --duration 5 --requests 5000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.common import configure_fake_imap, summarize
+from benchmarks.corpus import seed_mailbox
+from benchmarks.fake_imap import FakeImapServer
+from benchmarks.replay import _drive_service
+
+
+class _Rejecting:
+    """Misma interfaz que el servicio: rechaza con el índice antes de consultar"""
+
+    def __init__(self, index, service):
+        self.index = index
+        self.service = service
+        self.rejected = 0
+
+    async def check_email_for_codes(self, email_address: str) -> dict:
+        if self.index.check(email_address):
+            self.rejected += 1
+            return {"has_code": False, "authorized": False}
+        return await self.service.check_email_for_codes(email_address)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--domains", type=int, default=1000)
+    parser.add_argument("--accounts", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--flush-every", type=int, default=500,
+                        help="Peticiones entre escrituras por lotes (simula el intervalo)")
+    args = parser.parse_args()
+
+    imap = FakeImapServer(latency=args.latency).start()
+    seed_mailbox(imap.mailbox, 200, 50)
+    configure_fake_imap(imap.address)
+    os.environ["CODE_CACHE_SIZE"] = "0"
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from src.config.database import Base
+    from src.models.authorized_domain import AuthorizedDomain
+    from src.models.email_account import EmailAccount
+    from src.services.access_control import AccessIndex, last_used_update
+    from src.services.email_service import EmailCodeService
+
+    path = os.path.join(tempfile.mkdtemp(), "access.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    sessions = sessionmaker(bind=engine)
+    accounts = [f"cuenta{i}@gmail.com" for i in range(args.accounts)]
+    with sessions() as session:
+        session.add_all(AuthorizedDomain(domain=f"cliente{i}.com", updated_at=datetime.utcnow())
+                        for i in range(args.domains))
+        session.add_all(EmailAccount(email=account) for account in accounts)
+        session.commit()
+
+    index = AccessIndex(sessions, enabled=True)
+    started = time.perf_counter()
+    index.refresh(full=True)
+    print(f"Índice cargado en {(time.perf_counter() - started) * 1000:.1f}ms: "
+          f"{args.domains} dominios, {args.accounts} cuentas")
+
+    rng = random.Random(0)
+
+    def typo() -> str:
+        return f"user{rng.randrange(10 ** 6)}@cliente{rng.randrange(args.domains)}.cmo"
+
+    print(f"\n== rechazo de dominios no autorizados (c={args.concurrency}, "
+          f"latencia IMAP {args.latency * 1000:.0f}ms) ==")
+    service = EmailCodeService()
+    for name, target in (("sin índice", service), ("con índice", _Rejecting(index, service))):
+        imap.reset_stats()
+        started = time.monotonic()
+        latencies = asyncio.run(_drive_service(target, typo, args.concurrency, args.duration))
+        elapsed = time.monotonic() - started
+        print(f"{summarize(name, latencies, elapsed)} "
+              f"comandos IMAP={sum(imap.commands.values())}")
+
+    print(f"\n== last_used de {args.requests} consultas de {args.accounts} cuentas ==")
+    picks = [rng.choice(accounts) for _ in range(args.requests)]
+    update = last_used_update()
+    started = time.perf_counter()
+    for account in picks:
+        with sessions() as session:
+            session.execute(update, {"account": account, "used": datetime.utcnow()})
+            session.commit()
+    per_request = time.perf_counter() - started
+    print(f"{'commit por petición':<22} {per_request:7.3f}s commits={args.requests}")
+
+    started = time.perf_counter()
+    commits = 0
+    for position, account in enumerate(picks, 1):
+        index.check(account)
+        if position % args.flush_every == 0:
+            commits += bool(index.flush())
+    commits += bool(index.flush())
+    batched = time.perf_counter() - started
+    print(f"{'write-behind':<22} {batched:7.3f}s commits={commits} "
+          f"filas={index.flushed} ({per_request / batched:.0f}x)")
+    imap.stop()
+
+
+if __name__ == "__main__":
+    main()
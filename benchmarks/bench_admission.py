@@ -0,0 +1,112 @@
+"""Latencia bajo sobrecarga con y sin control de admisión de la etapa IMAP.
+
+Con el IMAP falso lento (``--latency`` por comando), las consultas llegan en
+lazo abierto a ``--rate`` por segundo durante ``--duration`` segundos, cada
+una para un destinatario distinto (sin caché), por encima de lo que los
+``--pool-size`` cupos pueden atender. Además un cliente agresivo consulta el
+mismo correo ``--poller-rate`` veces por segundo.
+
+- ``sin control``: cola ilimitada y sin límite por destinatario (como antes)
+- ``con control``: IMAP_ADMISSION_QUEUE/IMAP_ADMISSION_WAIT y
+  RECIPIENT_RATE_LIMIT por defecto; el exceso se rechaza con 503/429
+
+Uso:
+    python -m benchmarks.bench_admission --rate 60 --duration 10 --latency 0.1
+"""
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter
+
+from fastapi import HTTPException
+
+from benchmarks.common import configure_fake_imap, percentile
+from benchmarks.fake_imap import FakeImapServer
+
+
+async def _open_loop(service, rate: float, poller_rate: float, duration: float) -> list:
+    """Lanza las consultas a ritmo fijo sin esperar respuestas; devuelve (cliente, status, s)"""
+    results = []
+
+    async def one(client: str, email_address: str):
+        started = time.perf_counter()
+        try:
+            await service.check_email_for_codes(email_address)
+            status = 200
+        except HTTPException as he:
+            status = he.status_code
+        results.append((client, status, time.perf_counter() - started))
+
+    async def arrivals(client: str, per_second: float, address_for):
+        tasks = []
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for i in range(int(per_second * duration)):
+            delay = start + i / per_second - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(one(client, address_for(i))))
+        await asyncio.gather(*tasks)
+
+    await asyncio.gather(
+        arrivals("normal", rate, lambda i: f"user{i}@example.com"),
+        arrivals("agresivo", poller_rate, lambda i: "poller@example.com"))
+    return results
+
+
+def _line(name: str, results: list, client: str):
+    rows = [(status, seconds) for who, status, seconds in results if who == client]
+    ok = [seconds for status, seconds in rows if status == 200]
+    statuses = Counter(status for status, _ in rows)
+    rejected = [seconds for status, seconds in rows if status != 200]
+    print(f"{name:<12} {client:<9} n={len(rows):5d} 200={statuses[200]:5d} "
+          f"503={statuses[503]:5d} 429={statuses[429]:5d} "
+          f"p50={percentile(ok, 50) * 1000:8.1f}ms p99={percentile(ok, 99) * 1000:8.1f}ms "
+          f"max={max(ok, default=0) * 1000:8.1f}ms "
+          f"rechazo_p99={percentile(rejected, 99) * 1000:6.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=60.0)
+    parser.add_argument("--poller-rate", type=float, default=20.0)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--pool-size", type=int, default=3)
+    args = parser.parse_args()
+
+    imap = FakeImapServer(latency=args.latency).start()
+    configure_fake_imap(imap.address)
+    os.environ["CODE_CACHE_SIZE"] = "0"
+    os.environ["IMAP_POOL_SIZE"] = str(args.pool_size)
+    os.environ["IMAP_REQUEST_TIMEOUT"] = "120"
+
+    from src.services import admission
+    from src.services.email_service import EmailCodeService
+
+    service = EmailCodeService()
+    with service.pool.connection():
+        pass  # conexiones abiertas antes de medir
+    print(f"Llegadas {args.rate:.0f}/s + agresivo {args.poller_rate:.0f}/s durante "
+          f"{args.duration:.0f}s, {args.pool_size} cupos, latencia IMAP "
+          f"{args.latency * 1000:.0f}ms/comando")
+    modes = {
+        "sin control": (admission.AdmissionLimiter(args.pool_size, 10 ** 6, 10 ** 6),
+                        admission.RecipientRateLimiter(0, 0)),
+        "con control": (admission.AdmissionLimiter(args.pool_size, args.pool_size * 8, 5.0),
+                        admission.RecipientRateLimiter(0.5, 5)),
+    }
+    for name, (limiter, rate_limiter) in modes.items():
+        service.admission = limiter
+        admission.recipient_limiter.rate = rate_limiter.rate
+        admission.recipient_limiter.burst = rate_limiter.burst
+        admission.recipient_limiter._buckets.clear()
+        results = asyncio.run(_open_loop(service, args.rate, args.poller_rate, args.duration))
+        for client in ("normal", "agresivo"):
+            _line(name, results, client)
+    imap.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Carga concurrente sobre /api/check-code y /api/status contra un IMAP falso lento.
+
+Compara la búsqueda en el executor IMAP (modo actual) con la búsqueda
+bloqueante dentro del event loop (comportamiento anterior) y reporta
+p50/p99 de ambos endpoints.
+
+Uso:
+    python -m benchmarks.bench_check_code_async --clients 16 --duration 10 --imap-latency 0.05
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import (
+    UvicornThread,
+    configure_fake_imap,
+    drive_load,
+    summarize,
+)
+from benchmarks.corpus import netflix_message
+from benchmarks.fake_imap import FakeImapServer
+
+
+async def _run_mode(port: int, args) -> tuple[list[float], list[float], float]:
+    started = time.monotonic()
+    code_task = drive_load(
+        port, lambda w, i: f"/api/check-code/user{(w + i) % args.recipients}@example.com",
+        args.clients, args.duration)
+    status_task = drive_load(port, lambda w, i: "/api/status", args.status_clients, args.duration)
+    code_latencies, status_latencies = await asyncio.gather(code_task, status_task)
+    return code_latencies, status_latencies, time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--status-clients", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--imap-latency", type=float, default=0.05,
+                        help="Segundos de latencia por comando IMAP")
+    parser.add_argument("--recipients", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+
+    imap = FakeImapServer(latency=args.imap_latency).start()
+    for i in range(args.messages):
+        imap.mailbox.append(netflix_message(f"user{i % args.recipients}@example.com"))
+    configure_fake_imap(imap.address)
+
+    import main as app_module
+    from src.services.email_service import EmailCodeService
+
+    executor_impl = EmailCodeService.check_email_for_codes
+
+    async def inline_impl(self, email_address: str) -> dict:
+        # Comportamiento anterior: imaplib y BeautifulSoup dentro del event loop
+        return self._check_blocking(email_address.lower())
+
+    print(f"IMAP falso con {args.messages} mensajes, "
+          f"latencia {args.imap_latency * 1000:.0f}ms/comando")
+    with UvicornThread(app_module.app) as server:
+        for mode, impl in (("inline (bloqueante)", inline_impl), ("executor", executor_impl)):
+            EmailCodeService.check_email_for_codes = impl
+            code, status, elapsed = asyncio.run(_run_mode(server.port, args))
+            print(f"\n== {mode} ==")
+            print(summarize("/api/check-code", code, elapsed))
+            print(summarize("/api/status", status, elapsed))
+        EmailCodeService.check_email_for_codes = executor_impl
+    imap.stop()
+
+
+if __name__ == "__main__":
+    main()
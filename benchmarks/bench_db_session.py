@@ -0,0 +1,106 @@
+"""Costo por petición de la sesión de base de datos en los endpoints.
+
+Compara, con peticiones ASGI en proceso (sin red), un endpoint que recibe la
+sesión anterior (``SessionLocal()`` en cada petición y engine con
+``echo=True``) contra el endpoint sin dependencia, que es como quedan
+/api/check-code y /api/test-auth. También mide una consulta real con cada
+engine para ver el costo del log de SQL.
+
+Se usa un SQLite temporal en lugar de PostgreSQL para no depender de red; la
+diferencia sin consulta no depende del motor porque no se toca la base.
+
+Uso:
+    python -m benchmarks.bench_db_session --requests 2000
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+
+def build_app(url: str) -> FastAPI:
+    legacy_engine = create_engine(url, echo=True)
+    legacy_sessions = sessionmaker(autocommit=False, autoflush=False, bind=legacy_engine)
+    tuned_engine = create_engine(url, pool_pre_ping=True, pool_recycle=1800)
+    tuned_sessions = sessionmaker(autocommit=False, autoflush=False, bind=tuned_engine)
+
+    def legacy_get_db():
+        db = legacy_sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def tuned_get_db():
+        db = tuned_sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+
+    @app.get("/anterior")
+    async def legacy(db=Depends(legacy_get_db)):
+        return {"ok": True}
+
+    @app.get("/sin-sesion")
+    async def no_session():
+        return {"ok": True}
+
+    @app.get("/anterior-consulta")
+    async def legacy_query(db=Depends(legacy_get_db)):
+        return {"ok": db.execute(text("SELECT 1")).scalar()}
+
+    @app.get("/nueva-consulta")
+    async def tuned_query(db=Depends(tuned_get_db)):
+        return {"ok": db.execute(text("SELECT 1")).scalar()}
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, path: str, requests: int) -> list[float]:
+    for _ in range(50):
+        await client.get(path)
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.get(path)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.text
+    return latencies
+
+
+async def run(requests: int):
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        # echo=True crea un handler sobre stdout: se descarta la salida, pero se paga
+        with contextlib.redirect_stdout(devnull):
+            app = build_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            print(f"{'endpoint':<22}{'media':>11}{'p50':>11}{'p99':>11}")
+            for path in ("/anterior", "/sin-sesion", "/anterior-consulta", "/nueva-consulta"):
+                latencies = await measure(client, path, requests)
+                ordered = sorted(latencies)
+                print(f"{path:<22}{statistics.fmean(latencies) * 1e6:>9.0f}us"
+                      f"{ordered[len(ordered) // 2] * 1e6:>9.0f}us"
+                      f"{ordered[int(len(ordered) * 0.99) - 1] * 1e6:>9.0f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Escalado del throughput de búsqueda de códigos de 1 a N buzones centrales.
+
+Para cada cantidad de buzones configura CENTRAL_INBOXES contra el IMAP falso
+(un buzón por usuario de LOGIN), reparte los destinatarios con el mismo
+anillo de hashing que usa el servicio y siembra cada buzón con sus correos.
+Luego ejecuta ``InboxShards.check_email_for_codes`` a concurrencia fija con
+la caché desactivada, de modo que cada consulta llega a IMAP en el buzón
+dueño. Mientras dura la carga siguen llegando correos nuevos.
+
+Uso:
+    python -m benchmarks.bench_inbox_shards --inboxes 1 2 4 --concurrency 32 --duration 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from benchmarks.common import configure_fake_imap, summarize
+from benchmarks.corpus import netflix_message, recipient_weights
+from benchmarks.fake_imap import FakeImapServer, FakeMailbox
+from benchmarks.replay import Arrivals, _drive_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--inboxes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--recipients", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--routing", choices=("hash", "learned"), default="hash")
+    parser.add_argument("--arrival-rate", type=float, default=5.0)
+    parser.add_argument("--imap-latency", type=float, default=0.02)
+    parser.add_argument("--pool-size", type=int, default=3,
+                        help="Conexiones IMAP por buzón (IMAP_POOL_SIZE)")
+    args = parser.parse_args()
+
+    imap = FakeImapServer(latency=args.imap_latency).start()
+    configure_fake_imap(imap.address)
+    # Sin caché: cada consulta cuesta al menos un SELECT en el buzón dueño
+    os.environ["CODE_CACHE_SIZE"] = "0"
+    os.environ["IMAP_POOL_SIZE"] = str(args.pool_size)
+
+    from src.services.imap_executor import shutdown_imap_executor
+    from src.services.imap_pool import close_all_pools
+    from src.services.inbox_shards import InboxShards
+    from src.services.inboxes import HashRing
+
+    rng = random.Random(0)
+    addresses = [f"user{i}@example.com" for i in range(args.recipients)]
+    weights = recipient_weights(args.recipients, "zipf")
+
+    def pick() -> str:
+        return rng.choices(addresses, weights)[0]
+
+    print(f"{args.concurrency} consultas concurrentes, {args.pool_size} conexiones por buzón, "
+          f"latencia {args.imap_latency * 1000:.0f}ms/comando, enrutamiento {args.routing}")
+    baseline = None
+    for count in args.inboxes:
+        accounts = [f"central{count}-{i}@gmail.com" for i in range(count)]
+        ring = HashRing(accounts)
+        for account in accounts:
+            imap.mailboxes[account] = FakeMailbox()
+        for _ in range(args.messages):
+            to = pick()
+            imap.mailboxes[ring.owner(to)].append(netflix_message(to))
+        os.environ["CENTRAL_INBOXES"] = ",".join(accounts)
+        shutdown_imap_executor()
+
+        shards = InboxShards(routing=args.routing)
+        # Primera pasada: cada buzón procesa los correos sembrados
+        asyncio.run(shards._lookup_all(shards.services, []))
+        imap.reset_stats()
+        started = time.monotonic()
+        with Arrivals(imap, addresses, weights, args.arrival_rate, rng,
+                      mailbox_for=lambda to: imap.mailboxes[ring.owner(to)]):
+            latencies = asyncio.run(_drive_service(shards, pick, args.concurrency, args.duration))
+        elapsed = time.monotonic() - started
+        close_all_pools()
+
+        rps = len(latencies) / elapsed
+        baseline = baseline or rps
+        print(f"{summarize(f'{count} buzones', latencies, elapsed)} "
+              f"escalado={rps / baseline:4.2f}x fan-out={shards.fan_outs} "
+              f"sesiones_max={imap.max_open_sessions}")
+    shutdown_imap_executor()
+    imap.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Micro-benchmark de la extracción del botón de código sobre correos guardados.
+
+Compara la búsqueda anterior (árbol completo de BeautifulSoup + find_all('a'))
+con el extractor por expresiones precompiladas: tiempo por correo y memoria
+máxima asignada (tracemalloc). Que ambos devuelvan lo mismo se verifica en
+tests/test_link_extractor.py.
+
+Uso:
+    python -m benchmarks.bench_link_extractor --iterations 200
+"""
+import argparse
+import email
+import time
+import tracemalloc
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from src.services.link_extractor import find_code_link
+
+SAMPLES_DIR = Path(__file__).parent / "samples"
+
+
+def legacy_find_code_link(body: str) -> tuple[str, str]:
+    """Implementación anterior de EmailCodeService (sin los logs por enlace)"""
+    soup = BeautifulSoup(body, 'lxml')
+    for link in soup.find_all('a'):
+        href = link.get('href', '')
+        text = link.get_text().lower()
+        style = link.get('style', '')
+        if ('netflix.com' in href and
+            ('codigo' in text or 'code' in text or
+             'obtener' in text or 'get' in text or
+             '#e50914' in style)):
+            return href, "netflix_code"
+        if ('netflix.com' in href and
+                ('actualizar' in text or 'update' in text)):
+            return href, "netflix_code"
+        if ('netflix.com' in href and
+                ('sí, la envié yo' in text or 'si, la envie yo' in text)):
+            return href, "netflix_home_update"
+    return None, None
+
+
+def load_bodies() -> dict[str, str]:
+    bodies = {}
+    for path in sorted(SAMPLES_DIR.glob("*.eml")):
+        message = email.message_from_bytes(path.read_bytes())
+        for part in message.walk():
+            if part.get_content_type() == "text/html":
+                bodies[path.name] = part.get_payload(decode=True).decode("utf-8", errors="ignore")
+                break
+    return bodies
+
+
+def measure(func, body: str, iterations: int) -> tuple[float, int]:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func(body)
+    elapsed = (time.perf_counter() - started) / iterations
+
+    tracemalloc.start()
+    func(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    bodies = load_bodies()
+    print(f"{'correo':<30}{'html':>9}{'anterior':>12}{'nuevo':>11}{'x':>7}"
+          f"{'mem ant.':>11}{'mem nueva':>11}")
+    for name, body in bodies.items():
+        old_time, old_peak = measure(legacy_find_code_link, body, args.iterations)
+        new_time, new_peak = measure(find_code_link, body, args.iterations)
+        print(f"{name:<30}{len(body) // 1024:>7}KB{old_time * 1000:>10.3f}ms"
+              f"{new_time * 1000:>9.3f}ms{old_time / new_time:>7.1f}"
+              f"{old_peak // 1024:>9}KB{new_peak // 1024:>9}KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Latencia de check_email_for_codes según la configuración de logging.
+
+Compara la configuración anterior (DEBUG, handler síncrono, sin muestreo)
+con el modo nuevo (INFO con cola y listener en segundo plano) y con DEBUG
+muestreado sobre la cola. Los registros van a un destino que simula un
+stdout lento (``--sink-delay`` por escritura), como un pipe de Docker
+saturado. Mientras dura la carga llegan correos nuevos, así que también se
+registran las validaciones y los enlaces de cada sincronización.
+
+Uso:
+    python -m benchmarks.bench_logging --concurrency 16 --duration 5 --sink-delay 0.0005
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.common import configure_fake_imap, summarize
+from benchmarks.corpus import recipient_weights, seed_mailbox
+from benchmarks.fake_imap import FakeImapServer
+from benchmarks.replay import Arrivals, _drive_service
+
+MODES = {
+    "anterior (DEBUG síncrono)": {"level": "DEBUG", "use_queue": False, "sample_every": 1},
+    "DEBUG con cola y muestreo": {"level": "DEBUG", "use_queue": True, "sample_every": 100},
+    "INFO con cola": {"level": "INFO", "use_queue": True, "sample_every": 1},
+}
+
+
+class SlowSink:
+    """Destino de registros que tarda ``delay`` segundos por escritura"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.writes = 0
+
+    def write(self, text: str):
+        self.writes += 1
+        if self.delay:
+            time.sleep(self.delay)
+
+    def flush(self):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--recipients", type=int, default=100)
+    parser.add_argument("--arrival-rate", type=float, default=50.0,
+                        help="Correos nuevos por segundo durante la carga")
+    parser.add_argument("--sink-delay", type=float, default=0.0005,
+                        help="Segundos por escritura del destino de los registros")
+    parser.add_argument("--imap-latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    imap = FakeImapServer(latency=args.imap_latency).start()
+    addresses = seed_mailbox(imap.mailbox, args.messages, args.recipients, "zipf", rng=rng)
+    weights = recipient_weights(args.recipients, "zipf")
+    configure_fake_imap(imap.address)
+
+    from src.config.logging_config import setup_logging, stop_logging
+    from src.services.code_cache import code_cache
+    from src.services.email_service import EmailCodeService
+
+    def pick() -> str:
+        return rng.choices(addresses, weights)[0]
+
+    print(f"{args.concurrency} consultas concurrentes, {args.arrival_rate:.0f} correos/s, "
+          f"destino de registros a {args.sink_delay * 1000:.2f}ms por escritura")
+    for name, options in MODES.items():
+        sink = SlowSink(args.sink_delay)
+        setup_logging(stream=sink, **options)
+        code_cache.clear()
+        started = time.monotonic()
+        with Arrivals(imap, addresses, weights, args.arrival_rate, rng):
+            latencies = asyncio.run(_drive_service(
+                EmailCodeService(), pick, args.concurrency, args.duration))
+        elapsed = time.monotonic() - started
+        stop_logging()
+        print(f"{summarize(name, latencies, elapsed)} registros={sink.writes}")
+    imap.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Pico de RSS al sincronizar un buzón grande con correos con imágenes.
+
+Siembra el IMAP falso (en este proceso) con ``--messages`` correos de Netflix
+con una imagen inline de ``--image-kb`` y, en un subproceso por modo, ejecuta
+una sincronización completa del buzón:
+
+- ``anterior``: FETCH del mensaje completo, ``email.message_from_bytes`` y
+  decodificación de la parte html desde el árbol ``Message``
+- ``streaming``: FETCH parcial y ``mime_reader.read_body``
+
+Cada subproceso reinicia su marca de RSS máximo (VmHWM) justo antes de
+sincronizar, así que el pico medido es solo el de la sincronización.
+
+Uso:
+    python -m benchmarks.bench_mime_reader --messages 200 --image-kb 1024
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.corpus import netflix_message
+from benchmarks.fake_imap import FakeImapServer
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _status_kb(field: str) -> int:
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith(field + ":"):
+            return int(line.split()[1])
+    return 0
+
+
+def _legacy_fetch_bodies(self, mail, uids):
+    """Implementación anterior: mensaje completo y árbol ``Message`` por correo"""
+    import email
+
+    from src.services.email_service import _iter_fetch_payloads
+
+    _, msg_data = mail.uid("FETCH", b",".join(uids), "(BODY.PEEK[])")
+    bodies = {}
+    for uid, raw in _iter_fetch_payloads(msg_data):
+        message = email.message_from_bytes(raw)
+        for part in message.walk():
+            if part.get_content_type() == "text/html":
+                bodies[uid] = part.get_payload(decode=True).decode("utf-8", errors="ignore")
+                break
+    return bodies
+
+
+def child(mode: str):
+    from src.services.email_service import EmailCodeService
+
+    if mode == "anterior":
+        EmailCodeService._fetch_bodies = _legacy_fetch_bodies
+    service = EmailCodeService()
+    with service.pool.connection():
+        pass  # conexión abierta antes de medir
+    try:
+        # Reinicia VmHWM (Linux): el pico pasa a ser el RSS actual
+        Path("/proc/self/clear_refs").write_text("5")
+    except OSError:
+        pass
+    before = _status_kb("VmRSS")
+    started = time.perf_counter()
+    service._sync_blocking()
+    elapsed = time.perf_counter() - started
+    codes = len(service.mailbox_sync.recent_entries())
+    print(json.dumps({"before": before, "peak": _status_kb("VmHWM"),
+                      "seconds": elapsed, "codes": codes}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--image-kb", type=int, default=1024)
+    parser.add_argument("--child", choices=("anterior", "streaming"))
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+        return
+
+    imap = FakeImapServer().start()
+    for i in range(args.messages):
+        imap.mailbox.append(netflix_message(f"user{i}@example.com",
+                                            image_bytes=args.image_kb * 1024))
+    env = {
+        **os.environ,
+        "GMAIL_APP_PASSWORD": "benchmark",
+        "IMAP_SERVER": imap.address[0],
+        "IMAP_PORT": str(imap.address[1]),
+        "IMAP_SSL": "false",
+        "SYNC_STORE_PATH": "",
+        "LOG_LEVEL": "WARNING",
+    }
+    print(f"{args.messages} correos de ~{args.image_kb}KB (imagen inline después del html)")
+    for mode in ("anterior", "streaming"):
+        imap.reset_stats()
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_mime_reader", "--child", mode],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        growth = (result['peak'] - result['before']) / 1024
+        print(f"{mode:<10} RSS {result['before'] / 1024:7.1f}MB -> pico "
+              f"{result['peak'] / 1024:7.1f}MB (+{growth:6.1f}MB) "
+              f"{result['seconds']:6.2f}s códigos={result['codes']} "
+              f"IMAP={imap.bytes_sent / 1024 / 1024:7.1f}MB")
+    imap.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Memoria de las peticiones aparcadas en /api/check-code/{email}/wait.
+
+Levanta ``uvicorn main:app`` (un proceso) contra el IMAP falso con el
+ingestor activo, aparca N conexiones de long-poll repartidas entre varios
+destinatarios y mide el RSS del servidor antes y después. Luego agrega un
+correo por destinatario y mide cuánto tardan en responder todas las
+peticiones aparcadas.
+
+Uso:
+    python -m benchmarks.bench_parked_waits --connections 2000 --recipients 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import HttpClient, free_port, percentile
+from benchmarks.corpus import netflix_message
+from benchmarks.fake_imap import FakeImapServer
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def rss_kb(pid: int) -> int:
+    for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1])
+    return 0
+
+
+async def stats(port: int) -> dict:
+    client = HttpClient(port)
+    try:
+        _, payload = await client.get("/api/stats")
+    finally:
+        await client.close()
+    return json.loads(payload)["data"]
+
+
+async def wait_ready(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await stats(port))["ingester"]["state"] == "ready":
+                return
+        except (OSError, ValueError, KeyError, asyncio.IncompleteReadError):
+            pass
+        await asyncio.sleep(0.3)
+    raise RuntimeError("El ingestor no quedó listo")
+
+
+async def run(imap: FakeImapServer, pid: int, port: int, args):
+    await wait_ready(port)
+    await asyncio.sleep(0.5)
+    base_rss = rss_kb(pid)
+
+    started_at = {}
+    finished_at = {}
+
+    async def parked(index: int):
+        client = HttpClient(port)
+        try:
+            recipient = f"wait{index % args.recipients}@example.com"
+            started_at[index] = time.monotonic()
+            status, payload = await client.get(
+                f"/api/check-code/{recipient}/wait?timeout={args.timeout}")
+            if status == 200 and json.loads(payload)["data"]["has_code"]:
+                finished_at[index] = time.monotonic()
+        finally:
+            await client.close()
+
+    tasks = []
+    for index in range(args.connections):
+        tasks.append(asyncio.create_task(parked(index)))
+        if index % 200 == 199:
+            await asyncio.sleep(0.05)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if (await stats(port))["code_waiters"]["waiting"] >= args.connections:
+            break
+        await asyncio.sleep(0.2)
+    await asyncio.sleep(0.5)
+    parked_rss = rss_kb(pid)
+    waiting = (await stats(port))["code_waiters"]
+
+    delivered_at = time.monotonic()
+    for index in range(args.recipients):
+        imap.mailbox.append(netflix_message(f"wait{index}@example.com"))
+    await asyncio.gather(*tasks)
+
+    wake = [finished_at[i] - delivered_at for i in finished_at]
+    print(f"conexiones aparcadas:  {waiting['waiting']} ({waiting['recipients']} destinatarios)")
+    print(f"RSS servidor:          {base_rss / 1024:.1f}MB -> {parked_rss / 1024:.1f}MB")
+    print(f"memoria por conexión:  {(parked_rss - base_rss) / max(1, args.connections):.1f}KB")
+    print(f"respondidas con código: {len(finished_at)}/{args.connections}")
+    if wake:
+        print(f"tiempo hasta responder tras el correo: p50={percentile(wake, 50) * 1000:.0f}ms "
+              f"p99={percentile(wake, 99) * 1000:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=2000)
+    parser.add_argument("--recipients", type=int, default=50)
+    parser.add_argument("--timeout", type=int, default=120)
+    args = parser.parse_args()
+
+    imap = FakeImapServer().start()
+    imap.mailbox.append(netflix_message("seed@example.com", kind="other"))
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "GMAIL_APP_PASSWORD": "benchmark",
+            "IMAP_SERVER": imap.address[0],
+            "IMAP_PORT": str(imap.address[1]),
+            "IMAP_SSL": "false",
+            "IMAP_INGESTER_ENABLED": "true",
+            "SYNC_STORE_PATH": os.path.join(tmp, "sync_state.db"),
+        }
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+             "--log-level", "warning", "--no-access-log", "--backlog", "4096"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            asyncio.run(run(imap, process.pid, port, args))
+        finally:
+            process.terminate()
+            process.wait(15)
+    imap.stop()
+
+
+if __name__ == "__main__":
+    main()
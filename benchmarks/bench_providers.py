@@ -0,0 +1,90 @@
+"""Tráfico IMAP de sincronizar varios proveedores: un barrido por proveedor vs uno combinado.
+
+Siembra el IMAP falso con correos de Netflix, Disney+, Max y correo ajeno y
+ejecuta ``--rounds`` sincronizaciones incrementales, llegando
+``--per-round`` correos nuevos antes de cada una:
+
+- ``por proveedor``: un ``MailboxSync`` por proveedor, cada uno con su
+  SELECT/SEARCH/FETCH (lo que costaría agregar proveedores sin el registro)
+- ``combinado``: un solo ``MailboxSync`` con todos los remitentes en OR y
+  despacho por remitente
+
+Uso:
+    python -m benchmarks.bench_providers --messages 300 --rounds 20 --per-round 10
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import configure_fake_imap
+from benchmarks.corpus import netflix_message, provider_message
+from benchmarks.fake_imap import FakeImapServer
+
+KINDS = ("netflix", "disney", "max", "spam")
+
+
+def _deliver(mailbox, rng: random.Random, count: int, recipients: int):
+    for _ in range(count):
+        to = f"user{rng.randrange(recipients)}@example.com"
+        kind = rng.choice(KINDS)
+        mailbox.append(netflix_message(to) if kind == "netflix" else provider_message(to, kind))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--per-round", type=int, default=10)
+    parser.add_argument("--recipients", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    imap = FakeImapServer(latency=args.latency).start()
+    configure_fake_imap(imap.address)
+
+    from src.services.email_service import CODE_VALIDITY_SECONDS, EmailCodeService
+    from src.services.mailbox_sync import MailboxSync
+    from src.services.providers import ProviderIndex, get_provider_index
+    from src.services.sync_store import SyncStore
+
+    service = EmailCodeService()
+    index = get_provider_index()
+    modes = {
+        "por proveedor": [ProviderIndex([provider]) for provider in index.providers],
+        "combinado": [index],
+    }
+    print(f"{args.messages} correos iniciales, {args.rounds} rondas de {args.per_round} "
+          f"correos nuevos, latencia {args.latency * 1000:.0f}ms/comando, "
+          f"proveedores: {', '.join(index.names)}")
+    for mode, indexes in modes.items():
+        imap.mailbox.messages.clear()
+        rng = random.Random(0)
+        _deliver(imap.mailbox, rng, args.messages, args.recipients)
+        store = SyncStore(":memory:")
+        syncs = []
+        for provider_index in indexes:
+            sync = MailboxSync(service, store, provider_index, CODE_VALIDITY_SECONDS)
+            sync.key = f"{sync.key}/{'+'.join(provider_index.names)}"
+            syncs.append(sync)
+
+        imap.reset_stats()
+        codes = 0
+        started = time.perf_counter()
+        with service.pool.connection() as mail:
+            for round_number in range(args.rounds + 1):
+                if round_number:
+                    _deliver(imap.mailbox, rng, args.per_round, args.recipients)
+                for sync in syncs:
+                    codes += len(sync.sync(mail))
+        elapsed = time.perf_counter() - started
+        store.close()
+
+        commands = {name: imap.commands.get(name, 0) for name in ("SELECT", "SEARCH", "FETCH")}
+        print(f"{mode:<14} {elapsed:6.2f}s códigos={codes:5d} "
+              + " ".join(f"{name}={count:4d}" for name, count in commands.items())
+              + f" IMAP={imap.bytes_sent / 1024:8.1f}KB")
+    imap.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Workers de uvicorn con índice por worker frente a índice compartido.
+
+Levanta ``uvicorn main:app --workers N`` como subproceso contra el IMAP falso
+y mide, para cada número de workers, el throughput de /api/check-code y las
+sesiones IMAP abiertas. Sin índice compartido cada worker inicia su propio
+ingestor; con SHARED_INDEX_ENABLED=true solo el líder abre IMAP y el resto
+lee el store SQLite.
+
+Uso:
+    python -m benchmarks.bench_shared_index --workers 1 2 4 --duration 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import HttpClient, drive_load, free_port, summarize
+from benchmarks.corpus import netflix_message
+from benchmarks.fake_imap import FakeImapServer
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+async def _wait_ready(port: int, workers: int, timeout: float = 60) -> bool:
+    """Espera a que todos los workers respondan con el índice listo"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        pids = set()
+        try:
+            for _ in range(workers * 8):
+                client = HttpClient(port)
+                try:
+                    _, payload = await client.get("/api/stats")
+                finally:
+                    await client.close()
+                ingester = json.loads(payload)["data"]["ingester"]
+                if ingester["state"] == "ready":
+                    pids.add(ingester["pid"])
+            if len(pids) >= workers:
+                return True
+        except (OSError, ValueError, KeyError, asyncio.IncompleteReadError):
+            pass
+        await asyncio.sleep(0.5)
+    return False
+
+
+def _run(imap: FakeImapServer, workers: int, shared: bool, args) -> str:
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "GMAIL_APP_PASSWORD": "benchmark",
+            "IMAP_SERVER": imap.address[0],
+            "IMAP_PORT": str(imap.address[1]),
+            "IMAP_SSL": "false",
+            "IMAP_INGESTER_ENABLED": "true",
+            "SHARED_INDEX_ENABLED": "true" if shared else "false",
+            "SYNC_STORE_PATH": os.path.join(tmp, "sync_state.db"),
+            "SHARED_INDEX_LOCK": os.path.join(tmp, "sync_state.lock"),
+        }
+        imap.reset_stats()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--workers", str(workers),
+             "--port", str(port), "--log-level", "warning", "--no-access-log"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not asyncio.run(_wait_ready(port, workers)):
+                return f"{workers} workers: el índice no quedó listo"
+            started = time.monotonic()
+            latencies = asyncio.run(drive_load(
+                port, lambda w, i: f"/api/check-code/user{(w + i) % args.recipients}@example.com",
+                args.clients, args.duration))
+            elapsed = time.monotonic() - started
+            return (f"{summarize(f'{workers} workers', latencies, elapsed)} "
+                    f"LOGIN={imap.commands['LOGIN']} sesiones_max={imap.max_open_sessions}")
+        finally:
+            process.terminate()
+            process.wait(15)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=8.0)
+    parser.add_argument("--recipients", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--imap-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    imap = FakeImapServer(latency=args.imap_latency).start()
+    for i in range(args.messages):
+        imap.mailbox.append(netflix_message(f"user{i % args.recipients}@example.com"))
+
+    for shared in (False, True):
+        title = "índice compartido (líder único)" if shared else "ingestor por worker"
+        print(f"\n== {title} ==")
+        for workers in args.workers:
+            print(_run(imap, workers, shared, args))
+    imap.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Arranque de workers: importación, tiempo hasta la primera consulta y memoria.
+
+1. ``import main`` en un proceso nuevo, ``--runs`` veces (mediana).
+2. ``spawn``: ``--workers`` procesos ``uvicorn main:app`` independientes,
+   como ``uvicorn --workers N``: cada uno importa todo por su cuenta.
+3. ``preload+fork``: un maestro importa main con APP_PRELOAD=true y hace
+   fork de los workers, que corren uvicorn; es lo que hace
+   ``gunicorn --preload -k uvicorn.workers.UvicornWorker`` (no hace falta
+   gunicorn para medirlo).
+
+Para cada worker se mide, desde que nace el proceso (o desde el fork), el
+primer /health 200 y la primera respuesta de /api/check-code, y la memoria
+privada (Private_Clean + Private_Dirty de ``/proc/<pid>/smaps_rollup``,
+solo Linux) tras esa consulta: con preload lo heredado del maestro se
+comparte. El IMAP falso tarda ``--login-latency`` en LOGIN (TLS y
+autenticación de Gmail); con ``--warm 1`` (IMAP_POOL_WARM) el worker abre
+esa conexión mientras arranca.
+
+Uso:
+    python -m benchmarks.bench_startup --workers 4 --runs 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.common import HttpClient, configure_fake_imap, free_port
+from benchmarks.corpus import netflix_message
+from benchmarks.fake_imap import FakeImapServer
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _private_kb(pid: int) -> int:
+    """Memoria privada del proceso en KB (0 si no hay /proc)"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as rollup:
+            fields = dict(line.split(":", 1) for line in rollup if ":" in line)
+    except OSError:
+        return 0
+    return sum(int(fields.get(name, "0 kB").split()[0])
+               for name in ("Private_Clean", "Private_Dirty"))
+
+
+async def _first_request(port: int, path: str, started: float, timeout: float = 60) -> tuple:
+    """Segundos desde ``started`` hasta el primer /health 200 y la primera respuesta de ``path``"""
+    deadline = time.monotonic() + timeout
+    health = None
+    while time.monotonic() < deadline:
+        client = HttpClient(port)
+        try:
+            if health is None:
+                status, _ = await client.get("/health")
+                if status != 200:
+                    await asyncio.sleep(0.005)
+                    continue
+                health = time.time() - started
+            status, _ = await client.get(path)
+            return health, time.time() - started, status
+        except (OSError, asyncio.IncompleteReadError):
+            await asyncio.sleep(0.005)
+        finally:
+            await client.close()
+    raise TimeoutError(f"El worker del puerto {port} no respondió")
+
+
+async def _measure(workers: list) -> list:
+    """workers: (pid, puerto, instante de nacimiento, ruta) -> (pid, health, first, status)"""
+    results = await asyncio.gather(*(_first_request(port, path, started)
+                                     for _, port, started, path in workers))
+    return [(pid, *result) for (pid, *_), result in zip(workers, results)]
+
+
+def _import_time(env: dict, runs: int) -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    samples = [float(subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                                    capture_output=True, text=True, check=True).stdout)
+               for _ in range(runs)]
+    return statistics.median(samples)
+
+
+def _spawn(env: dict, count: int) -> tuple:
+    processes, workers = [], []
+    for position in range(count):
+        port = free_port()
+        started = time.time()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+             "--log-level", "warning", "--no-access-log"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        processes.append(process)
+        workers.append((process.pid, port, started, f"/api/check-code/user{position}@example.com"))
+    return processes, workers
+
+
+def _preload_fork(env: dict, count: int) -> tuple:
+    ports = [free_port() for _ in range(count)]
+    started = time.time()
+    master = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.bench_startup", "--master",
+         ",".join(map(str, ports))],
+        cwd=ROOT, env={**env, "APP_PRELOAD": "true"}, stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL, text=True)
+    workers = []
+    for position in range(count):
+        forked = json.loads(master.stdout.readline())
+        workers.append((forked["pid"], forked["port"], forked["forked"],
+                        f"/api/check-code/user{position}@example.com"))
+    return [master], workers, workers[0][2] - started
+
+
+def _run_master(ports: list[int]):
+    """Maestro de preload: importa la app una vez y hace fork de un uvicorn por puerto"""
+    import uvicorn
+
+    import main as app_module
+
+    children = []
+    for port in ports:
+        forked = time.time()
+        pid = os.fork()
+        if pid == 0:
+            config = uvicorn.Config(app_module.app, host="127.0.0.1", port=port,
+                                    log_level="warning", access_log=False)
+            uvicorn.Server(config).run()
+            os._exit(0)
+        children.append(pid)
+        print(json.dumps({"pid": pid, "port": port, "forked": forked}), flush=True)
+
+    def stop(*_):
+        for child in children:
+            os.kill(child, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    for _ in children:
+        os.wait()
+
+
+def _report(name: str, measured: list, extra: str = ""):
+    health = [row[1] for row in measured]
+    first = [row[2] for row in measured]
+    memory = [_private_kb(row[0]) for row in measured]
+    statuses = sorted({row[3] for row in measured})
+    print(f"{name:<14} workers={len(measured)} "
+          f"health_p50={statistics.median(health) * 1000:7.0f}ms "
+          f"primera_consulta_p50={statistics.median(first) * 1000:7.0f}ms "
+          f"todas_listas={max(first) * 1000:7.0f}ms "
+          f"privada_media={statistics.fmean(memory) / 1024:6.1f}MB "
+          f"status={statuses}{extra}")
+
+
+def _stop(processes: list):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait(15)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--login-latency", type=float, default=0.3)
+    parser.add_argument("--warm", type=int, default=1, help="IMAP_POOL_WARM de los workers")
+    parser.add_argument("--master", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.master:
+        _run_master([int(port) for port in args.master.split(",")])
+        return
+
+    imap = FakeImapServer(latency={"LOGIN": args.login_latency}).start()
+    for position in range(args.workers):
+        imap.mailbox.append(netflix_message(f"user{position}@example.com"))
+    configure_fake_imap(imap.address)
+    env = {**os.environ, "IMAP_POOL_WARM": str(args.warm), "PYTHONPATH": str(ROOT)}
+
+    print(f"import main (mediana de {args.runs}): {_import_time(env, args.runs) * 1000:.0f}ms")
+    print(f"LOGIN IMAP {args.login_latency * 1000:.0f}ms, IMAP_POOL_WARM={args.warm}")
+
+    processes, workers = _spawn(env, args.workers)
+    try:
+        _report("spawn", asyncio.run(_measure(workers)))
+    finally:
+        _stop(processes)
+
+    processes, workers, preload_seconds = _preload_fork(env, args.workers)
+    try:
+        _report("preload+fork", asyncio.run(_measure(workers)),
+                f" precarga_maestro={preload_seconds * 1000:.0f}ms")
+    finally:
+        _stop(processes)
+    imap.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Utilidades compartidas por los benchmarks: servidor HTTP local, cliente y percentiles."""
+import asyncio
+import os
+import socket
+import statistics
+import threading
+import time
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def configure_fake_imap(address: tuple[str, int]):
+    """Apunta el servicio al servidor IMAP falso (antes de importar main)"""
+    os.environ.setdefault("GMAIL_APP_PASSWORD", "benchmark")
+    os.environ["IMAP_SERVER"] = address[0]
+    os.environ["IMAP_PORT"] = str(address[1])
+    os.environ["IMAP_SSL"] = "false"
+    os.environ.setdefault("IMAP_INGESTER_ENABLED", "false")
+    # Sin PostgreSQL: no se filtran los correos por dominio autorizado
+    os.environ.setdefault("ACCESS_CONTROL_ENABLED", "false")
+    # Estado de sincronización solo en memoria: cada corrida empieza en frío
+    os.environ.setdefault("SYNC_STORE_PATH", "")
+    # Los benchmarks miden throughput: sin límite por destinatario ni rechazo por cola
+    os.environ.setdefault("RECIPIENT_RATE_LIMIT", "0")
+    os.environ.setdefault("IMAP_ADMISSION_QUEUE", "100000")
+    os.environ.setdefault("IMAP_ADMISSION_WAIT", "300")
+    # Las conexiones las abre la primera consulta medida, como antes del precalentamiento
+    os.environ.setdefault("IMAP_POOL_WARM", "0")
+    # Los registros INFO por consulta ensuciarían la salida del benchmark
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(name: str, latencies: list[float], elapsed: float) -> str:
+    if not latencies:
+        return f"{name:<28} sin muestras"
+    return (f"{name:<28} n={len(latencies):<6} rps={len(latencies) / elapsed:8.1f} "
+            f"p50={percentile(latencies, 50) * 1000:8.2f}ms "
+            f"p99={percentile(latencies, 99) * 1000:8.2f}ms "
+            f"media={statistics.fmean(latencies) * 1000:8.2f}ms")
+
+
+class UvicornThread:
+    """Ejecuta la app en un uvicorn real dentro de un hilo."""
+
+    def __init__(self, app, port: int = None):
+        import uvicorn
+
+        self.port = port or free_port()
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port,
+                                log_level="warning", access_log=False)
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started and time.monotonic() < deadline:
+            time.sleep(0.02)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(10)
+
+
+class HttpClient:
+    """Cliente HTTP/1.1 mínimo con keep-alive, sin dependencias externas."""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method: str, path: str, body: bytes = b"",
+                      headers: dict = None) -> tuple[int, bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+        lines = [f"{method} {path} HTTP/1.1", "Host: localhost",
+                 f"Content-Length: {len(body)}"]
+        lines += [f"{key}: {value}" for key, value in (headers or {}).items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        status = int(status_line.split()[1])
+        length = 0
+        for line in header_lines:
+            if line.lower().startswith("content-length:"):
+                length = int(line.split(":", 1)[1])
+        payload = await self.reader.readexactly(length) if length else b""
+        return status, payload
+
+    async def get(self, path: str) -> tuple[int, bytes]:
+        return await self.request("GET", path)
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+            self.writer = None
+
+
+async def drive_load(port: int, path_for, clients: int, duration: float) -> list[float]:
+    """Lanza ``clients`` clientes keep-alive durante ``duration`` segundos
+
+    Args:
+        path_for: (cliente, iteración) -> ruta a pedir
+    """
+    latencies = []
+    deadline = time.monotonic() + duration
+
+    async def worker(worker_id: int):
+        client = HttpClient(port)
+        iteration = 0
+        try:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                status, _ = await client.get(path_for(worker_id, iteration))
+                latencies.append(time.perf_counter() - started)
+                if status >= 500:
+                    print(f"  respuesta {status} en {path_for(worker_id, iteration)}")
+                iteration += 1
+        finally:
+            await client.close()
+
+    await asyncio.gather(*(worker(i) for i in range(clients)))
+    return latencies
@@ -0,0 +1,134 @@
+"""Generador de correos sintéticos (Netflix y otros proveedores) para el servidor IMAP falso."""
+from datetime import datetime, timedelta, timezone
+from email.mime.image import MIMEImage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import format_datetime
+import random
+import uuid
+
+NETFLIX_FROM = "Netflix <info@account.netflix.com>"
+
+
+def netflix_message(to: str, date: datetime = None, kind: str = "code",
+                    filler_links: int = 40, image_bytes: int = 0) -> bytes:
+    """Construye un correo con la estructura de las plantillas de Netflix.
+
+    Args:
+        to: Destinatario (cabecera To)
+        date: Fecha del correo (ahora por defecto)
+        kind: "code" (botón Obtener código), "home" (Sí, la envié yo) o "other"
+        filler_links: Enlaces de relleno antes del botón, como en las plantillas reales
+        image_bytes: Tamaño de una imagen inline después del html (0 = sin imagen)
+    """
+    date = date or datetime.now(timezone.utc)
+    guid = uuid.uuid4().hex
+    links = "".join(
+        f'<a href="https://www.netflix.com/browse?trkid={i}" style="color:#a9a6a6">Enlace {i}</a>'
+        for i in range(filler_links))
+    if kind == "code":
+        subject = "Tu código de acceso temporal de Netflix"
+        button = (f'<a href="https://www.netflix.com/account/travel/verify?nftoken=tk'
+                  f'&messageGuid={guid}" style="background-color:#e50914;color:#fff">'
+                  f'Obtener código</a>')
+    elif kind == "home":
+        subject = "Cómo actualizar tu hogar con Netflix"
+        button = (f'<a href="https://www.netflix.com/account/update-primary-location'
+                  f'?nftoken=tk&messageGuid={guid}" style="background-color:#e50914">'
+                  f'Sí, la envié yo</a>')
+    else:
+        subject = "Novedades en Netflix"
+        button = ""
+    html = ("<html><head><style>td{font-family:Arial}</style></head><body>"
+            f"<table><tr><td>{links}</td></tr><tr><td>{button}</td></tr>"
+            "</table></body></html>")
+
+    body = MIMEMultipart("alternative")
+    body.attach(MIMEText("Abre este correo en un cliente compatible con HTML.", "plain", "utf-8"))
+    body.attach(MIMEText(html, "html", "utf-8"))
+    if image_bytes:
+        message = MIMEMultipart("related")
+        message.attach(body)
+        image = MIMEImage(random.Random(guid).randbytes(image_bytes), "png")
+        image["Content-ID"] = f"<{guid}@netflix>"
+        message.attach(image)
+    else:
+        message = body
+    message["From"] = NETFLIX_FROM
+    message["To"] = to
+    message["Subject"] = subject
+    message["Date"] = format_datetime(date)
+    return message.as_bytes()
+
+
+# Remitente, asunto y texto de los correos de código de otros proveedores
+PROVIDER_TEMPLATES = {
+    "disney": ("Disney+ <disneyplus@trx.mail2.disneyplus.com>",
+               "Tu código de acceso único para Disney+",
+               "Usa este código de acceso único para iniciar sesión: {code}. "
+               "Vence en 15 minutos."),
+    "max": ("Max <no-reply@alerts.max.com>",
+            "Tu código de verificación de Max",
+            "Tu código de verificación es {code}. Si no lo solicitaste, ignora este correo."),
+    "spam": ("Ofertas <promo@tienda.example.com>",
+             "Ofertas de la semana",
+             "Aprovecha 20% de descuento con el cupón 482913."),
+}
+
+
+def provider_message(to: str, provider: str, date: datetime = None, code: str = None) -> bytes:
+    """Correo de código en el texto de otro proveedor ("disney", "max" o "spam")"""
+    sender, subject, text = PROVIDER_TEMPLATES[provider]
+    date = date or datetime.now(timezone.utc)
+    code = code or f"{random.randrange(10 ** 6):06d}"
+    html = (f"<html><body><table><tr><td><p>{text.format(code=code)}</p></td></tr>"
+            "</table></body></html>")
+    message = MIMEMultipart("alternative")
+    message.attach(MIMEText(text.format(code=code), "plain", "utf-8"))
+    message.attach(MIMEText(html, "html", "utf-8"))
+    message["From"] = sender
+    message["To"] = to
+    message["Subject"] = subject
+    message["Date"] = format_datetime(date)
+    return message.as_bytes()
+
+
+def recipient_weights(count: int, distribution: str = "uniform") -> list[float]:
+    """Peso relativo de cada destinatario: "uniform" o "zipf" (pocos muy activos)"""
+    if distribution == "uniform":
+        return [1.0] * count
+    if distribution == "zipf":
+        return [1.0 / (rank + 1) ** 1.1 for rank in range(count)]
+    raise ValueError(f"Distribución desconocida: {distribution}")
+
+
+def seed_mailbox(mailbox, messages: int, recipients: int, distribution: str = "uniform",
+                 code_ratio: float = 0.7, home_ratio: float = 0.1, max_age: int = 1200,
+                 domain: str = "example.com", rng: random.Random = None) -> list[str]:
+    """Llena un ``FakeMailbox`` con correos de Netflix en orden cronológico.
+
+    Args:
+        messages: Cantidad de correos
+        recipients: Destinatarios distintos (user0@..., user1@...)
+        distribution: Reparto de correos entre destinatarios ("uniform" o "zipf")
+        code_ratio / home_ratio: Proporción de correos con código y de hogar;
+            el resto no tiene botón
+        max_age: Antigüedad máxima en segundos; los mayores a 15 minutos ya vencieron
+
+    Returns:
+        list: Direcciones de los destinatarios, en el orden de ``recipient_weights``
+    """
+    rng = rng or random.Random(0)
+    addresses = [f"user{i}@{domain}" for i in range(recipients)]
+    weights = recipient_weights(recipients, distribution)
+    now = datetime.now(timezone.utc)
+    ages = sorted((rng.uniform(0, max_age) for _ in range(messages)), reverse=True)
+    for age in ages:
+        draw = rng.random()
+        if draw < code_ratio:
+            kind = "code"
+        else:
+            kind = "home" if draw < code_ratio + home_ratio else "other"
+        to = rng.choices(addresses, weights)[0]
+        mailbox.append(netflix_message(to, date=now - timedelta(seconds=age), kind=kind))
+    return addresses
@@ -0,0 +1,456 @@
+"""Servidor IMAP4 falso en memoria para pruebas locales y benchmarks.
+
+Implementa el subconjunto de IMAP4rev1 que usa el servicio (LOGIN, SELECT,
+EXAMINE, STATUS, SEARCH, FETCH, UID, NOOP, IDLE, CLOSE y LOGOUT) sin red
+externa ni TLS, con latencia configurable por comando.
+"""
+import re
+import select
+import socket
+import socketserver
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from email import message_from_bytes
+from email.header import decode_header, make_header
+from email.utils import parsedate_to_datetime
+
+_MONTHS = {m: i for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun",
+     "jul", "aug", "sep", "oct", "nov", "dec"], start=1)}
+
+_TOKEN_RE = re.compile(rb'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()]+')
+_FETCH_ITEM_RE = re.compile(
+    rb'(BODY(?:\.PEEK)?\[[^\]]*\](?:<\d+\.\d+>)?|[A-Z0-9.]+)', re.IGNORECASE)
+
+
+class FakeMessage:
+    __slots__ = ("uid", "raw", "sender", "recipients", "subject", "date")
+
+    def __init__(self, uid: int, raw: bytes):
+        self.uid = uid
+        self.raw = raw
+        msg = message_from_bytes(raw)
+        self.sender = str(msg.get("From", "")).lower()
+        self.recipients = str(msg.get("To", "")).lower()
+        self.subject = str(make_header(decode_header(msg.get("Subject", "")))).lower()
+        self.date = parsedate_to_datetime(msg["Date"]) if msg.get("Date") else None
+
+    def header_block(self) -> bytes:
+        for sep in (b"\r\n\r\n", b"\n\n"):
+            if sep in self.raw:
+                return self.raw.split(sep, 1)[0] + b"\r\n\r\n"
+        return self.raw
+
+    def text_block(self) -> bytes:
+        for sep in (b"\r\n\r\n", b"\n\n"):
+            if sep in self.raw:
+                return self.raw.split(sep, 1)[1]
+        return b""
+
+    def header_fields(self, names) -> bytes:
+        wanted = {n.lower() for n in names}
+        lines = []
+        include = False
+        for line in self.header_block().splitlines():
+            if not line:
+                continue
+            if line[:1] in (b" ", b"\t"):
+                if include:
+                    lines.append(line)
+                continue
+            include = line.split(b":", 1)[0].decode("ascii", "ignore").lower() in wanted
+            if include:
+                lines.append(line)
+        return b"\r\n".join(lines) + b"\r\n\r\n"
+
+
+class FakeMailbox:
+    """Buzón INBOX en memoria, seguro entre hilos."""
+
+    def __init__(self, uidvalidity: int = 1):
+        self.uidvalidity = uidvalidity
+        self.messages: list[FakeMessage] = []
+        self.next_uid = 1
+        self.changed = threading.Condition()
+
+    def append(self, raw: bytes) -> int:
+        with self.changed:
+            uid = self.next_uid
+            self.next_uid += 1
+            self.messages.append(FakeMessage(uid, raw))
+            self.changed.notify_all()
+            return uid
+
+    def snapshot(self) -> list[FakeMessage]:
+        with self.changed:
+            return list(self.messages)
+
+
+def _unquote(token: bytes) -> str:
+    if token.startswith(b'"') and token.endswith(b'"'):
+        token = token[1:-1].replace(b'\\"', b'"').replace(b"\\\\", b"\\")
+    return token.decode("utf-8", "ignore")
+
+
+def _parse_imap_date(token: bytes):
+    day, month, year = _unquote(token).split("-")
+    return datetime(int(year), _MONTHS[month.lower()], int(day)).date()
+
+
+def _in_set(value: int, spec: str, maximum: int) -> bool:
+    for part in spec.split(","):
+        if ":" in part:
+            lo, hi = part.split(":")
+            lo = maximum if lo == "*" else int(lo)
+            hi = maximum if hi == "*" else int(hi)
+            if min(lo, hi) <= value <= max(lo, hi):
+                return True
+        elif (maximum if part == "*" else int(part)) == value:
+            return True
+    return False
+
+
+class _SearchParser:
+    """Evalúa criterios SEARCH de IMAP sobre un mensaje."""
+
+    def __init__(self, tokens: list[bytes]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def parse_all(self):
+        criteria = []
+        while self.pos < len(self.tokens):
+            criteria.append(self.parse_one())
+        return lambda m, seq, ctx: all(c(m, seq, ctx) for c in criteria)
+
+    def _next(self) -> bytes:
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse_one(self):
+        token = self._next()
+        key = token.upper()
+        if key == b"(":
+            group = []
+            while self.tokens[self.pos] != b")":
+                group.append(self.parse_one())
+            self.pos += 1
+            return lambda m, seq, ctx: all(c(m, seq, ctx) for c in group)
+        if key == b"ALL":
+            return lambda m, seq, ctx: True
+        if key == b"CHARSET":
+            self._next()
+            return lambda m, seq, ctx: True
+        if key == b"OR":
+            left, right = self.parse_one(), self.parse_one()
+            return lambda m, seq, ctx: left(m, seq, ctx) or right(m, seq, ctx)
+        if key == b"NOT":
+            inner = self.parse_one()
+            return lambda m, seq, ctx: not inner(m, seq, ctx)
+        if key in (b"SINCE", b"BEFORE", b"ON"):
+            day = _parse_imap_date(self._next())
+            if key == b"SINCE":
+                return lambda m, seq, ctx: m.date is not None and m.date.date() >= day
+            if key == b"BEFORE":
+                return lambda m, seq, ctx: m.date is not None and m.date.date() < day
+            return lambda m, seq, ctx: m.date is not None and m.date.date() == day
+        if key in (b"FROM", b"TO", b"SUBJECT"):
+            needle = _unquote(self._next()).lower()
+            attr = {b"FROM": "sender", b"TO": "recipients", b"SUBJECT": "subject"}[key]
+            return lambda m, seq, ctx: needle in getattr(m, attr)
+        if key == b"UID":
+            spec = _unquote(self._next())
+            return lambda m, seq, ctx: _in_set(m.uid, spec, ctx["max_uid"])
+        spec = _unquote(token)
+        return lambda m, seq, ctx: _in_set(seq, spec, ctx["max_seq"])
+
+
+class _ImapHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.selected = False
+        self.mailbox = self.server.mailbox
+        # Último EXISTS enviado al cliente
+        self.reported = 0
+        self.server.record_session(1)
+
+    def finish(self):
+        self.server.record_session(-1)
+        super().finish()
+
+    def _send(self, data: bytes):
+        self.wfile.write(data)
+        self.wfile.flush()
+        self.server.record_bytes(len(data))
+
+    def _line(self, text: str):
+        self._send(text.encode("utf-8") + b"\r\n")
+
+    def handle(self):
+        self._line("* OK FakeIMAP4rev1 ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            line = line.rstrip(b"\r\n")
+            if not line:
+                continue
+            parts = line.split(b" ", 2)
+            tag = parts[0].decode()
+            command = parts[1].upper().decode() if len(parts) > 1 else ""
+            args = parts[2] if len(parts) > 2 else b""
+            uid_mode = False
+            if command == "UID":
+                sub = args.split(b" ", 1)
+                command = sub[0].upper().decode()
+                args = sub[1] if len(sub) > 1 else b""
+                uid_mode = True
+            self.server.record_command(command)
+            self.server.apply_latency(command)
+            handler = getattr(self, f"cmd_{command.lower()}", None)
+            if handler is None:
+                self._line(f"{tag} BAD unknown command {command}")
+                continue
+            if handler(tag, args, uid_mode) is False:
+                return
+
+    def cmd_capability(self, tag, args, uid_mode):
+        self._line("* CAPABILITY IMAP4rev1 IDLE UIDPLUS")
+        self._line(f"{tag} OK CAPABILITY completed")
+
+    def cmd_login(self, tag, args, uid_mode):
+        user = _unquote(args.split(b" ", 1)[0]).lower()
+        self.mailbox = self.server.mailbox_for(user)
+        self._line(f"{tag} OK LOGIN completed")
+
+    def cmd_noop(self, tag, args, uid_mode):
+        if self.selected:
+            self.reported = len(self.mailbox.snapshot())
+            self._line(f"* {self.reported} EXISTS")
+        self._line(f"{tag} OK NOOP completed")
+
+    def _select(self, tag, readonly):
+        mailbox = self.mailbox
+        self.selected = True
+        self.reported = len(mailbox.snapshot())
+        self._line(f"* {self.reported} EXISTS")
+        self._line("* 0 RECENT")
+        self._line(f"* OK [UIDVALIDITY {mailbox.uidvalidity}] UIDs valid")
+        self._line(f"* OK [UIDNEXT {mailbox.next_uid}] Predicted next UID")
+        mode = "READ-ONLY" if readonly else "READ-WRITE"
+        self._line(f"{tag} OK [{mode}] SELECT completed")
+
+    def cmd_select(self, tag, args, uid_mode):
+        self._select(tag, readonly=False)
+
+    def cmd_examine(self, tag, args, uid_mode):
+        self._select(tag, readonly=True)
+
+    def cmd_status(self, tag, args, uid_mode):
+        mailbox = self.mailbox
+        self._line(
+            f"* STATUS INBOX (MESSAGES {len(mailbox.snapshot())} "
+            f"UIDNEXT {mailbox.next_uid} UIDVALIDITY {mailbox.uidvalidity})")
+        self._line(f"{tag} OK STATUS completed")
+
+    def cmd_close(self, tag, args, uid_mode):
+        self.selected = False
+        self._line(f"{tag} OK CLOSE completed")
+
+    def cmd_logout(self, tag, args, uid_mode):
+        self._line("* BYE logging out")
+        self._line(f"{tag} OK LOGOUT completed")
+        return False
+
+    def cmd_search(self, tag, args, uid_mode):
+        messages = self.mailbox.snapshot()
+        tokens = _TOKEN_RE.findall(args)
+        try:
+            matcher = _SearchParser(tokens).parse_all()
+        except (IndexError, KeyError, ValueError) as e:
+            self._line(f"{tag} BAD invalid search: {e}")
+            return
+        ctx = {"max_seq": len(messages),
+               "max_uid": messages[-1].uid if messages else 0}
+        hits = [str(m.uid if uid_mode else seq)
+                for seq, m in enumerate(messages, start=1) if matcher(m, seq, ctx)]
+        self._line("* SEARCH" + ("" if not hits else " " + " ".join(hits)))
+        self._line(f"{tag} OK SEARCH completed")
+
+    def cmd_fetch(self, tag, args, uid_mode):
+        messages = self.mailbox.snapshot()
+        spec, _, items = args.partition(b" ")
+        spec = spec.decode()
+        items = items.strip()
+        if items.startswith(b"(") and items.endswith(b")"):
+            items = items[1:-1]
+        wanted = _FETCH_ITEM_RE.findall(items)
+        max_uid = messages[-1].uid if messages else 0
+        for seq, message in enumerate(messages, start=1):
+            key, maximum = (message.uid, max_uid) if uid_mode else (seq, len(messages))
+            if not messages or not _in_set(key, spec, maximum):
+                continue
+            self._send(self._fetch_response(seq, message, wanted, uid_mode))
+        self._line(f"{tag} OK FETCH completed")
+
+    def _fetch_response(self, seq, message, wanted, uid_mode) -> bytes:
+        chunks = []
+        if uid_mode and not any(w.upper() == b"UID" for w in wanted):
+            chunks.append(b"UID %d" % message.uid)
+        for item in wanted:
+            name = item.upper()
+            if name == b"UID":
+                chunks.append(b"UID %d" % message.uid)
+            elif name == b"FLAGS":
+                chunks.append(b"FLAGS ()")
+            elif name == b"RFC822.SIZE":
+                chunks.append(b"RFC822.SIZE %d" % len(message.raw))
+            elif name == b"INTERNALDATE":
+                stamp = (message.date or datetime.now()).strftime("%d-%b-%Y %H:%M:%S %z")
+                chunks.append(b'INTERNALDATE "' + stamp.encode() + b'"')
+            elif name in (b"RFC822", b"RFC822.HEADER", b"RFC822.TEXT"):
+                data = {b"RFC822": message.raw,
+                        b"RFC822.HEADER": message.header_block(),
+                        b"RFC822.TEXT": message.text_block()}[name]
+                chunks.append(name + b" {%d}\r\n" % len(data) + data)
+            elif name.startswith(b"BODY"):
+                chunks.append(self._body_item(message, item))
+        return b"* %d FETCH (" % seq + b" ".join(chunks) + b")\r\n"
+
+    def _body_item(self, message, item: bytes) -> bytes:
+        match = re.match(rb"BODY(?:\.PEEK)?\[([^\]]*)\](?:<(\d+)\.(\d+)>)?", item, re.I)
+        section = match.group(1)
+        upper = section.upper()
+        if not section:
+            data = message.raw
+        elif upper == b"HEADER":
+            data = message.header_block()
+        elif upper == b"TEXT":
+            data = message.text_block()
+        elif upper.startswith(b"HEADER.FIELDS"):
+            names = re.findall(rb"[A-Za-z0-9-]+", section[len(b"HEADER.FIELDS"):])
+            data = message.header_fields([n.decode() for n in names])
+        else:
+            data = message.raw
+        label = b"BODY[" + section + b"]"
+        if match.group(2) is not None:
+            start, length = int(match.group(2)), int(match.group(3))
+            data = data[start:start + length]
+            label += b"<%d>" % start
+        return label + b" {%d}\r\n" % len(data) + data
+
+    def cmd_idle(self, tag, args, uid_mode):
+        mailbox = self.mailbox
+        current = len(mailbox.snapshot())
+        if current != self.reported:
+            # Como Gmail: lo llegado desde el último EXISTS va en el mismo
+            # segmento que la continuación
+            self.reported = current
+            self._send(b"+ idling\r\n* %d EXISTS\r\n" % current)
+        else:
+            self._line("+ idling")
+        while True:
+            readable, _, _ = select.select([self.connection], [], [], 0.05)
+            current = len(mailbox.snapshot())
+            if current != self.reported:
+                self.reported = current
+                self._line(f"* {current} EXISTS")
+            if readable:
+                line = self.rfile.readline()
+                if not line:
+                    return False
+                if line.strip().upper() == b"DONE":
+                    self._line(f"{tag} OK IDLE terminated")
+                    return
+
+
+def parse_latency(spec: str):
+    """Convierte "0.02" o "0.02,SEARCH=0.1,FETCH=0.05" en la latencia del servidor"""
+    latency = {}
+    for part in filter(None, (item.strip() for item in spec.split(","))):
+        command, _, value = part.rpartition("=")
+        latency[command.upper() or "*"] = float(value)
+    if set(latency) == {"*"}:
+        return latency["*"]
+    return latency
+
+
+class FakeImapServer(socketserver.ThreadingTCPServer):
+    """Servidor IMAP falso que corre en un hilo en segundo plano.
+
+    Args:
+        mailbox: Buzón a servir (se crea uno vacío si no se indica)
+        mailboxes: Buzones por usuario de LOGIN; los demás usuarios ven ``mailbox``
+        latency: Segundos de espera por comando, o dict comando -> segundos
+                 ("*" para los comandos no listados); ver ``parse_latency``
+        host/port: Dirección de escucha (port=0 elige uno libre)
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, mailbox: FakeMailbox = None, latency=0.0,
+                 host: str = "127.0.0.1", port: int = 0, mailboxes: dict = None):
+        super().__init__((host, port), _ImapHandler)
+        self.mailbox = mailbox or FakeMailbox()
+        self.mailboxes = {user.lower(): box for user, box in (mailboxes or {}).items()}
+        self.latency = latency
+        self.bytes_sent = 0
+        self.commands = Counter()
+        self.open_sessions = 0
+        self.max_open_sessions = 0
+        self._stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.server_address[0], self.server_address[1]
+
+    def mailbox_for(self, user: str) -> FakeMailbox:
+        return self.mailboxes.get(user, self.mailbox)
+
+    def apply_latency(self, command: str):
+        if isinstance(self.latency, dict):
+            delay = self.latency.get(command, self.latency.get("*", 0.0))
+        else:
+            delay = self.latency
+        if delay:
+            time.sleep(delay)
+
+    def record_bytes(self, count: int):
+        with self._stats_lock:
+            self.bytes_sent += count
+
+    def record_command(self, command: str):
+        with self._stats_lock:
+            self.commands[command] += 1
+
+    def record_session(self, delta: int):
+        with self._stats_lock:
+            self.open_sessions += delta
+            self.max_open_sessions = max(self.max_open_sessions, self.open_sessions)
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.bytes_sent = 0
+            self.commands.clear()
+            self.max_open_sessions = self.open_sessions
+
+    def start(self) -> "FakeImapServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,183 @@
+"""Reproduce tráfico de búsqueda de códigos contra un buzón IMAP falso sembrado.
+
+Siembra el ``FakeImapServer`` con un corpus de correos de Netflix (tamaño,
+reparto de destinatarios y latencia por comando configurables) y, para cada
+nivel de concurrencia, ejecuta la carga contra:
+
+- ``service``: ``EmailCodeService.check_email_for_codes`` en el mismo proceso
+- ``http``: GET /api/check-code/{email} en un uvicorn real
+- ``batch``: POST /api/check-codes con ``--batch-size`` direcciones
+
+Los destinatarios consultados siguen la misma distribución que el corpus.
+Con ``--arrival-rate`` llegan correos nuevos durante la corrida, así que la
+sincronización incremental también trabaja. Todo es local: no usa red.
+
+Uso:
+    python -m benchmarks.replay --messages 500 --recipients 100 --distribution zipf \\
+        --latency 0.02,SEARCH=0.08 --concurrency 1 8 32 --duration 5
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+
+from benchmarks.common import (
+    HttpClient,
+    UvicornThread,
+    configure_fake_imap,
+    percentile,
+    summarize,
+)
+from benchmarks.corpus import netflix_message, recipient_weights, seed_mailbox
+from benchmarks.fake_imap import FakeImapServer, parse_latency
+
+
+class Arrivals:
+    """Agrega correos nuevos al buzón a ritmo constante mientras dura la carga
+
+    Con ``mailbox_for`` cada correo va al buzón que devuelva para el destinatario.
+    """
+
+    def __init__(self, imap: FakeImapServer, addresses: list[str], weights: list[float],
+                 rate: float, rng: random.Random, mailbox_for=None):
+        self.imap = imap
+        self.mailbox_for = mailbox_for or (lambda to: imap.mailbox)
+        self.addresses = addresses
+        self.weights = weights
+        self.rate = rate
+        self.rng = rng
+        self.delivered = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        if self.rate > 0:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(5)
+
+    def _run(self):
+        while not self._stop.wait(1 / self.rate):
+            to = self.rng.choices(self.addresses, self.weights)[0]
+            self.mailbox_for(to).append(netflix_message(to))
+            self.delivered += 1
+
+
+async def _drive_service(service, pick, concurrency: int, duration: float) -> list[float]:
+    latencies = []
+    deadline = time.monotonic() + duration
+
+    async def worker():
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            await service.check_email_for_codes(pick())
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+async def _drive_http(port: int, request_for, concurrency: int, duration: float) -> list[float]:
+    latencies = []
+    deadline = time.monotonic() + duration
+
+    async def worker():
+        client = HttpClient(port)
+        try:
+            while time.monotonic() < deadline:
+                method, path, body = request_for()
+                started = time.perf_counter()
+                status, _ = await client.request(
+                    method, path, body, {"Content-Type": "application/json"} if body else None)
+                latencies.append(time.perf_counter() - started)
+                if status >= 500:
+                    print(f"  respuesta {status} en {method} {path}")
+        finally:
+            await client.close()
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def _report(name: str, imap: FakeImapServer, latencies: list[float], elapsed: float,
+            lookups: int):
+    commands = sum(imap.commands.values())
+    per_lookup = max(1, lookups)
+    print(f"{summarize(name, latencies, elapsed)} "
+          f"p999={percentile(latencies, 99.9) * 1000:8.2f}ms "
+          f"imap={imap.bytes_sent / 1024:9.1f}KB ({imap.bytes_sent / per_lookup:7.0f}B/consulta) "
+          f"comandos/consulta={commands / per_lookup:5.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500,
+                        help="Correos sembrados antes de empezar")
+    parser.add_argument("--recipients", type=int, default=100)
+    parser.add_argument("--distribution", choices=("uniform", "zipf"), default="zipf")
+    parser.add_argument("--max-age", type=int, default=1200,
+                        help="Antigüedad máxima de los correos sembrados (segundos)")
+    parser.add_argument("--latency", default="0.02",
+                        help='Latencia por comando: "0.02" o "0.02,SEARCH=0.1,FETCH=0.05"')
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--targets", nargs="+", choices=("service", "http", "batch"),
+                        default=["service", "http", "batch"])
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--arrival-rate", type=float, default=0.0,
+                        help="Correos nuevos por segundo durante la carga")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    imap = FakeImapServer(latency=parse_latency(args.latency)).start()
+    addresses = seed_mailbox(imap.mailbox, args.messages, args.recipients, args.distribution,
+                             max_age=args.max_age, rng=rng)
+    weights = recipient_weights(args.recipients, args.distribution)
+    configure_fake_imap(imap.address)
+
+    import main as app_module
+    from src.services.code_cache import code_cache
+    from src.services.email_service import EmailCodeService
+
+    def pick() -> str:
+        return rng.choices(addresses, weights)[0]
+
+    def single_request():
+        return "GET", f"/api/check-code/{pick()}", b""
+
+    def batch_request():
+        emails = rng.choices(addresses, weights, k=args.batch_size)
+        return "POST", "/api/check-codes", json.dumps({"emails": emails}).encode()
+
+    print(f"IMAP falso: {args.messages} mensajes, {args.recipients} destinatarios "
+          f"({args.distribution}), latencia {args.latency}, llegadas {args.arrival_rate}/s")
+    with UvicornThread(app_module.app) as server:
+        for target in args.targets:
+            print(f"\n== {target} ==")
+            for concurrency in args.concurrency:
+                code_cache.clear()
+                imap.reset_stats()
+                started = time.monotonic()
+                with Arrivals(imap, addresses, weights, args.arrival_rate, rng):
+                    if target == "service":
+                        latencies = asyncio.run(_drive_service(
+                            EmailCodeService(), pick, concurrency, args.duration))
+                    else:
+                        request_for = single_request if target == "http" else batch_request
+                        latencies = asyncio.run(_drive_http(
+                            server.port, request_for, concurrency, args.duration))
+                elapsed = time.monotonic() - started
+                lookups = len(latencies) * (args.batch_size if target == "batch" else 1)
+                _report(f"{target} c={concurrency}", imap, latencies, elapsed, lookups)
+    imap.stop()
+
+
+if __name__ == "__main__":
+    main()
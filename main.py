@@ -1,19 +1,117 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import PlainTextResponse, RedirectResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import logging
 import os
 from datetime import datetime
+from dotenv import load_dotenv
 
-from src.config.database import get_db
-from src.services.email_service import EmailCodeService
+# Cargar variables de entorno antes de importar los servicios (leen su configuración al importarse)
+load_dotenv()
+
+from src.config.logging_config import setup_logging, stop_logging
+
+setup_logging()
+
+from src.services.access_control import access_index
+from src.services.admission import admission_stats, recipient_limiter
+from src.services.code_cache import code_cache, single_flight
+from src.services.code_waiters import code_waiters
+from src.services.imap_executor import run_imap, shutdown_imap_executor
+from src.services.imap_pool import close_all_pools, pool_stats, reap_idle_pools
+from src.services.inbox_shards import IngesterGroup, get_inbox_shards
+from src.services.metrics import RequestMetricsMiddleware, registry
+from src.services.pipeline_stats import pipeline_stats
+from src.services.preload import preload, preload_enabled
+from src.services.providers import get_provider_index
+from src.services.sync_store import close_sync_store, get_sync_store
+
+logger = logging.getLogger(__name__)
+
+# Esperas de /api/check-code/{email}/wait y /stream
+CODE_WAIT_MAX_TIMEOUT = int(os.getenv("CODE_WAIT_MAX_TIMEOUT", "900"))
+CODE_WAIT_POLL_INTERVAL = float(os.getenv("CODE_WAIT_POLL_INTERVAL", "5"))
+CODE_STREAM_HEARTBEAT = float(os.getenv("CODE_STREAM_HEARTBEAT", "15"))
+# Cada cuántos segundos se cierran las conexiones IMAP inactivas de los pools
+IMAP_POOL_REAP_INTERVAL = float(os.getenv("IMAP_POOL_REAP_INTERVAL", "60"))
+
+
+async def _reap_pools(interval: float):
+    """Cierra periódicamente las conexiones del pool inactivas más de max_idle"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            closed = await run_imap(reap_idle_pools)
+            if closed:
+                logger.info("🧹 %d conexiones IMAP inactivas cerradas", closed)
+        except Exception as e:
+            logger.warning("⚠️ Error cerrando conexiones IMAP inactivas: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicia y detiene los ingestores IMAP (uno por buzón central) en segundo plano"""
+    app.state.ingester = None
+    app.state.warmup = None
+    app.state.reaper = None
+    code_waiters.bind(asyncio.get_running_loop())
+    if access_index.enabled:
+        # Engine propio de cada worker, creado después del fork (SQLAlchemy se importa aquí)
+        from src.config.database import init_engine
+        init_engine()
+    access_index.start()
+    if os.getenv("IMAP_INGESTER_ENABLED", "true").lower() == "true":
+        try:
+            # Índice compartido: un solo worker (el líder) abre IMAP para todos
+            lock_path = None
+            if os.getenv("SHARED_INDEX_ENABLED", "false").lower() == "true":
+                if os.getenv("SYNC_STORE_PATH", "sync_state.db"):
+                    lock_path = os.getenv("SHARED_INDEX_LOCK", "sync_state.lock")
+                else:
+                    logger.warning("⚠️ SHARED_INDEX_ENABLED requiere SYNC_STORE_PATH en disco")
+            app.state.ingester = IngesterGroup(
+                get_inbox_shards(), lock_path=lock_path, on_code=code_waiters.notify)
+            app.state.ingester.start()
+        except Exception as e:
+            logger.warning("⚠️ Ingestor IMAP deshabilitado: %s", e)
+    warm = int(os.getenv("IMAP_POOL_WARM", "0"))
+    # Con ingestor las consultas salen del índice (o del store en los
+    # seguidores): las conexiones precalentadas quedarían sin usar
+    if warm > 0 and app.state.ingester is None:
+        try:
+            # Las primeras conexiones IMAP se abren en segundo plano: no retrasan el arranque
+            app.state.warmup = asyncio.ensure_future(run_imap(get_inbox_shards().warm_pools, warm))
+        except Exception as e:
+            logger.warning("⚠️ Pools IMAP sin precalentar: %s", e)
+    if IMAP_POOL_REAP_INTERVAL > 0:
+        app.state.reaper = asyncio.ensure_future(_reap_pools(IMAP_POOL_REAP_INTERVAL))
+    yield
+    if app.state.warmup:
+        app.state.warmup.cancel()
+    if app.state.reaper:
+        app.state.reaper.cancel()
+    if app.state.ingester:
+        app.state.ingester.stop()
+    access_index.stop()
+    if access_index.enabled:
+        from src.config.database import dispose_engine
+        dispose_engine()
+    shutdown_imap_executor()
+    close_all_pools()
+    close_sync_store()
+    stop_logging()
 
 app = FastAPI(
     title="Netflix Code Service API",
     description="API para gestionar códigos de verificación de Netflix",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url=None
+    redoc_url=None,
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -25,12 +123,58 @@ app.add_middleware(
     expose_headers=["*"],
     max_age=3600,
 )
+app.add_middleware(RequestMetricsMiddleware)
+
+# Gauges que se leen al exportar /metrics
+_POOL_EVENTS = ("checkouts", "timeouts", "created", "closed", "health_check_failures", "broken")
+registry.callback(
+    "code_imap_pool_connections", "Conexiones IMAP del pool por estado",
+    lambda: [((account, state), stats[state])
+             for account, stats in pool_stats().items() for state in ("in_use", "idle")],
+    ("account", "state"))
+registry.callback(
+    "code_imap_pool_events_total", "Eventos acumulados del pool IMAP",
+    lambda: [((account, event), stats[event])
+             for account, stats in pool_stats().items() for event in _POOL_EVENTS],
+    ("account", "event"), kind="counter")
+registry.callback(
+    "code_cache_entries", "Resultados en la caché de códigos", lambda: code_cache.stats()["size"])
+registry.callback(
+    "code_cache_requests_total", "Consultas a la caché de códigos por resultado",
+    lambda: [(("hit",), code_cache.stats()["hits"]), (("miss",), code_cache.stats()["misses"])],
+    ("result",), kind="counter")
+registry.callback(
+    "code_single_flight_in_flight", "Búsquedas IMAP en curso compartidas",
+    lambda: single_flight.stats()["in_flight"])
+registry.callback(
+    "code_waiters_waiting", "Peticiones aparcadas en /wait y /stream",
+    lambda: code_waiters.stats()["waiting"])
+registry.callback(
+    "code_ingester_ready", "1 si el índice del ingestor está listo",
+    lambda: int(_ingester_state() == "ready"))
 
 @app.get("/", include_in_schema=False)
 async def root():
     """Redirecciona a la documentación de la API"""
     return RedirectResponse(url="/docs")
 
+def _ingester_state() -> str:
+    """Estado del ingestor IMAP: disabled, cold o ready"""
+    ingester = getattr(app.state, "ingester", None)
+    if ingester is None:
+        return "disabled"
+    return "ready" if ingester.is_ready else "cold"
+
+@app.get("/health", include_in_schema=False)
+async def health():
+    """Chequeo de vida barato para el healthcheck de docker-compose (sin IMAP ni base de datos)"""
+    return {"status": "ok", "code_index": _ingester_state()}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métricas del pipeline, pools y cachés en formato de texto de Prometheus"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/status")
 async def check_status():
     """
@@ -49,7 +193,8 @@ async def check_status():
             "metadata": {
                 "docs": "/docs",
                 "health": "ok",
-                "maintenance_mode": False
+                "maintenance_mode": False,
+                "code_index": _ingester_state()
             }
         }
     except Exception as e:
@@ -62,10 +207,43 @@ async def check_status():
             }
         )
 
+@app.get("/api/stats")
+async def get_stats():
+    """
+    Contadores por etapa del pipeline de búsqueda IMAP
+
+    Returns:
+        dict: Llamadas, bytes y latencia acumulada por etapa y estado de los pools IMAP
+    """
+    return {
+        "status": "success",
+        "data": {
+            "pipeline": pipeline_stats.snapshot(),
+            "imap_pools": pool_stats(),
+            "code_cache": code_cache.stats(),
+            "single_flight": single_flight.stats(),
+            "code_waiters": code_waiters.stats(),
+            "sync_store": get_sync_store().stats(),
+            "inboxes": get_inbox_shards().stats(),
+            "access": access_index.stats(),
+            "admission": admission_stats(),
+            "recipient_rate_limit": recipient_limiter.stats(),
+            "providers": get_provider_index().names,
+            "ingester": {
+                "state": _ingester_state(),
+                "role": app.state.ingester.role if app.state.ingester else None,
+                "inboxes": app.state.ingester.stats() if app.state.ingester else {},
+                "pid": os.getpid()
+            },
+            "workers": int(os.getenv("WORKERS", "1"))
+        },
+        "timestamp": datetime.now().isoformat()
+    }
+
 @app.get("/api/check-code/{email}")
-async def check_code(email: str, db: Session = Depends(get_db)):
+async def check_code(email: str):
     """
-    Busca códigos de verificación de Netflix para un email específico
+    Busca códigos de verificación (Netflix, Disney+, Max...) para un email específico
     
     Args:
         email: Correo electrónico para buscar códigos
@@ -74,11 +252,12 @@ async def check_code(email: str, db: Session = Depends(get_db)):
         dict: Información sobre el código encontrado o mensaje si no hay códigos
     
     Raises:
-        HTTPException: Si ocurre un error durante la búsqueda
+        HTTPException: 403 si el correo no está autorizado, 429/503 con Retry-After si
+            IMAP está saturado, o si ocurre un error durante la búsqueda
     """
+    _authorize(email)
     try:
-        service = EmailCodeService(db)
-        result = await service.check_email_for_codes(email)
+        result = await _lookup_code(email)
         return {
             "status": "success",
             "data": result,
@@ -97,10 +276,203 @@ async def check_code(email: str, db: Session = Depends(get_db)):
             }
         )
 
+def _rejection(email: str, reason: str) -> dict:
+    return {
+        "has_code": False,
+        "authorized": False,
+        "message": reason,
+        "email": email.lower(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+def _authorize(email: str):
+    """Rechaza en memoria, antes de cualquier trabajo IMAP, los correos no autorizados"""
+    reason = access_index.check(email)
+    if reason:
+        raise HTTPException(status_code=403,
+                            detail={"status": "error", **_rejection(email, reason)})
+
+async def _lookup_code(email: str) -> dict:
+    """Responde desde el índice del ingestor; búsqueda en vivo si está frío"""
+    ingester = getattr(app.state, "ingester", None)
+    if ingester and ingester.is_ready:
+        return ingester.lookup(email)
+    return await get_inbox_shards().check_email_for_codes(email)
+
+async def _wait_for_code(email: str, timeout: float) -> dict:
+    """Espera hasta ``timeout`` segundos a que haya un código para el email
+
+    Con el ingestor listo la petición queda aparcada en ``code_waiters`` sin
+    consumir nada hasta que llegue un correo para el destinatario; si está
+    frío, se consulta cada CODE_WAIT_POLL_INTERVAL segundos.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    result = await _lookup_code(email)
+    while not result["has_code"]:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        ingester = getattr(app.state, "ingester", None)
+        if ingester and ingester.is_ready:
+            await code_waiters.wait(email, remaining)
+        else:
+            await asyncio.sleep(min(remaining, CODE_WAIT_POLL_INTERVAL))
+        result = await _lookup_code(email)
+    return result
+
+@app.get("/api/check-code/{email}/wait")
+async def wait_for_code(email: str,
+                        timeout: float = Query(30, gt=0, le=CODE_WAIT_MAX_TIMEOUT)):
+    """
+    Long-poll: responde en cuanto hay un código válido para el email
+
+    Args:
+        email: Correo electrónico para buscar códigos
+        timeout: Segundos máximos de espera
+
+    Returns:
+        dict: Igual que /api/check-code; ``has_code`` es False si venció el plazo
+
+    Raises:
+        HTTPException: 403 si el correo no está autorizado, 429/503 con Retry-After si
+            IMAP está saturado, o si ocurre un error durante la búsqueda
+    """
+    _authorize(email)
+    try:
+        result = await _wait_for_code(email, timeout)
+        return {
+            "status": "success",
+            "data": result,
+            "timestamp": datetime.now().isoformat()
+        }
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "status": "error",
+                "message": "Error al esperar códigos",
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            }
+        )
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/api/check-code/{email}/stream")
+async def stream_codes(email: str,
+                       timeout: float = Query(300, gt=0, le=CODE_WAIT_MAX_TIMEOUT)):
+    """
+    Server-Sent Events: envía un evento ``code`` por cada código nuevo del email
+
+    El stream se cierra con un evento ``timeout`` al vencer el plazo; mientras
+    tanto se envía un comentario cada CODE_STREAM_HEARTBEAT segundos para que
+    los proxies no corten la conexión.
+    """
+    _authorize(email)
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        last_code = None
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    yield _sse("timeout", {"email": email.lower(), "has_code": False})
+                    return
+                wait_slice = min(remaining, CODE_STREAM_HEARTBEAT)
+                if last_code is None:
+                    result = await _wait_for_code(email, wait_slice)
+                else:
+                    # El código enviado sigue vigente: esperar el aviso de uno nuevo
+                    await code_waiters.wait(email, wait_slice)
+                    result = await _lookup_code(email)
+                code = result.get("code_url") or result.get("code")
+                if result["has_code"] and code != last_code:
+                    last_code = code
+                    yield _sse("code", result)
+                else:
+                    yield ": ping\n\n"
+        except HTTPException as he:
+            detail = he.detail if isinstance(he.detail, dict) else {"message": str(he.detail)}
+            yield _sse("error", detail)
+        except Exception as e:
+            yield _sse("error", {"status": "error",
+                                 "message": "Error al esperar códigos",
+                                 "error": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+class CheckCodesRequest(BaseModel):
+    emails: list[str] = Field(..., min_length=1, max_length=200)
+
+@app.post("/api/check-codes")
+async def check_codes(request: CheckCodesRequest):
+    """
+    Busca códigos de verificación de Netflix para varios emails a la vez
+
+    Con el índice del ingestor listo cada email se responde desde memoria; si
+    no, se hace una sola búsqueda por buzón central, en paralelo entre buzones.
+    Los correos no autorizados se responden con ``authorized`` en False y los
+    que superaron RECIPIENT_RATE_LIMIT con ``rate_limited`` y ``retry_after``,
+    sin consultar IMAP.
+
+    Args:
+        request: Lista de correos electrónicos (máximo 200)
+
+    Returns:
+        dict: Resultado por email, con la misma forma que /api/check-code
+
+    Raises:
+        HTTPException: Si ocurre un error durante la búsqueda
+    """
+    rejected = {}
+    allowed = []
+    for email in request.emails:
+        reason = access_index.check(email)
+        if reason:
+            rejected[email.lower()] = _rejection(email, reason)
+        else:
+            allowed.append(email)
+    try:
+        ingester = getattr(app.state, "ingester", None)
+        if not allowed:
+            results = {}
+        elif ingester and ingester.is_ready:
+            results = {email.lower(): ingester.lookup(email) for email in allowed}
+        else:
+            results = await get_inbox_shards().check_emails_for_codes(allowed)
+        results.update(rejected)
+        return {
+            "status": "success",
+            "data": {
+                "results": results,
+                "count": len(results)
+            },
+            "timestamp": datetime.now().isoformat()
+        }
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "status": "error",
+                "message": "Error al buscar códigos",
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            }
+        )
+
 @app.get("/api/test-auth")
-async def test_auth(db: Session = Depends(get_db)):
+async def test_auth():
     """
-    Prueba la conexión al servidor de correo central
+    Prueba la conexión a cada buzón central
     
     Returns:
         dict: Estado de la conexión y detalles de configuración
@@ -109,25 +481,23 @@ async def test_auth(db: Session = Depends(get_db)):
         HTTPException: Si hay problemas de conexión
     """
     try:
-        service = EmailCodeService(db)
-        mail = service._connect_to_imap()
-        
-        if mail:
-            mail.select("INBOX")
-            mail.close()
-            mail.logout()
-            
-            return {
-                "status": "success",
-                "message": "Conexión exitosa con Gmail",
-                "timestamp": datetime.now().isoformat(),
-                "data": {
-                    "email": service.central_email,
-                    "imap_server": service.imap_server,
-                    "imap_port": service.imap_port,
-                    "inbox_access": True
-                }
+        services = get_inbox_shards().services
+        await asyncio.gather(*(run_imap(service.check_connection, timeout=service.request_timeout)
+                               for service in services))
+        service = services[0]
+
+        return {
+            "status": "success",
+            "message": "Conexión exitosa con Gmail",
+            "timestamp": datetime.now().isoformat(),
+            "data": {
+                "email": service.central_email,
+                "inboxes": [inbox.central_email for inbox in services],
+                "imap_server": service.imap_server,
+                "imap_port": service.imap_port,
+                "inbox_access": True
             }
+        }
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -139,4 +509,8 @@ async def test_auth(db: Session = Depends(get_db)):
                 "error": str(e),
                 "timestamp": datetime.now().isoformat()
             }
-        )
\ No newline at end of file
+        )
+
+# Con gunicorn --preload este módulo se importa una sola vez, en el maestro
+if preload_enabled():
+    preload()
@@ -1,3 +1,12 @@
-from .database import Base, SessionLocal, engine, get_db
+from .logging_config import setup_logging, stop_logging
 
-__all__ = ['Base', 'SessionLocal', 'engine', 'get_db']
\ No newline at end of file
+__all__ = ['Base', 'SessionLocal', 'engine', 'init_engine', 'dispose_engine', 'setup_logging',
+           'stop_logging']
+
+
+def __getattr__(name):
+    # SQLAlchemy se importa solo cuando alguien usa la base de datos
+    if name in __all__:
+        from . import database
+        return getattr(database, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,36 +1,70 @@
 from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
+from sqlalchemy.orm import declarative_base, sessionmaker
 import os
+import threading
 
-# Cargar variables de entorno
-load_dotenv()
+# Las variables de entorno (.env) las carga main.py una sola vez al arrancar.
+# El engine no se crea al importar: cada worker lo crea en el lifespan (o al
+# primer uso), después del fork de gunicorn --preload, para no compartir
+# conexiones entre procesos.
 
-# Configuración de la base de datos
-DB_USER = os.getenv("POSTGRES_USER")
-DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
-DB_HOST = os.getenv("POSTGRES_HOST")
-DB_NAME = os.getenv("POSTGRES_DATABASE")
+# Crear la sesión; se enlaza al engine en init_engine
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
-# Crear la URL de conexión
-SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}?sslmode=require"
+# Crear la base declarativa
+Base = declarative_base()
 
-# Crear el engine
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    echo=True  # Para ver las consultas SQL en la consola
-)
+_engine = None
+_engine_lock = threading.Lock()
 
-# Crear la sesión
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Crear la base declarativa
-Base = declarative_base()
+def database_url() -> str:
+    """URL de conexión de PostgreSQL
+
+    Se arma con POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_HOST y POSTGRES_DATABASE.
+    """
+    return (f"postgresql://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}"
+            f"@{os.getenv('POSTGRES_HOST')}/{os.getenv('POSTGRES_DATABASE')}?sslmode=require")
+
+
+def init_engine():
+    """Crea el engine del proceso (una vez) y enlaza ``SessionLocal``; no abre conexiones"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_engine(
+                database_url(),
+                # SQL en consola solo para depurar
+                echo=os.getenv("DB_ECHO", "false").lower() == "true",
+                pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+                max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "5")),
+                pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "10")),
+                # Renovar conexiones antes de que el servidor las cierre por inactividad
+                pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+                pool_pre_ping=True
+            )
+            SessionLocal.configure(bind=_engine)
+        return _engine
+
+
+def dispose_engine():
+    """Cierra las conexiones del engine (al apagar el worker)"""
+    global _engine
+    with _engine_lock:
+        engine, _engine = _engine, None
+    if engine is not None:
+        engine.dispose()
+
+
+def new_session():
+    """Sesión nueva, creando el engine si todavía no existe"""
+    init_engine()
+    return SessionLocal()
+
+
+def __getattr__(name):
+    # ``from src.config.database import engine`` sigue funcionando
+    if name == "engine":
+        return init_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -0,0 +1,140 @@
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import sys
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+
+# Atributos propios de LogRecord; el resto son campos pasados con ``extra``
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+# Loggers que escriben un DEBUG por correo o por consulta; el muestreo solo se
+# aplica a estos, el DEBUG del resto de los módulos se escribe completo
+SAMPLED_LOGGERS = (
+    "src.services.email_service",
+    "src.services.code_extractor",
+    "src.services.link_extractor",
+)
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro; los campos de ``extra`` se agregan tal cual"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        payload.update((key, value) for key, value in vars(record).items()
+                       if key not in _RECORD_FIELDS)
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar uno de cada ``every`` registros DEBUG; los demás niveles pasan siempre"""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        return next(self._counter) % self.every == 0
+
+
+_state = {"handler": None, "sink": None, "listener": None, "sampling": None}
+
+
+def setup_logging(level: str = None, log_format: str = None, use_queue: bool = None,
+                  sample_every: int = None, stream=None):
+    """Configura el logger raíz del proceso.
+
+    Con la cola activa (por defecto) los hilos que registran solo encolan el
+    registro; un ``QueueListener`` en segundo plano lo formatea y lo escribe,
+    así que un stdout lento no bloquea el event loop ni el executor IMAP.
+    Se puede llamar de nuevo para cambiar de modo.
+
+    Args:
+        level: LOG_LEVEL (INFO por defecto)
+        log_format: LOG_FORMAT, "text" o "json"
+        use_queue: LOG_QUEUE_ENABLED (true por defecto)
+        sample_every: LOG_DEBUG_SAMPLE_EVERY; con DEBUG se escribe uno de cada N
+            registros de ``SAMPLED_LOGGERS`` (1 por defecto: sin muestreo)
+        stream: Destino de los registros (stdout por defecto)
+    """
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    log_format = log_format or os.getenv("LOG_FORMAT", "text")
+    if use_queue is None:
+        use_queue = os.getenv("LOG_QUEUE_ENABLED", "true").lower() == "true"
+    sample_every = sample_every or int(os.getenv("LOG_DEBUG_SAMPLE_EVERY", "1"))
+
+    _uninstall()
+    sink = logging.StreamHandler(stream or sys.stdout)
+    sink.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(LOG_FORMAT))
+
+    handler = sink
+    if use_queue:
+        log_queue = queue.SimpleQueue()
+        handler = QueueHandler(log_queue)
+        _state["listener"] = QueueListener(log_queue, sink)
+        _state["listener"].start()
+    if sample_every > 1:
+        # El filtro va en el logger de cada módulo: lo descartado ni siquiera se encola
+        _state["sampling"] = SamplingFilter(sample_every)
+        for name in SAMPLED_LOGGERS:
+            logging.getLogger(name).addFilter(_state["sampling"])
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(handler)
+    _state["handler"] = handler
+    _state["sink"] = sink
+
+
+def stop_logging():
+    """Vacía la cola y vuelve a escribir directo, para los registros del apagado"""
+    listener = _state["listener"]
+    if listener is None:
+        return
+    listener.stop()
+    _state["listener"] = None
+    root = logging.getLogger()
+    root.removeHandler(_state["handler"])
+    root.addHandler(_state["sink"])
+    _state["handler"] = _state["sink"]
+
+
+def _uninstall():
+    stop_logging()
+    if _state["handler"] is not None:
+        logging.getLogger().removeHandler(_state["handler"])
+        _state["handler"] = None
+    if _state["sampling"] is not None:
+        for name in SAMPLED_LOGGERS:
+            logging.getLogger(name).removeFilter(_state["sampling"])
+        _state["sampling"] = None
+
+
+def _restart_after_fork():
+    # El hilo del QueueListener no existe en el hijo de un fork (workers de
+    # gunicorn --preload): cada worker escribe con su propia cola y su hilo
+    if _state["listener"] is None:
+        return
+    log_queue = queue.SimpleQueue()
+    _state["handler"].queue = log_queue
+    _state["listener"] = QueueListener(log_queue, _state["sink"])
+    _state["listener"].start()
+
+
+atexit.register(stop_logging)
+os.register_at_fork(after_in_child=_restart_after_fork)
@@ -0,0 +1,240 @@
+from datetime import datetime
+from os import getenv
+import functools
+import logging
+import threading
+import time
+
+from src.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+ACCESS_REJECTIONS = registry.counter(
+    "code_access_rejections_total", "Correos rechazados antes de consultar IMAP", ("reason",))
+
+INVALID_EMAIL = "Correo inválido"
+UNAUTHORIZED_DOMAIN = "Dominio no autorizado"
+INACTIVE_ACCOUNT = "Cuenta inactiva"
+_REASONS = {INVALID_EMAIL: "invalid", UNAUTHORIZED_DOMAIN: "domain", INACTIVE_ACCOUNT: "inactive"}
+_UNKNOWN = object()
+
+
+@functools.lru_cache(maxsize=None)
+def last_used_update():
+    """UPDATE de ``last_used`` con parámetros ``account`` y ``used`` (para executemany)"""
+    # SQLAlchemy y los modelos se importan al primer uso, no al arrancar el worker
+    from sqlalchemy import bindparam
+    from src.models.email_account import EmailAccount
+
+    table = EmailAccount.__table__
+    return table.update().where(table.c.email == bindparam("account")).values(
+        last_used=bindparam("used"))
+
+
+def _new_session():
+    from src.config.database import new_session
+    return new_session()
+
+
+class AccessIndex:
+    """Dominios autorizados y cuentas en memoria para rechazar correos antes de IMAP.
+
+    Un correo pasa si es una cuenta de ``EmailAccount`` activa o si su
+    dominio, o uno de sus dominios padre, está en ``AuthorizedDomain``; las
+    cuentas con otro estado se rechazan aunque el dominio esté autorizado.
+    La consulta es una búsqueda en un set y un dict, sin tocar la base.
+
+    Un hilo recarga cada ACCESS_INDEX_REFRESH segundos solo los dominios con
+    ``updated_at`` posterior al último visto y las cuentas con id nuevo;
+    cada ACCESS_INDEX_FULL_REFRESH segundos recarga todo, para ver cambios de
+    estado y borrados (``EmailAccount`` no tiene ``updated_at``). Los
+    ``last_used`` de las cuentas consultadas se acumulan en memoria y el
+    mismo hilo los escribe por lotes, con un solo commit.
+
+    Mientras no haya cargado nunca (base caída al arrancar), o si las dos
+    tablas están vacías (control de acceso sin configurar), deja pasar todo.
+    """
+
+    def __init__(self, session_factory=None, enabled: bool = None):
+        self.session_factory = session_factory or _new_session
+        self.enabled = (enabled if enabled is not None
+                        else getenv("ACCESS_CONTROL_ENABLED", "true").lower() == "true")
+        self.refresh_interval = float(getenv("ACCESS_INDEX_REFRESH", "30"))
+        self.full_refresh_interval = float(getenv("ACCESS_INDEX_FULL_REFRESH", "600"))
+        self.flush_interval = float(getenv("LAST_USED_FLUSH_INTERVAL", "5"))
+
+        # Se reemplazan completos en cada recarga: las lecturas no toman el lock
+        self._domains: frozenset = frozenset()
+        # Correo en minúsculas -> correo tal como está en la base (None si no está activa)
+        self._accounts: dict[str, str] = {}
+        self._domains_seen: datetime = None
+        self._accounts_seen = 0
+        self._last_full = 0.0
+        self._last_refresh = 0.0
+        self.loaded = False
+
+        self._pending: dict[str, datetime] = {}
+        self._pending_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.flushed = 0
+
+    def check(self, email_address: str) -> str:
+        """Motivo del rechazo, o None si el correo puede consultarse
+
+        Las cuentas activas consultadas quedan pendientes de actualizar ``last_used``.
+        """
+        if not self.enabled or not self.configured:
+            return None
+        email_address = email_address.lower()
+        account = self._accounts.get(email_address, _UNKNOWN)
+        if account is None:
+            return self._reject(INACTIVE_ACCOUNT)
+        if account is not _UNKNOWN:
+            with self._pending_lock:
+                self._pending[account] = datetime.utcnow()
+            return None
+
+        local, _, domain = email_address.rpartition("@")
+        if not local or "." not in domain:
+            return self._reject(INVALID_EMAIL)
+        while domain:
+            if domain in self._domains:
+                return None
+            domain = domain.partition(".")[2]
+        return self._reject(UNAUTHORIZED_DOMAIN)
+
+    @property
+    def configured(self) -> bool:
+        """Cargado y con al menos un dominio o una cuenta"""
+        return self.loaded and bool(self._domains or self._accounts)
+
+    @staticmethod
+    def _reject(reason: str) -> str:
+        ACCESS_REJECTIONS.inc(reason=_REASONS[reason])
+        return reason
+
+    def refresh(self, full: bool = False):
+        """Recarga los cambios desde la base (todo si ``full`` o si nunca cargó)"""
+        from sqlalchemy import func, select
+        from src.models.authorized_domain import AuthorizedDomain
+        from src.models.email_account import EmailAccount
+
+        with self._refresh_lock:
+            full = full or not self.loaded
+            with self.session_factory() as session:
+                domain_query = select(AuthorizedDomain.domain, AuthorizedDomain.updated_at)
+                account_query = select(EmailAccount.id, EmailAccount.email, EmailAccount.status)
+                if not full:
+                    if self._domains_seen is not None:
+                        domain_query = domain_query.where(
+                            AuthorizedDomain.updated_at >= self._domains_seen)
+                    account_query = account_query.where(EmailAccount.id > self._accounts_seen)
+                domain_rows = session.execute(domain_query).all()
+                account_rows = session.execute(account_query).all()
+                if full:
+                    newest = session.execute(select(func.max(EmailAccount.id))).scalar()
+
+            domains = set() if full else set(self._domains)
+            domains.update(domain.strip().lower().lstrip("@")
+                           for domain, _ in domain_rows if domain)
+            accounts = {} if full else dict(self._accounts)
+            for _, address, status in account_rows:
+                if address:
+                    accounts[address.strip().lower()] = (
+                        address if (status or "active") == "active" else None)
+
+            if full:
+                self._domains_seen = None
+            seen = [updated_at for _, updated_at in domain_rows if updated_at]
+            self._domains_seen = max(seen + ([self._domains_seen] if self._domains_seen else []),
+                                     default=None)
+            if full:
+                self._accounts_seen = newest or 0
+            elif account_rows:
+                self._accounts_seen = max(row[0] for row in account_rows)
+
+            self._domains = frozenset(domains)
+            self._accounts = accounts
+            self._last_refresh = time.monotonic()
+            if full:
+                self._last_full = self._last_refresh
+            if full or domain_rows or account_rows:
+                logger.info("Índice de acceso %s: %d dominios, %d cuentas",
+                            "cargado" if full else "actualizado", len(domains), len(accounts))
+            if full and not domains and not accounts:
+                logger.warning("⚠️ Sin dominios ni cuentas autorizadas: se aceptan todos")
+            self.loaded = True
+
+    def flush(self) -> int:
+        """Escribe los ``last_used`` pendientes en un solo UPDATE por lotes"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            with self.session_factory() as session:
+                session.execute(last_used_update(), [{"account": account, "used": used}
+                                                    for account, used in pending.items()])
+                session.commit()
+        except Exception as e:
+            logger.error("Error guardando last_used de %d cuentas: %s", len(pending), e)
+            with self._pending_lock:
+                # Las fechas más nuevas que llegaron mientras tanto se conservan
+                for account, used in pending.items():
+                    self._pending.setdefault(account, used)
+            return 0
+        self.flushed += len(pending)
+        return len(pending)
+
+    def start(self):
+        """Inicia el hilo que carga el índice, lo recarga y escribe ``last_used``
+
+        No espera la primera carga: hasta entonces ``check`` deja pasar todo.
+        """
+        if not self.enabled or self._thread:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="access-index", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        if self._thread:
+            self._stop_event.set()
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        try:
+            self.refresh(full=True)
+        except Exception as e:
+            # Sin _last_refresh se reintenta en la primera vuelta del bucle
+            logger.warning("⚠️ Índice de acceso sin cargar, se reintentará: %s", e)
+        while not self._stop_event.wait(min(self.flush_interval, self.refresh_interval)):
+            self.flush()
+            now = time.monotonic()
+            if now - self._last_refresh < self.refresh_interval:
+                continue
+            try:
+                self.refresh(full=now - self._last_full >= self.full_refresh_interval)
+            except Exception as e:
+                self._last_refresh = now
+                logger.error("Error recargando el índice de acceso: %s", e)
+
+    def stats(self) -> dict:
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {
+            "enabled": self.enabled,
+            "loaded": self.loaded,
+            "configured": self.configured,
+            "domains": len(self._domains),
+            "accounts": len(self._accounts),
+            "last_used_pending": pending,
+            "last_used_flushed": self.flushed,
+        }
+
+
+access_index = AccessIndex()
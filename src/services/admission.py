@@ -0,0 +1,215 @@
+from collections import deque
+from os import getenv
+import asyncio
+import functools
+import math
+import threading
+import time
+
+from src.services.imap_executor import get_imap_executor
+from src.services.metrics import registry
+
+ADMISSION_REJECTIONS = registry.counter(
+    "code_admission_rejections_total",
+    "Búsquedas IMAP rechazadas por saturación o límite por destinatario", ("reason",))
+
+
+class AdmissionRejected(Exception):
+    """La búsqueda no se admitió; ``status`` es 429 o 503 y ``retry_after`` en segundos"""
+
+    def __init__(self, message: str, status: int, retry_after: int, reason: str):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+        ADMISSION_REJECTIONS.inc(reason=reason)
+
+
+class AdmissionLimiter:
+    """Limita las etapas IMAP simultáneas de un buzón central y acota la cola.
+
+    Se usa desde el event loop. Hasta ``limit`` etapas corren a la vez; las
+    demás esperan en una cola FIFO de a lo sumo ``max_queue`` peticiones y
+    como máximo ``max_wait`` segundos. Si la cola está llena o vence la
+    espera se rechaza con 503 y un ``Retry-After`` estimado con la duración
+    media reciente de las etapas.
+
+    El cupo se libera cuando termina el hilo del executor, no cuando vence
+    el timeout de la petición: una llamada IMAP colgada sigue ocupando su
+    lugar y no se acumulan más hilos bloqueados detrás de ella.
+    """
+
+    def __init__(self, limit: int, max_queue: int, max_wait: float, name: str = "imap"):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.name = name
+        self.active = 0
+        self._waiters: deque = deque()
+        self._avg_seconds = 1.0
+        self.admitted = 0
+        self.rejected = 0
+
+    async def run(self, func, *args, timeout: float = None):
+        """Ejecuta ``func(*args)`` en el executor IMAP dentro de un cupo
+
+        Raises:
+            AdmissionRejected: Si no hay cupo dentro de ``max_wait`` segundos
+            asyncio.TimeoutError: Si la etapa supera ``timeout`` segundos
+        """
+        await self._acquire()
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        future = loop.run_in_executor(get_imap_executor(), functools.partial(func, *args))
+        future.add_done_callback(lambda done: self._release(done, started))
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+
+    async def _acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("Servidor IMAP saturado, cola llena", "queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            raise self._reject("Servidor IMAP saturado, espera agotada", "queue_timeout")
+        except BaseException:
+            self._discard(waiter)
+            raise
+        self.admitted += 1
+
+    def _discard(self, waiter):
+        """Saca de la cola a quien dejó de esperar; si ya tenía cupo, lo cede"""
+        if waiter.done() and not waiter.cancelled():
+            self._pass_slot()
+            return
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _release(self, future, started: float):
+        if not future.cancelled():
+            # Nadie recupera la excepción si la petición ya venció
+            future.exception()
+        self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (time.monotonic() - started)
+        self._pass_slot()
+
+    def _pass_slot(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # El cupo pasa directamente al siguiente de la cola
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _reject(self, message: str, reason: str) -> AdmissionRejected:
+        self.rejected += 1
+        backlog = self.active + len(self._waiters)
+        retry_after = max(1, math.ceil(self._avg_seconds * backlog / self.limit))
+        return AdmissionRejected(message, 503, retry_after, reason)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_stage_ms": round(self._avg_seconds * 1000, 1),
+        }
+
+
+class RecipientRateLimiter:
+    """Token bucket por destinatario para las búsquedas que llegan a IMAP
+
+    Cada destinatario tiene ``burst`` búsquedas y recupera ``rate`` por
+    segundo, así un solo cliente que consulta en bucle no ocupa los cupos
+    IMAP de los demás. Las respuestas desde caché o desde el índice no
+    consumen tokens.
+    """
+
+    def __init__(self, rate: float, burst: float, max_entries: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_entries = max_entries
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, recipient: str):
+        """Consume un token o rechaza con 429
+
+        Raises:
+            AdmissionRejected: Si el destinatario agotó sus búsquedas
+        """
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.get(recipient, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+            if tokens < 1:
+                self._buckets[recipient] = (tokens, now)
+                retry_after = max(1, math.ceil((1 - tokens) / self.rate))
+                raise AdmissionRejected(
+                    "Demasiadas búsquedas para este correo", 429, retry_after, "rate_limited")
+            self._buckets[recipient] = (tokens - 1, now)
+            if len(self._buckets) > self.max_entries:
+                self._prune(now)
+
+    def _prune(self, now: float):
+        # Los buckets que ya se llenaron equivalen a no tener entrada
+        full = [recipient for recipient, (tokens, stamp) in self._buckets.items()
+                if tokens + (now - stamp) * self.rate >= self.burst]
+        for recipient in full:
+            del self._buckets[recipient]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"rate": self.rate, "burst": self.burst, "tracked": len(self._buckets)}
+
+
+recipient_limiter = RecipientRateLimiter(
+    rate=float(getenv("RECIPIENT_RATE_LIMIT", "0.5")),
+    burst=float(getenv("RECIPIENT_RATE_BURST", "5")),
+)
+
+_limiters: dict[str, AdmissionLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_admission(account: str) -> AdmissionLimiter:
+    """Devuelve el limitador del proceso para la cuenta, creándolo la primera vez"""
+    with _limiters_lock:
+        limiter = _limiters.get(account)
+        if limiter is None:
+            limit = int(getenv("IMAP_ADMISSION_LIMIT", getenv("IMAP_POOL_SIZE", "3")))
+            limiter = AdmissionLimiter(
+                limit,
+                max_queue=int(getenv("IMAP_ADMISSION_QUEUE", str(limit * 8))),
+                max_wait=float(getenv("IMAP_ADMISSION_WAIT", "5")),
+                name=account,
+            )
+            _limiters[account] = limiter
+        return limiter
+
+
+def admission_stats() -> dict:
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {account: limiter.stats() for account, limiter in limiters.items()}
+
+
+registry.callback(
+    "code_admission_slots", "Cupos IMAP por buzón: límite, en uso, en cola y cola máxima",
+    lambda: [((account, field), stats[field]) for account, stats in admission_stats().items()
+             for field in ("limit", "active", "queued", "max_queue")],
+    ("account", "field"))
@@ -0,0 +1,153 @@
+from collections import OrderedDict
+from datetime import datetime
+from os import getenv
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CodeResultCache:
+    """Caché LRU con TTL de resultados de check_email_for_codes por destinatario.
+
+    Los resultados sin código viven ``negative_ttl`` segundos; los resultados
+    con código, hasta que vence su validez de 15 minutos. Ambos se invalidan
+    en cuanto llega correo nuevo al buzón (cambio de UIDNEXT/EXISTS), porque
+    puede traer un código más reciente para el mismo destinatario.
+    """
+
+    def __init__(self, max_entries: int = 1024, negative_ttl: float = 5,
+                 validity_seconds: int = 900):
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self.validity_seconds = validity_seconds
+        self._entries = OrderedDict()  # destinatario -> (resultado, vence, generación)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._uidnext = {}  # buzón -> último UIDNEXT visto
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0,
+                       "expirations": 0, "invalidations": 0}
+
+    def get(self, recipient: str) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(recipient)
+            if item is None:
+                self._stats["misses"] += 1
+                return None
+            result, expires_at, generation = item
+            stale = generation != self._generation
+            if now >= expires_at or stale:
+                del self._entries[recipient]
+                self._stats["expirations" if not stale else "invalidations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(recipient)
+            self._stats["hits"] += 1
+            return result
+
+    @property
+    def generation(self) -> int:
+        """Generación actual; se toma antes de consultar el buzón y se pasa a ``put``"""
+        return self._generation
+
+    def put(self, recipient: str, result: dict, generation: int = None):
+        """Guarda el resultado de una consulta
+
+        Con ``generation`` (la vigente al empezar la consulta) el resultado
+        nace vencido si entretanto llegó correo nuevo al buzón.
+        """
+        if result.get("has_code"):
+            email_date = datetime.fromisoformat(result["email_date"])
+            age = (datetime.now(email_date.tzinfo) - email_date).total_seconds()
+            ttl = self.validity_seconds - age
+        else:
+            ttl = self.negative_ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            if generation is None:
+                generation = self._generation
+            self._entries[recipient] = (result, time.monotonic() + ttl, generation)
+            self._entries.move_to_end(recipient)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, recipient: str):
+        """Descarta la entrada de un destinatario (p. ej. llegó un correo nuevo para él)"""
+        with self._lock:
+            if self._entries.pop(recipient, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def mailbox_changed(self):
+        """Invalida todos los resultados: llegó correo nuevo al buzón"""
+        with self._lock:
+            self._generation += 1
+
+    def observe_uidnext(self, uidnext: int, mailbox: str = "INBOX"):
+        """Registra el UIDNEXT visto en un SELECT; si cambió, invalida los resultados"""
+        with self._lock:
+            previous = self._uidnext.get(mailbox)
+            if previous is not None and uidnext != previous:
+                self._generation += 1
+            self._uidnext[mailbox] = uidnext
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_ratio": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+
+class SingleFlight:
+    """Agrupa búsquedas concurrentes de la misma clave en una sola ejecución.
+
+    La búsqueda corre en su propia tarea, así que si el primer cliente se
+    desconecta los demás siguen esperando el mismo resultado.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.executed = 0
+        self.shared = 0
+
+    async def do(self, key: str, coro_factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.executed += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Marca la excepción como recuperada si ya no quedan clientes esperando
+            task.exception()
+
+    def stats(self) -> dict:
+        return {"executed": self.executed, "shared": self.shared,
+                "in_flight": len(self._inflight)}
+
+
+# Compartidos por todas las instancias de EmailCodeService del proceso
+code_cache = CodeResultCache(
+    max_entries=int(getenv("CODE_CACHE_SIZE", "1024")),
+    negative_ttl=float(getenv("CODE_CACHE_NEGATIVE_TTL", "5")),
+)
+single_flight = SingleFlight()
@@ -1,76 +1,47 @@
-import email
-from bs4 import BeautifulSoup
 import re
 import logging
 
+from src.services.extraction_rules import get_engine
+from src.services.mime_reader import read_body
+
 logger = logging.getLogger(__name__)
 
+_TAG_RE = re.compile(r'<[^>]*>')
+
 class CodeExtractor:
     @staticmethod
-    def extract_code_from_email(email_message) -> str:
-        """Extrae el código de verificación del mensaje de correo."""
+    def extract_code_from_email(email_message, service: str = "netflix") -> str:
+        """Extrae el código de verificación del mensaje de correo (``Message`` o bytes)."""
         try:
-            # Obtener el cuerpo del mensaje
-            body = CodeExtractor._get_email_body(email_message)
-            if not body:
-                return None
+            # Obtener el cuerpo del mensaje con el lector MIME compartido
+            raw = email_message if isinstance(email_message, bytes) else email_message.as_bytes()
+            return CodeExtractor.extract_code_from_body(read_body(raw), service)
 
-            # Patrones específicos de Netflix
-            patterns = [
-                r'código de acceso temporal.*?(\d{4,8})',  # Código de acceso temporal
-                r'código.*?(\d{4,8})',                     # Código general
-                r'code.*?(\d{4,8})',                      # Code en inglés
-                r'verification code:?\s*(\d{4,8})',       # Código de verificación
-                r'confirm.*?code:?\s*(\d{4,8})',          # Código de confirmación
-                r'\b\d{6}\b',                             # Códigos de 6 dígitos (común en Netflix)
-            ]
+        except Exception as e:
+            logger.error("❌ Error extrayendo código: %s", e)
+            return None
 
-            # Primero buscar en el texto plano
-            for pattern in patterns:
-                matches = re.findall(pattern, body, re.IGNORECASE)
-                if matches:
-                    code = matches[0] if isinstance(matches[0], str) else matches[0][0]
-                    logger.info(f"✅ Código encontrado: {code}")
-                    return code
+    @staticmethod
+    def extract_code_from_body(body: str, service: str = "netflix") -> str:
+        """Extrae el código de un cuerpo ya decodificado con las reglas del servicio."""
+        try:
+            if not body:
+                return None
 
-            # Si no se encuentra, buscar en elementos HTML específicos
-            soup = BeautifulSoup(body, 'html.parser')
-            
-            # Buscar en elementos con clases/IDs comunes de Netflix
-            code_elements = soup.find_all(['div', 'span', 'p'], {
-                'class': lambda x: x and any(word in str(x).lower() 
-                    for word in ['code', 'codigo', 'verification', 'pin'])
-            })
+            engine = get_engine(service)
 
-            for element in code_elements:
-                text = element.get_text()
-                for pattern in patterns:
-                    matches = re.findall(pattern, text, re.IGNORECASE)
-                    if matches:
-                        code = matches[0] if isinstance(matches[0], str) else matches[0][0]
-                        logger.info(f"✅ Código encontrado en HTML: {code}")
-                        return code
+            # En HTML se busca solo en el texto sin etiquetas, en una sola
+            # pasada: los dígitos de atributos y URLs (trkid=2000) no son códigos
+            if '<' in body:
+                body = _TAG_RE.sub(' ', body)
+            code, rule = engine.search(body)
+            if code:
+                logger.debug("✅ Código encontrado (%s): %s", rule, code)
+                return code
 
-            logger.warning("⚠️ No se encontró ningún código")
+            logger.debug("⚠️ No se encontró ningún código")
             return None
 
         except Exception as e:
-            logger.error(f"❌ Error extrayendo código: {str(e)}")
+            logger.error("❌ Error extrayendo código: %s", e)
             return None
-
-    @staticmethod
-    def _get_email_body(email_message) -> str:
-        """Extrae el cuerpo del mensaje de correo."""
-        try:
-            if email_message.is_multipart():
-                for part in email_message.walk():
-                    content_type = part.get_content_type()
-                    if content_type == "text/html":
-                        return part.get_payload(decode=True).decode()
-                    elif content_type == "text/plain":
-                        return part.get_payload(decode=True).decode()
-            else:
-                return email_message.get_payload(decode=True).decode()
-        except Exception as e:
-            logger.error(f"❌ Error obteniendo cuerpo del correo: {str(e)}")
-            return None
\ No newline at end of file
@@ -0,0 +1,52 @@
+from datetime import datetime
+import threading
+import logging
+
+from src.services.mime_reader import ParsedMessage
+
+logger = logging.getLogger(__name__)
+
+
+class CodeIndex:
+    """Índice en memoria de códigos extraídos, por destinatario en minúsculas.
+
+    Cada entrada es el ``ParsedMessage`` del último correo con código para el
+    destinatario. Es seguro entre hilos, ya que lo escribe el ingestor IMAP y
+    lo leen los endpoints.
+    """
+
+    def __init__(self):
+        self._entries: dict[str, ParsedMessage] = {}
+        self._lock = threading.Lock()
+
+    def put(self, recipient: str, entry: ParsedMessage) -> bool:
+        """Guarda la entrada si es más reciente que la existente"""
+        recipient = recipient.lower()
+        with self._lock:
+            current = self._entries.get(recipient)
+            if current and current.date >= entry.date:
+                return False
+            self._entries[recipient] = entry
+            return True
+
+    def get(self, recipient: str) -> ParsedMessage:
+        with self._lock:
+            return self._entries.get(recipient.lower())
+
+    def prune(self, oldest: datetime) -> int:
+        """Elimina las entradas con fecha anterior a ``oldest``"""
+        with self._lock:
+            expired = [r for r, e in self._entries.items() if e.date < oldest]
+            for recipient in expired:
+                del self._entries[recipient]
+        if expired:
+            logger.info("Índice de códigos: %d entradas expiradas eliminadas", len(expired))
+        return len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
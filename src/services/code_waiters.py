@@ -0,0 +1,76 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _Waiters:
+    __slots__ = ("event", "count")
+
+    def __init__(self):
+        self.event = asyncio.Event()
+        self.count = 0
+
+
+class CodeWaiters:
+    """Peticiones en espera de un código, agrupadas por destinatario.
+
+    Todas las peticiones del mismo destinatario esperan sobre un único
+    ``asyncio.Event``; cada una solo ocupa su corrutina, sin hilos ni
+    sondeos. El ingestor, desde su hilo, llama a ``notify`` y el aviso se
+    entrega en el event loop con ``call_soon_threadsafe``.
+    """
+
+    def __init__(self):
+        self._waiters: dict[str, _Waiters] = {}
+        self._loop: asyncio.AbstractEventLoop = None
+        self.notified = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Asocia el event loop que atiende las peticiones (en el lifespan)"""
+        self._loop = loop
+
+    async def wait(self, recipient: str, timeout: float) -> bool:
+        """Espera un aviso para el destinatario; devuelve False si vence el plazo"""
+        recipient = recipient.lower()
+        waiters = self._waiters.get(recipient)
+        if waiters is None:
+            waiters = self._waiters[recipient] = _Waiters()
+        waiters.count += 1
+        try:
+            await asyncio.wait_for(waiters.event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            waiters.count -= 1
+            if waiters.count == 0 and self._waiters.get(recipient) is waiters:
+                del self._waiters[recipient]
+
+    def notify(self, recipient: str):
+        """Despierta a las peticiones del destinatario (seguro desde cualquier hilo)"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake, recipient.lower())
+        except RuntimeError:
+            # El loop se cerró entre la comprobación y la llamada
+            pass
+
+    def _wake(self, recipient: str):
+        waiters = self._waiters.pop(recipient, None)
+        if waiters is not None:
+            self.notified += waiters.count
+            waiters.event.set()
+
+    def stats(self) -> dict:
+        return {
+            "recipients": len(self._waiters),
+            "waiting": sum(waiters.count for waiters in self._waiters.values()),
+            "notified": self.notified,
+        }
+
+
+# Instancia del proceso, compartida por el ingestor y los endpoints
+code_waiters = CodeWaiters()
@@ -1,99 +1,103 @@
-from datetime import datetime, timedelta
-from bs4 import BeautifulSoup
-from sqlalchemy.orm import Session
+from datetime import datetime
 from fastapi import HTTPException
+import asyncio
 import logging
 import imaplib
 import email
 import re
-import socket
+import time
 import pytz
-from email.header import decode_header
 from email.utils import parsedate_to_datetime
 from os import getenv
-from src.services.code_extractor import CodeExtractor
+from src.services.admission import AdmissionRejected, get_admission, recipient_limiter
+from src.services.code_cache import code_cache, single_flight
+from src.services.imap_pool import get_imap_pool
+from src.services.inboxes import CentralInbox, load_inboxes
+from src.services.mailbox_sync import MailboxSync, get_mailbox_sync
+from src.services.metrics import registry
+from src.services.mime_reader import MAX_MESSAGE_BYTES, message_guid, read_body
+from src.services.pipeline_stats import pipeline_stats, response_size
+from src.services.providers import get_provider_index, provider_for_code_type
+from src.services.sync_store import get_sync_store
 
 logger = logging.getLogger(__name__)
 
+CODE_VALIDITY_SECONDS = 900  # 15 minutos
+HEADER_FETCH_ITEMS = "(BODY.PEEK[HEADER.FIELDS (FROM TO DATE SUBJECT)])"
+
+CODE_LOOKUPS = registry.counter(
+    "code_lookups_total", "Consultas de código por origen de la respuesta", ("source",))
+
+_UID_RE = re.compile(rb'UID (\d+)')
+
+
+def _iter_fetch_payloads(data):
+    """Recorre una respuesta de UID FETCH devolviendo (uid, literal)"""
+    for position, item in enumerate(data or []):
+        if not isinstance(item, tuple):
+            continue
+        match = _UID_RE.search(item[0])
+        if not match and position + 1 < len(data) and isinstance(data[position + 1], bytes):
+            # Algunos servidores envían el UID después del literal
+            match = _UID_RE.search(data[position + 1])
+        if match:
+            yield match.group(1), item[1]
+
 class EmailCodeService:
-    def __init__(self, db: Session):
-        self.db = db
-        self.code_extractor = CodeExtractor()
+    def __init__(self, inbox: CentralInbox = None):
         self.timezone = pytz.timezone('America/Caracas')
 
-        # Configuración para Gmail central
-        self.central_email = "serviciosnetplus@gmail.com"
-        self.imap_server = "imap.gmail.com"
-        self.imap_port = 993
+        # Buzón central de esta instancia (el primero configurado por defecto)
+        inbox = inbox or load_inboxes()[0]
+        self.central_email = inbox.email
+        self.imap_server = getenv('IMAP_SERVER', "imap.gmail.com")
+        self.imap_port = int(getenv('IMAP_PORT', "993"))
+        self.imap_ssl = getenv('IMAP_SSL', "true").lower() == "true"
         self.timeout = 60
+        # Límite por operación IMAP (socket) y por búsqueda completa
+        self.operation_timeout = int(getenv('IMAP_OPERATION_TIMEOUT', "20"))
+        self.request_timeout = int(getenv('IMAP_REQUEST_TIMEOUT', "30"))
+        # Mensajes nuevos que procesa como máximo cada sincronización
+        self.batch_window = int(getenv('IMAP_BATCH_WINDOW', "500"))
 
-        # Cache de conexión IMAP
-        self._mail_connection = None
-        self._last_connection_time = None
-        self._connection_timeout = 300  # 5 minutos
-
-        self.central_password = getenv('GMAIL_APP_PASSWORD')
+        self.central_password = inbox.password
         if not self.central_password:
-            raise Exception("GMAIL_APP_PASSWORD no está configurado en .env")
+            raise Exception(
+                f"GMAIL_APP_PASSWORD no está configurado en .env ({self.central_email})")
+
+        # Pool de conexiones IMAP y estado de sincronización compartidos por el proceso
+        self.pool = get_imap_pool(self.central_email, self._connect_to_imap)
+        self.admission = get_admission(self.central_email)
+        self.mailbox_sync = get_mailbox_sync(self.central_email, lambda: MailboxSync(
+            self, get_sync_store(), get_provider_index(), CODE_VALIDITY_SECONDS,
+            max_messages=self.batch_window))
 
     def _get_current_time(self):
         """Obtiene la hora actual en la zona horaria de Caracas"""
         return datetime.now(self.timezone)
 
-    def _get_mail_connection(self):
-        """Reutiliza la conexión IMAP si está activa"""
-        current_time = self._get_current_time()
-
-        if (self._mail_connection and self._last_connection_time and
-                (current_time - self._last_connection_time).seconds < self._connection_timeout):
-            try:
-                self._mail_connection.noop()
-                return self._mail_connection
-            except:
-                pass
-
-        if self._mail_connection:
-            try:
-                self._mail_connection.close()
-                self._mail_connection.logout()
-            except:
-                pass
-
-        self._mail_connection = self._connect_to_imap()
-        self._last_connection_time = current_time
-        return self._mail_connection
-
     def _connect_to_imap(self):
         """Establece conexión con el servidor IMAP"""
         try:
-            logger.info(f"Conectando a {self.imap_server}:{self.imap_port}")
-            socket.setdefaulttimeout(self.timeout)
-            mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
+            logger.info("Conectando a %s:%s", self.imap_server, self.imap_port)
+            imap_class = imaplib.IMAP4_SSL if self.imap_ssl else imaplib.IMAP4
+            # Timeout solo para este socket, sin tocar el valor global del proceso
+            started = time.perf_counter()
+            mail = imap_class(self.imap_server, self.imap_port, timeout=self.timeout)
+            pipeline_stats.record("connect", 0, time.perf_counter() - started)
+            started = time.perf_counter()
             mail.login(self.central_email, self.central_password)
+            pipeline_stats.record("login", 0, time.perf_counter() - started)
+            mail.sock.settimeout(self.operation_timeout)
             return mail
         except Exception as e:
-            logger.error(f"Error de conexión: {str(e)}")
+            logger.error("Error de conexión: %s", e)
             raise HTTPException(
                 status_code=503,
                 detail={"status": "error",
                         "message": f"Error de conexión: {str(e)}"}
             )
 
-    def _get_email_body(self, email_message) -> str:
-        """Extrae el cuerpo del mensaje de correo"""
-        try:
-            if email_message.is_multipart():
-                for part in email_message.walk():
-                    if part.get_content_type() == "text/html":
-                        payload = part.get_payload(decode=True)
-                        return payload.decode('utf-8', errors='ignore')
-            else:
-                payload = email_message.get_payload(decode=True)
-                return payload.decode('utf-8', errors='ignore')
-        except Exception as e:
-            logger.error(f"Error decodificando el cuerpo del email: {str(e)}")
-            return ""
-
     def _is_email_valid(self, email_message) -> tuple[bool, datetime]:
         """Verifica si el correo está dentro del tiempo válido"""
         try:
@@ -108,156 +112,286 @@ class EmailCodeService:
 
             # Verificar si el correo tiene menos de 15 minutos
             time_difference = current_time - email_date
-            is_valid = time_difference.total_seconds() < 900  # 15 minutos
+            is_valid = time_difference.total_seconds() < CODE_VALIDITY_SECONDS
 
-            logger.info(f"Validación de correo - Fecha: {email_date}, Hora actual: {current_time}, Diferencia: {time_difference.total_seconds()}s, Válido: {is_valid}")
+            logger.debug("Validación de correo - Fecha: %s, Hora actual: %s, Diferencia: %.0fs, "
+                         "Válido: %s", email_date, current_time,
+                         time_difference.total_seconds(), is_valid)
             return is_valid, email_date
 
         except Exception as e:
-            logger.error(f"Error al procesar fecha: {str(e)}")
+            logger.error("Error al procesar fecha: %s", e)
             return False, None
 
+    def _build_code_response(self, email_address: str, code_url: str,
+                             code_type: str, email_date: datetime) -> dict:
+        """Construye la respuesta para un código válido encontrado
+
+        ``code_url`` es la URL del botón o, si el proveedor envía el código en
+        el texto, el código mismo, que se devuelve en ``code``.
+        """
+        logger.debug("URL del código encontrada: %s", code_url)
+
+        # Calcular tiempo restante
+        age = self._get_current_time() - email_date
+        remaining_seconds = CODE_VALIDITY_SECONDS - age.total_seconds()
+        remaining_minutes = max(1, int(remaining_seconds / 60))
+
+        message_text = "Código válido encontrado"
+        if code_type == "netflix_home_update":
+            message_text = "Confirmación de actualización de hogar encontrada"
+
+        provider = provider_for_code_type(code_type)
+        link = provider is None or provider.link
+        return {
+            "has_code": True,
+            "code_url": code_url if link else None,
+            "code": None if link else code_url,
+            "provider": provider.name if provider else None,
+            "email": email_address,
+            "type": code_type,
+            "message": message_text,
+            "message_guid": message_guid(code_url) if link else None,
+            "expires_in": f"{remaining_minutes} minutos",
+            "email_date": email_date.isoformat(),
+            "timestamp": self._get_current_time().isoformat()
+        }
+
+    def _build_no_code_response(self, email_address: str,
+                                message: str = "No se encontraron códigos válidos") -> dict:
+        """Construye la respuesta cuando no hay códigos para el correo"""
+        return {
+            "has_code": False,
+            "message": message,
+            "email": email_address,
+            "timestamp": self._get_current_time().isoformat()
+        }
+
+    def _fetch_headers(self, mail, uids: list[bytes]) -> list:
+        """Descarga From/To/Date/Subject de todos los UIDs en un solo FETCH"""
+        started = time.perf_counter()
+        _, header_data = mail.uid("FETCH", b",".join(uids), HEADER_FETCH_ITEMS)
+        pipeline_stats.record("fetch_headers", response_size(header_data),
+                              time.perf_counter() - started, items=len(uids))
+        started = time.perf_counter()
+        headers = [(uid, email.message_from_bytes(raw))
+                   for uid, raw in _iter_fetch_payloads(header_data)]
+        pipeline_stats.record("parse_headers", 0, time.perf_counter() - started,
+                              items=len(headers))
+        return headers
+
+    def _fetch_bodies(self, mail, uids: list[bytes]) -> dict:
+        """Descarga en un solo FETCH los mensajes de los UIDs y extrae su cuerpo
+
+        Se piden a lo sumo MAIL_MAX_MESSAGE_BYTES por mensaje: el botón está en
+        la parte html, antes de las imágenes adjuntas.
+
+        Returns:
+            dict: uid -> cuerpo html (o texto) del correo
+        """
+        started = time.perf_counter()
+        _, msg_data = mail.uid("FETCH", b",".join(uids), f"(BODY.PEEK[]<0.{MAX_MESSAGE_BYTES}>)")
+        pipeline_stats.record("fetch_body", response_size(msg_data),
+                              time.perf_counter() - started, items=len(uids))
+        started = time.perf_counter()
+        bodies = {}
+        for uid, raw in _iter_fetch_payloads(msg_data):
+            try:
+                bodies[uid] = read_body(raw)
+            except Exception as e:
+                logger.error("Error decodificando el cuerpo del email: %s", e)
+        pipeline_stats.record("parse_body", 0, time.perf_counter() - started,
+                              items=len(bodies))
+        return bodies
+
+    def _refresh_cached_response(self, cached: dict) -> dict:
+        """Actualiza el tiempo restante y la marca de tiempo de un resultado cacheado"""
+        if cached.get("has_code"):
+            return self._build_code_response(
+                cached["email"], cached["code_url"] or cached["code"], cached["type"],
+                datetime.fromisoformat(cached["email_date"]))
+        return {**cached, "timestamp": self._get_current_time().isoformat()}
+
+    def _check_blocking(self, email_address: str) -> dict:
+        """Sincroniza los mensajes nuevos y responde desde el store; se ejecuta
+        en el executor IMAP, nunca en el event loop"""
+        self._sync_blocking()
+        return self.mailbox_sync.lookup(email_address)
+
+    def _check_batch_blocking(self, email_addresses: list[str]) -> dict:
+        """Una sola sincronización para todos los correos pedidos (executor IMAP)
+
+        El costo crece con los mensajes nuevos del buzón y no con los destinatarios.
+        """
+        self._sync_blocking()
+        return {address: self.mailbox_sync.lookup(address) for address in email_addresses}
+
+    def _sync_blocking(self) -> list:
+        """Procesa los mensajes nuevos del buzón central con una conexión del pool
+
+        Descarta de la caché a los destinatarios con códigos nuevos, aunque la
+        sincronización la haya disparado la consulta de otro destinatario.
+
+        Returns:
+            list: Registros con código nuevos (``ParsedMessage``)
+        """
+        with self.pool.connection() as mail:
+            found = self.mailbox_sync.sync(mail)
+        for record in found:
+            code_cache.invalidate(record.recipient)
+        return found
+
+    def check_connection(self):
+        """Verifica que una conexión del pool pueda abrir INBOX (bloqueante)"""
+        with self.pool.connection() as mail:
+            mail.select("INBOX")
+
     async def check_email_for_codes(self, email_address: str) -> dict:
+        started = time.perf_counter()
         try:
             email_address = email_address.lower()
-            logger.info(f"Buscando códigos para: {email_address}")
-            
-            mail = self._get_mail_connection()
-            mail.select("INBOX")
 
-            # Calcular el rango de tiempo para la búsqueda
-            current_time = self._get_current_time()
-            start_time = current_time - timedelta(minutes=20)   
+            cached = code_cache.get(email_address)
+            if cached is not None:
+                CODE_LOOKUPS.inc(source="cache")
+                result = self._refresh_cached_response(cached)
+                self._log_lookup(email_address, "cache", result, started)
+                return result
+            CODE_LOOKUPS.inc(source="imap")
+            recipient_limiter.take(email_address)
+
+            # Las peticiones simultáneas del mismo correo comparten una búsqueda
+            generation = code_cache.generation
+            result = await single_flight.do(email_address, lambda: self.run_imap_stage(
+                self._check_blocking, email_address))
+            code_cache.put(email_address, result, generation)
+            self._log_lookup(email_address, "imap", result, started)
+            return result
 
-            # Búsqueda simplificada
-            search_date = start_time.strftime("%d-%b-%Y")
-            search_criteria = f'(SINCE "{search_date}" FROM "info@account.netflix.com")'.encode()
+        except Exception as e:
+            raise self._lookup_error(e, email_address)
+
+    async def check_emails_for_codes(self, email_addresses: list[str]) -> dict:
+        """Busca códigos para varios correos con una sola sincronización del buzón
+
+        Los correos que agotaron su límite de búsquedas no se consultan: su
+        resultado trae ``rate_limited`` y ``retry_after`` en lugar de un 429
+        para todo el lote.
 
-            # Agregar búsqueda para "Cómo actualizar tu hogar con Netflix"
-            search_criteria_update = f'(SINCE "{search_date}" FROM "info@account.netflix.com" SUBJECT "Cómo actualizar tu hogar con Netflix")'.encode()
+        Returns:
+            dict: Resultado por correo, con la misma forma que check_email_for_codes
+        """
+        started = time.perf_counter()
+        addresses = list(dict.fromkeys(address.lower() for address in email_addresses))
+        try:
+            results = {}
+            missing = []
+            for address in addresses:
+                cached = code_cache.get(address)
+                if cached is not None:
+                    results[address] = self._refresh_cached_response(cached)
+                else:
+                    missing.append(address)
+
+            hits = len(addresses) - len(missing)
+            CODE_LOOKUPS.inc(hits, source="cache")
+            missing, limited = self._take_tokens(missing)
+            results.update(limited)
+            if missing:
+                CODE_LOOKUPS.inc(len(missing), source="imap")
+                generation = code_cache.generation
+                found = await self.run_imap_stage(self._check_batch_blocking, missing)
+                for address, result in found.items():
+                    code_cache.put(address, result, generation)
+                    results[address] = result
+
+            self._log_batch(results, hits, started)
+            return {address: results[address] for address in addresses}
 
-            logger.info(f"Búsqueda - Hora actual: {current_time}, Inicio: {start_time}, Criterios: {search_criteria}")
+        except Exception as e:
+            raise self._lookup_error(e, ", ".join(addresses))
 
-            _, messages = mail.search(None, search_criteria)
-            logger.info(f"Mensajes encontrados: {len(messages[0].split()) if messages[0] else 0}")
+    def _take_tokens(self, email_addresses: list[str]) -> tuple[list, dict]:
+        """Consume una búsqueda del límite de cada correo antes de la etapa IMAP
 
-            if not messages[0]:
-                return {
+        Returns:
+            tuple: Correos admitidos y resultado de cada correo rechazado
+        """
+        admitted = []
+        limited = {}
+        for address in email_addresses:
+            try:
+                recipient_limiter.take(address)
+            except AdmissionRejected as e:
+                limited[address] = {
                     "has_code": False,
-                    "message": "No se encontraron códigos pendientes",
-                    "email": email_address,
+                    "rate_limited": True,
+                    "message": str(e),
+                    "retry_after": e.retry_after,
+                    "email": address,
                     "timestamp": self._get_current_time().isoformat()
                 }
-
-            # Procesar correos del más reciente al más antiguo
-            message_nums = messages[0].split()
-            message_nums.reverse()
-
-            for num in message_nums[:80]:
-                try:
-                    _, msg_data = mail.fetch(num, "(RFC822)")
-                    email_message = email.message_from_bytes(msg_data[0][1])
-
-                    # Verificar destinatario
-                    to_address = email_message.get('To', '').lower()
-                    logger.info(f"Verificando destinatario - To: {to_address}, Buscando: {email_address}")
-                    
-                    if email_address not in to_address:
-                        continue
-
-                    # Verificar tiempo válido
-                    is_valid, email_date = self._is_email_valid(email_message)
-                    if not is_valid:
-                        logger.info(f"Correo expirado para {email_address}")
-                        continue
-                        
-                    # Agregar atributo para rastrear el tipo de código
-                    email_message.code_type = "netflix_code"
-
-                    # Procesar cuerpo del correo
-                    body = self._get_email_body(email_message)
-                    if not body:
-                        logger.info("Cuerpo del correo vacío")
-                        continue
-
-                    soup = BeautifulSoup(body, 'lxml', from_encoding='utf-8')
-                    logger.info("Buscando botón de código...")
-
-                    # Buscar botón de código
-                    get_code_button = None
-                    for link in soup.find_all('a'):
-                        href = link.get('href', '')
-                        text = link.get_text().lower()
-                        style = link.get('style', '')
-                        
-                        logger.info(f"Enlace encontrado - Texto: {text}, Href: {href}, Style: {style}")
-                        
-                        if ('netflix.com' in href and 
-                            ('codigo' in text or 'code' in text or 
-                             'obtener' in text or 'get' in text or 
-                             '#e50914' in style)):
-                            get_code_button = link
-                            break
-
-                        # Nueva condición para el caso de "Cómo actualizar tu hogar con Netflix"
-                        if ('netflix.com' in href and 
-                            ('actualizar' in text or 'update' in text)):
-                            get_code_button = link
-                            break
-                            
-                        # Condición para detectar el botón "Sí, la envié yo" en emails de actualización de hogar
-                        if ('netflix.com' in href and
-                            ('sí, la envié yo' in text.lower() or 'si, la envie yo' in text.lower())):
-                            logger.info(f"Botón de confirmación de actualización de hogar encontrado: {text}")
-                            get_code_button = link
-                            # Marcar como tipo de código de hogar
-                            email_message.code_type = "netflix_home_update"
-                            break
-
-                    if get_code_button and (code_url := get_code_button.get('href')):
-                        logger.info(f"URL del código encontrada: {code_url}")
-                        
-                        if 'netflix.com' in code_url:
-                            message_guid = re.search(r'messageGuid=([^&]+)', code_url)
-
-                            # Calcular tiempo restante
-                            remaining_seconds = 900 - (self._get_current_time() - email_date).total_seconds()
-                            remaining_minutes = max(1, int(remaining_seconds / 60))
-
-                            code_type = getattr(email_message, 'code_type', "netflix_code")
-                            message_text = "Código válido encontrado"
-                            if code_type == "netflix_home_update":
-                                message_text = "Confirmación de actualización de hogar encontrada"
-                                
-                            return {
-                                "has_code": True,
-                                "code_url": code_url,
-                                "email": email_address,
-                                "type": code_type,
-                                "message": message_text,
-                                "message_guid": message_guid.group(1) if message_guid else None,
-                                "expires_in": f"{remaining_minutes} minutos",
-                                "email_date": email_date.isoformat(),
-                                "timestamp": self._get_current_time().isoformat()
-                            }
-                except Exception as e:
-                    logger.error(f"Error procesando mensaje individual: {str(e)}")
-                    continue
-
-            return {
-                "has_code": False,
-                "message": "No se encontraron códigos válidos",
-                "email": email_address,
-                "timestamp": self._get_current_time().isoformat()
-            }
-
-        except Exception as e:
-            logger.error(f"Error general: {str(e)}")
-            raise HTTPException(
-                status_code=500,
+                continue
+            admitted.append(address)
+        return admitted, limited
+
+    async def run_imap_stage(self, func, *args):
+        """Ejecuta una etapa IMAP bloqueante con control de admisión y timeout
+
+        Raises:
+            AdmissionRejected: Si el buzón está saturado
+            asyncio.TimeoutError: Si la etapa supera IMAP_REQUEST_TIMEOUT
+        """
+        return await self.admission.run(func, *args, timeout=self.request_timeout)
+
+    def _log_lookup(self, email_address: str, source: str, result: dict, started: float):
+        """Una línea de resumen por consulta, en lugar de registros por mensaje o enlace"""
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.info("Consulta de código %s: origen=%s, código=%s, %.1fms",
+                    email_address, source, result["has_code"], elapsed_ms,
+                    extra={"email": email_address, "source": source,
+                           "has_code": result["has_code"], "duration_ms": round(elapsed_ms, 2)})
+
+    def _log_batch(self, results: dict, hits: int, started: float):
+        """Una línea de resumen por consulta de varios correos"""
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        codes = sum(1 for result in results.values() if result.get("has_code"))
+        logger.info("Consulta de %d correos: %d en caché, %d con código, %.1fms",
+                    len(results), hits, codes, elapsed_ms,
+                    extra={"emails": len(results), "cache_hits": hits, "codes": codes,
+                           "duration_ms": round(elapsed_ms, 2)})
+
+    def _lookup_error(self, error: Exception, email_address: str) -> HTTPException:
+        """Convierte un error de búsqueda en la HTTPException correspondiente"""
+        if isinstance(error, AdmissionRejected):
+            logger.debug("Búsqueda rechazada para %s: %s (%s)", email_address, error,
+                         error.reason)
+            return HTTPException(
+                status_code=error.status,
                 detail={
                     "status": "error",
-                    "message": str(e),
+                    "message": str(error),
+                    "retry_after": error.retry_after,
+                    "timestamp": self._get_current_time().isoformat()
+                },
+                headers={"Retry-After": str(error.retry_after)}
+            )
+        if isinstance(error, asyncio.TimeoutError):
+            logger.error("Tiempo de espera agotado buscando códigos para %s", email_address)
+            return HTTPException(
+                status_code=504,
+                detail={
+                    "status": "error",
+                    "message": "El servidor IMAP no respondió a tiempo",
                     "timestamp": self._get_current_time().isoformat()
                 }
-            )
\ No newline at end of file
+            )
+        logger.error("Error general: %s", error)
+        return HTTPException(
+            status_code=500,
+            detail={
+                "status": "error",
+                "message": str(error),
+                "timestamp": self._get_current_time().isoformat()
+            }
+        )
\ No newline at end of file
@@ -0,0 +1,100 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Longitud máxima analizada por cuerpo y separación máxima entre la palabra
+# clave y el código: ningún patrón puede recorrer más que esto
+MAX_BODY_CHARS = 200_000
+MAX_GAP = 120
+
+_CODE_GROUP = "(?P<code>"
+
+
+class PatternEngine:
+    """Motor de extracción de una sola pasada sobre reglas con prioridad.
+
+    Las reglas se combinan en una única alternancia con grupos con nombre
+    (``r0``, ``r1``...), compilada una vez. Cada regla marca el código con
+    ``(?P<code>...)``. Un solo ``finditer`` recorre el texto y devuelve la
+    coincidencia de mayor prioridad (la primera regla de la lista) y, a igual
+    prioridad, la que aparece antes.
+
+    ``first_chars`` (clase de caracteres con los que puede empezar alguna regla)
+    permite al motor de ``re`` descartar rápido las posiciones que no sirven.
+    """
+
+    def __init__(self, rules: list[tuple[str, str]], first_chars: str = None,
+                 max_body_chars: int = MAX_BODY_CHARS):
+        self.rule_names = [name for name, _ in rules]
+        self.max_body_chars = max_body_chars
+
+        alternatives = []
+        for index, (name, pattern) in enumerate(rules):
+            if _CODE_GROUP not in pattern:
+                raise ValueError(f"La regla {name} no define el grupo (?P<code>...)")
+            pattern = pattern.replace(_CODE_GROUP, f"(?P<c{index}>")
+            alternatives.append(f"(?P<r{index}>{pattern})")
+        combined = "|".join(alternatives)
+        if first_chars:
+            combined = f"(?=[{first_chars}])(?:{combined})"
+        self._regex = re.compile(combined, re.IGNORECASE)
+
+    def search(self, text: str) -> tuple[str, str]:
+        """Devuelve (código, nombre de la regla) o (None, None)"""
+        best_index = None
+        best_code = None
+        for match in self._regex.finditer(text[:self.max_body_chars]):
+            index = int(match.lastgroup[1:])
+            if best_index is None or index < best_index:
+                best_index = index
+                best_code = match.group(f"c{index}")
+                if index == 0:
+                    break
+        if best_index is None:
+            return None, None
+        return best_code, self.rule_names[best_index]
+
+
+_engines: dict[str, PatternEngine] = {}
+
+
+def register_rules(service: str, rules: list[tuple[str, str]],
+                   first_chars: str = None) -> PatternEngine:
+    """Compila y registra las reglas de extracción de un servicio"""
+    engine = PatternEngine(rules, first_chars=first_chars)
+    _engines[service] = engine
+    return engine
+
+
+def get_engine(service: str) -> PatternEngine:
+    engine = _engines.get(service)
+    if engine is None:
+        raise KeyError(f"No hay reglas de extracción registradas para {service}")
+    return engine
+
+
+# Patrones específicos de Netflix, de mayor a menor prioridad
+register_rules("netflix", [
+    ("temporary_access", rf"código de acceso temporal.{{0,{MAX_GAP}}}?(?P<code>\d{{4,8}})"),
+    ("codigo", rf"código.{{0,{MAX_GAP}}}?(?P<code>\d{{4,8}})"),
+    ("code", rf"code.{{0,{MAX_GAP}}}?(?P<code>\d{{4,8}})"),
+    ("verification", r"verification code:?\s*(?P<code>\d{4,8})"),
+    ("confirm", rf"confirm.{{0,{MAX_GAP}}}?code:?\s*(?P<code>\d{{4,8}})"),
+    ("six_digits", r"\b(?P<code>\d{6})\b"),
+], first_chars="cv0-9")
+
+# Disney+ envía un código de acceso único de 6 dígitos en el texto del correo
+register_rules("disney", [
+    ("passcode", rf"(?:código de acceso|passcode).{{0,{MAX_GAP}}}?(?P<code>\d{{6}})"),
+    ("codigo", rf"(?:código|code).{{0,{MAX_GAP}}}?(?P<code>\d{{6}})"),
+    ("six_digits", r"\b(?P<code>\d{6})\b"),
+], first_chars="cp0-9")
+
+# Max (HBO) envía el código de verificación de 6 dígitos en el texto
+register_rules("max", [
+    ("verification",
+     rf"(?:código de verificación|verification code).{{0,{MAX_GAP}}}?(?P<code>\d{{6}})"),
+    ("codigo", rf"(?:código|code).{{0,{MAX_GAP}}}?(?P<code>\d{{6}})"),
+    ("six_digits", r"\b(?P<code>\d{6})\b"),
+], first_chars="cv0-9")
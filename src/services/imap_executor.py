@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
+from os import getenv
+import asyncio
+import functools
+import threading
+
+from src.services.inboxes import load_inboxes
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_imap_executor() -> ThreadPoolExecutor:
+    """Executor acotado para las llamadas bloqueantes de imaplib y el parseo HTML.
+
+    Por defecto tiene tantos hilos como conexiones suman los pools IMAP de
+    todos los buzones centrales, de modo que ningún hilo quede bloqueado
+    esperando una conexión y cada buzón pueda sincronizar en paralelo.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            pool_size = int(getenv("IMAP_POOL_SIZE", "3"))
+            workers = int(getenv("IMAP_EXECUTOR_WORKERS", pool_size * len(load_inboxes())))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="imap")
+        return _executor
+
+
+async def run_imap(func, *args, timeout: float = None):
+    """Ejecuta ``func(*args)`` en el executor IMAP sin bloquear el event loop
+
+    Raises:
+        asyncio.TimeoutError: Si la operación supera ``timeout`` segundos
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(get_imap_executor(), functools.partial(func, *args))
+    return await asyncio.wait_for(future, timeout)
+
+
+def shutdown_imap_executor():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor:
+        executor.shutdown(wait=False, cancel_futures=True)
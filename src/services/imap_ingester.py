@@ -0,0 +1,223 @@
+from datetime import timedelta
+from os import getenv
+import imaplib
+import logging
+import select
+import ssl
+import threading
+import time
+
+from src.services.code_cache import code_cache
+from src.services.code_index import CodeIndex
+from src.services.email_service import CODE_LOOKUPS, CODE_VALIDITY_SECONDS, EmailCodeService
+from src.services.leader_lock import LeaderLock
+from src.services.mime_reader import ParsedMessage
+
+logger = logging.getLogger(__name__)
+
+
+class ImapIdleIngester:
+    """Ingestor en segundo plano que mantiene una conexión IMAP en IDLE.
+
+    Cada correo nuevo de Netflix se descarga y se analiza una sola vez (el
+    estado persiste en el ``SyncStore``); el resultado queda además en un
+    ``CodeIndex`` por destinatario, de modo que ``/api/check-code`` responde
+    sin tocar IMAP mientras el ingestor esté listo.
+
+    Con ``leader_lock`` solo el worker que gana el bloqueo ejecuta IDLE y
+    escribe el store; los demás responden leyendo el store compartido y
+    reintentan el bloqueo periódicamente por si el líder cae.
+    """
+
+    def __init__(self, service: EmailCodeService, index: CodeIndex,
+                 idle_timeout: int = None, leader_lock: LeaderLock = None,
+                 on_code=None):
+        self.service = service
+        self.index = index
+        # Misma sincronización incremental (y mismo store) que las búsquedas en vivo
+        self.sync = service.mailbox_sync
+        # Gmail corta IDLE a los 29 minutos; se renueva antes
+        self.idle_timeout = idle_timeout or int(getenv("IMAP_IDLE_TIMEOUT", "300"))
+        self.reconnect_delay = 5
+        self.max_reconnect_delay = 60
+        # Con varios workers solo el líder abre IMAP; el resto lee el store
+        self.leader_lock = leader_lock
+        self.follower_poll = 1
+        # Aviso por destinatario cuando llega un código nuevo (long-poll / SSE)
+        self.on_code = on_code
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._connected = False
+        self._warm = False
+        self._following = False
+        self._leader_ready = False
+        self._notified_uid = None
+
+    @property
+    def is_ready(self) -> bool:
+        """Indica si el índice está sincronizado y la conexión activa"""
+        if self._following:
+            return self._leader_ready
+        return self._connected and self._warm
+
+    @property
+    def role(self) -> str:
+        if self.leader_lock is None:
+            return "standalone"
+        return "follower" if self._following else "leader"
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=f"imap-idle-{self.service.central_email}", daemon=True)
+        self._thread.start()
+        logger.info("🚀 Ingestor IMAP iniciado (%s)", self.service.central_email)
+
+    def stop(self, timeout: float = 5):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._connected = False
+        if self.leader_lock:
+            self.leader_lock.release()
+        logger.info("👋 Ingestor IMAP detenido (%s)", self.service.central_email)
+
+    def lookup(self, email_address: str) -> dict:
+        """Responde desde el índice con la misma forma que check_email_for_codes"""
+        email_address = email_address.lower()
+        if self._following:
+            # Otro worker es el líder: sus resultados están en el store compartido
+            CODE_LOOKUPS.inc(source="store")
+            return self.sync.lookup(email_address)
+        CODE_LOOKUPS.inc(source="index")
+        entry = self.index.get(email_address)
+        if entry:
+            age = self.service._get_current_time() - entry.date
+            if age.total_seconds() < CODE_VALIDITY_SECONDS:
+                return self.service._build_code_response(
+                    email_address, entry.code_url, entry.code_type, entry.date)
+        return self.service._build_no_code_response(email_address)
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self._stop_event.is_set():
+            if self.leader_lock and not self.leader_lock.acquire():
+                self._following = True
+                self._leader_ready = self.sync.store.ingester_ready(self.sync.key)
+                self._notify_from_store()
+                self._stop_event.wait(self.follower_poll)
+                continue
+            self._following = False
+
+            mail = None
+            try:
+                mail = self.service._connect_to_imap()
+                self._connected = True
+                self._session(mail)
+                delay = self.reconnect_delay
+            except Exception as e:
+                logger.error("❌ Error en el ingestor IMAP (%s): %s",
+                             self.service.central_email, e)
+            finally:
+                self._connected = False
+                if self.leader_lock:
+                    self.sync.store.set_ingester_ready(self.sync.key, False)
+                if mail:
+                    try:
+                        mail.logout()
+                    except Exception:
+                        pass
+            if not self._stop_event.is_set():
+                logger.info("Reconectando ingestor IMAP en %ds", delay)
+                self._stop_event.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _session(self, mail):
+        """Sincroniza el buzón y espera correos nuevos con IDLE"""
+        # Los códigos vigentes ya procesados antes de reiniciar salen del store
+        self._apply(self.sync.recent_entries())
+        self._apply(self.sync.sync(mail))
+        self._warm = True
+        if self.leader_lock:
+            self.sync.store.set_ingester_ready(self.sync.key, True)
+        logger.info("✅ Índice de códigos de %s sincronizado (%d destinatarios)",
+                    self.service.central_email, len(self.index))
+
+        while not self._stop_event.is_set():
+            if self._idle(mail):
+                code_cache.mailbox_changed()
+                self._apply(self.sync.sync(mail))
+            oldest = self.service._get_current_time() - timedelta(seconds=CODE_VALIDITY_SECONDS)
+            self.index.prune(oldest)
+
+    def _apply(self, records: list[ParsedMessage]):
+        for record in records:
+            if self.index.put(record.recipient, record):
+                code_cache.invalidate(record.recipient)
+                if self.on_code:
+                    self.on_code(record.recipient)
+
+    def _notify_from_store(self):
+        """Seguidor: avisa de los códigos que el líder guardó desde la última vuelta"""
+        if self.on_code is None:
+            return
+        _, last_uid = self.sync.store.load_state(self.sync.key)
+        if self._notified_uid is not None and last_uid > self._notified_uid:
+            for recipient in self.sync.store.code_recipients_after(
+                    self.sync.key, self._notified_uid):
+                self.on_code(recipient)
+        self._notified_uid = last_uid
+
+    def _idle(self, mail) -> bool:
+        """Ejecuta un ciclo IDLE (RFC 2177); devuelve True si llegaron mensajes"""
+        tag = mail._new_tag()
+        mail.send(tag + b" IDLE\r\n")
+        response = mail.readline()
+        if not response.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE rechazado: {response!r}")
+
+        has_new = False
+        deadline = time.monotonic() + self.idle_timeout
+        while not has_new and not self._stop_event.is_set() and time.monotonic() < deadline:
+            if not _buffered(mail):
+                readable, _, _ = select.select([mail.sock], [], [], 1.0)
+                if not readable:
+                    continue
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Conexión cerrada durante IDLE")
+            has_new = b"EXISTS" in line
+
+        mail.send(b"DONE\r\n")
+        while True:
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Conexión cerrada durante IDLE")
+            if b"EXISTS" in line:
+                has_new = True
+            if line.startswith(tag):
+                break
+        mail.tagged_commands.pop(tag, None)
+        return has_new
+
+
+def _buffered(mail) -> bool:
+    """Indica si hay datos ya recibidos que ``select`` no ve
+
+    Las líneas que llegan en el mismo segmento que "+ idling" quedan en el
+    buffer de ``mail.file``, y con TLS pueden quedar además en el buffer de
+    la capa SSL.
+    """
+    if getattr(mail.sock, "pending", lambda: 0)():
+        return True
+    timeout = mail.sock.gettimeout()
+    mail.sock.setblocking(False)
+    try:
+        return bool(mail.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        mail.sock.settimeout(timeout)
@@ -0,0 +1,233 @@
+from collections import deque
+from contextlib import contextmanager
+from os import getenv
+import imaplib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ImapPoolTimeout(Exception):
+    """No se obtuvo una conexión del pool dentro del tiempo de espera"""
+
+
+class ImapConnectionPool:
+    """Pool de conexiones IMAP compartido por todo el proceso y seguro entre hilos.
+
+    Las conexiones se reutilizan entre peticiones. Antes de prestar una
+    conexión que lleva inactiva más de ``health_check_after`` segundos se
+    verifica con NOOP; las que superan ``max_idle`` se cierran y se reemplazan,
+    al prestarlas o antes con ``reap``.
+
+    Args:
+        factory: Función que abre y autentica una conexión IMAP nueva
+        size: Máximo de conexiones simultáneas
+        max_idle: Segundos máximos de inactividad antes de descartar
+        health_check_after: Segundos de inactividad a partir de los cuales se hace NOOP
+        checkout_timeout: Segundos máximos de espera por una conexión libre
+    """
+
+    def __init__(self, factory, size: int = 3, max_idle: int = 300,
+                 health_check_after: int = 30, checkout_timeout: int = 30,
+                 name: str = "imap"):
+        self._factory = factory
+        self.size = size
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.checkout_timeout = checkout_timeout
+        self.name = name
+
+        self._idle = deque()  # (conexión, instante de devolución)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._in_use = 0
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "created": 0,
+            "closed": 0,
+            "health_check_failures": 0,
+            "broken": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    @contextmanager
+    def connection(self):
+        """Presta una conexión del pool y la devuelve al salir del bloque"""
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise ImapPoolTimeout(
+                f"Sin conexiones IMAP libres tras {self.checkout_timeout}s (pool {self.name})")
+        waited = time.perf_counter() - started
+
+        try:
+            mail = self._acquire()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+
+        broken = False
+        try:
+            yield mail
+        except (imaplib.IMAP4.error, OSError):
+            broken = True
+            raise
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                if broken:
+                    self._stats["broken"] += 1
+                else:
+                    self._idle.append((mail, time.monotonic()))
+            if broken:
+                self._close(mail)
+            self._slots.release()
+
+    def _acquire(self):
+        while True:
+            with self._lock:
+                item = self._idle.pop() if self._idle else None
+            if item is None:
+                return self._create()
+
+            mail, returned_at = item
+            idle_for = time.monotonic() - returned_at
+            if idle_for > self.max_idle:
+                self._close(mail)
+                continue
+            if idle_for > self.health_check_after:
+                try:
+                    mail.noop()
+                except Exception as e:
+                    logger.warning("Conexión IMAP inválida, reconectando: %s", e)
+                    with self._lock:
+                        self._stats["health_check_failures"] += 1
+                    self._close(mail)
+                    continue
+            return mail
+
+    def _create(self):
+        mail = self._factory()
+        with self._lock:
+            self._stats["created"] += 1
+        return mail
+
+    def _close(self, mail):
+        try:
+            mail.logout()
+        except Exception:
+            pass
+        with self._lock:
+            self._stats["closed"] += 1
+
+    def warm(self, count: int = 1) -> int:
+        """Abre conexiones por adelantado hasta tener ``count`` (sin pasar de ``size``)
+
+        Así la primera petición del worker no paga el TLS y el LOGIN.
+        Devuelve cuántas abrió.
+        """
+        opened = 0
+        for _ in range(min(count, self.size)):
+            with self._lock:
+                if len(self._idle) + self._in_use >= count:
+                    break
+            if not self._slots.acquire(blocking=False):
+                break
+            try:
+                mail = self._create()
+                with self._lock:
+                    self._idle.append((mail, time.monotonic()))
+                opened += 1
+            finally:
+                self._slots.release()
+        return opened
+
+    def reap(self) -> int:
+        """Cierra las conexiones inactivas desde hace más de ``max_idle`` segundos
+
+        Sin esto una conexión que nadie vuelve a pedir queda abierta hasta
+        que el servidor la corta. Devuelve cuántas cerró.
+        """
+        expired = []
+        oldest = time.monotonic() - self.max_idle
+        with self._lock:
+            # Se devuelven por la derecha: las más antiguas quedan a la izquierda
+            while self._idle and self._idle[0][1] < oldest:
+                expired.append(self._idle.popleft()[0])
+        for mail in expired:
+            self._close(mail)
+        return len(expired)
+
+    def close_all(self):
+        """Cierra las conexiones inactivas (al apagar el servicio)"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for mail, _ in idle:
+            self._close(mail)
+
+    def stats(self) -> dict:
+        with self._lock:
+            checkouts = self._stats["checkouts"]
+            return {
+                **self._stats,
+                "wait_seconds_total": round(self._stats["wait_seconds_total"], 6),
+                "wait_seconds_max": round(self._stats["wait_seconds_max"], 6),
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "churn": self._stats["created"] + self._stats["closed"],
+                "wait_avg_ms": round(self._stats["wait_seconds_total"] * 1000 / checkouts, 3)
+                if checkouts else 0.0,
+            }
+
+
+_pools: dict[str, ImapConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_imap_pool(account: str, factory) -> ImapConnectionPool:
+    """Devuelve el pool del proceso para la cuenta, creándolo la primera vez"""
+    with _pools_lock:
+        pool = _pools.get(account)
+        if pool is None:
+            pool = ImapConnectionPool(
+                factory,
+                size=int(getenv("IMAP_POOL_SIZE", "3")),
+                max_idle=int(getenv("IMAP_POOL_MAX_IDLE", "300")),
+                checkout_timeout=int(getenv("IMAP_POOL_TIMEOUT", "30")),
+                name=account,
+            )
+            _pools[account] = pool
+        return pool
+
+
+def pool_stats() -> dict:
+    with _pools_lock:
+        pools = dict(_pools)
+    return {account: pool.stats() for account, pool in pools.items()}
+
+
+def reap_idle_pools() -> int:
+    """Cierra en todos los pools las conexiones que superaron ``max_idle``"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return sum(pool.reap() for pool in pools)
+
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
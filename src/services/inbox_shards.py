@@ -0,0 +1,234 @@
+from collections import OrderedDict
+from os import getenv
+import asyncio
+import logging
+import threading
+import time
+
+from src.services.admission import recipient_limiter
+from src.services.code_cache import code_cache, single_flight
+from src.services.code_index import CodeIndex
+from src.services.email_service import CODE_LOOKUPS, EmailCodeService
+from src.services.imap_ingester import ImapIdleIngester
+from src.services.inboxes import HashRing, load_inboxes
+from src.services.leader_lock import LeaderLock
+
+logger = logging.getLogger(__name__)
+
+# Destinatarios recordados por el enrutamiento "learned"
+MAX_LEARNED = 10000
+
+
+def _best(results: list[dict]) -> dict:
+    """El resultado con el código más reciente; si ninguno tiene código, el primero"""
+    return max(results, key=lambda result: (result["has_code"], result.get("email_date", "")))
+
+
+class InboxShards:
+    """Buzones centrales del proceso y el reparto de destinatarios entre ellos.
+
+    Cada destinatario se consulta primero en su buzón: con INBOX_ROUTING=hash
+    (por defecto) el dueño sale de un anillo de hashing consistente, que es
+    como deben configurarse los reenvíos; con "learned" se prueba antes el
+    buzón donde se le encontró el último código. Si ese buzón no tiene código,
+    se consultan los demás en paralelo. Las consultas de varios correos
+    sincronizan todos los buzones una vez y eligen el código más reciente.
+    """
+
+    def __init__(self, inboxes: list = None, routing: str = None):
+        self.services = [EmailCodeService(inbox=inbox) for inbox in inboxes or load_inboxes()]
+        self.routing = routing or getenv("INBOX_ROUTING", "hash")
+        self.ring = HashRing([service.central_email for service in self.services])
+        self._by_account = {service.central_email: service for service in self.services}
+        # Destinatario -> buzón donde apareció su último código (solo con "learned")
+        self._learned = OrderedDict()
+        self.fan_outs = 0
+
+    def route(self, email_address: str) -> EmailCodeService:
+        """Servicio del buzón que se consulta primero para el destinatario"""
+        if len(self.services) == 1:
+            return self.services[0]
+        email_address = email_address.lower()
+        learned = self._learned.get(email_address)
+        return learned or self._by_account[self.ring.owner(email_address)]
+
+    def learn(self, email_address: str, service: EmailCodeService):
+        """Recuerda el buzón donde se encontró el código del destinatario"""
+        if self.routing != "learned":
+            return
+        self._learned[email_address] = service
+        self._learned.move_to_end(email_address)
+        while len(self._learned) > MAX_LEARNED:
+            self._learned.popitem(last=False)
+
+    async def check_email_for_codes(self, email_address: str) -> dict:
+        if len(self.services) == 1:
+            return await self.services[0].check_email_for_codes(email_address)
+        started = time.perf_counter()
+        email_address = email_address.lower()
+        first = self.route(email_address)
+        try:
+            cached = code_cache.get(email_address)
+            if cached is not None:
+                CODE_LOOKUPS.inc(source="cache")
+                result = first._refresh_cached_response(cached)
+                first._log_lookup(email_address, "cache", result, started)
+                return result
+            CODE_LOOKUPS.inc(source="imap")
+            recipient_limiter.take(email_address)
+
+            generation = code_cache.generation
+            result = await single_flight.do(f"*:{email_address}",
+                                            lambda: self._lookup(email_address, first))
+            code_cache.put(email_address, result, generation)
+            first._log_lookup(email_address, "imap", result, started)
+            return result
+        except Exception as e:
+            raise first._lookup_error(e, email_address)
+
+    async def check_emails_for_codes(self, email_addresses: list[str]) -> dict:
+        """Sincroniza cada buzón una vez y responde con el código más reciente de cada correo"""
+        if len(self.services) == 1:
+            return await self.services[0].check_emails_for_codes(email_addresses)
+        started = time.perf_counter()
+        service = self.services[0]
+        addresses = list(dict.fromkeys(address.lower() for address in email_addresses))
+        try:
+            results = {}
+            missing = []
+            for address in addresses:
+                cached = code_cache.get(address)
+                if cached is not None:
+                    results[address] = service._refresh_cached_response(cached)
+                else:
+                    missing.append(address)
+
+            hits = len(addresses) - len(missing)
+            CODE_LOOKUPS.inc(hits, source="cache")
+            missing, limited = service._take_tokens(missing)
+            results.update(limited)
+            if missing:
+                CODE_LOOKUPS.inc(len(missing), source="imap")
+                generation = code_cache.generation
+                found = await self._lookup_all(self.services, missing)
+                for address, result in found.items():
+                    code_cache.put(address, result, generation)
+                    results[address] = result
+
+            service._log_batch(results, hits, started)
+            return {address: results[address] for address in addresses}
+        except Exception as e:
+            raise service._lookup_error(e, ", ".join(addresses))
+
+    async def _lookup(self, email_address: str, first: EmailCodeService) -> dict:
+        """Consulta el buzón ``first`` y, si no tiene código, el resto de los buzones"""
+        result = await first.run_imap_stage(first._check_blocking, email_address)
+        if result["has_code"]:
+            self.learn(email_address, first)
+            return result
+        self.fan_outs += 1
+        others = [service for service in self.services if service is not first]
+        found = await self._lookup_all(others, [email_address])
+        return _best([result, found[email_address]])
+
+    async def _lookup_all(self, services: list, email_addresses: list[str]) -> dict:
+        """Una sincronización por buzón; por correo, el código más reciente entre ``services``"""
+        batches = await asyncio.gather(*(
+            service.run_imap_stage(service._check_batch_blocking, email_addresses)
+            for service in services))
+        results = {}
+        for address in email_addresses:
+            candidates = [batch[address] for batch in batches]
+            results[address] = _best(candidates)
+            if results[address]["has_code"]:
+                self.learn(address, services[candidates.index(results[address])])
+        return results
+
+    def warm_pools(self, count: int) -> int:
+        """Abre ``count`` conexiones IMAP por buzón; los errores solo se registran"""
+        opened = 0
+        for service in self.services:
+            try:
+                opened += service.pool.warm(count)
+            except Exception as e:
+                logger.warning("⚠️ No se pudo precalentar IMAP de %s: %s",
+                               service.central_email, e)
+        return opened
+
+    def stats(self) -> dict:
+        return {
+            "routing": self.routing,
+            "inboxes": [service.central_email for service in self.services],
+            "fan_outs": self.fan_outs,
+            "learned": len(self._learned),
+        }
+
+
+class IngesterGroup:
+    """Un ``ImapIdleIngester`` por buzón central, cada uno con su hilo y su índice
+
+    Con índice compartido cada buzón tiene su propio bloqueo de líder, así
+    que los workers pueden repartirse los buzones.
+    """
+
+    def __init__(self, shards: InboxShards, lock_path: str = None, on_code=None):
+        self.shards = shards
+        self.ingesters = {}
+        for position, service in enumerate(shards.services):
+            leader_lock = None
+            if lock_path:
+                leader_lock = LeaderLock(lock_path if position == 0 else f"{lock_path}.{position}")
+            self.ingesters[service.central_email] = ImapIdleIngester(
+                service, CodeIndex(), leader_lock=leader_lock, on_code=on_code)
+
+    @property
+    def is_ready(self) -> bool:
+        return all(ingester.is_ready for ingester in self.ingesters.values())
+
+    @property
+    def role(self) -> str:
+        roles = {ingester.role for ingester in self.ingesters.values()}
+        return roles.pop() if len(roles) == 1 else "mixed"
+
+    def start(self):
+        for ingester in self.ingesters.values():
+            ingester.start()
+
+    def stop(self, timeout: float = 5):
+        for ingester in self.ingesters.values():
+            ingester.stop(timeout)
+
+    def lookup(self, email_address: str) -> dict:
+        """Responde desde el índice del buzón dueño; si no tiene código, desde los demás"""
+        email_address = email_address.lower()
+        first = self.shards.route(email_address).central_email
+        result = self.ingesters[first].lookup(email_address)
+        if result["has_code"] or len(self.ingesters) == 1:
+            return result
+        others = [ingester for account, ingester in self.ingesters.items() if account != first]
+        candidates = [ingester.lookup(email_address) for ingester in others]
+        best = _best([result, *candidates])
+        if best["has_code"]:
+            self.shards.learn(email_address, others[candidates.index(best)].service)
+        return best
+
+    def stats(self) -> dict:
+        return {account: {"state": "ready" if ingester.is_ready else "cold",
+                          "role": ingester.role}
+                for account, ingester in self.ingesters.items()}
+
+
+_shards: InboxShards = None
+_shards_lock = threading.Lock()
+
+
+def get_inbox_shards() -> InboxShards:
+    """Devuelve los buzones centrales del proceso, creándolos la primera vez"""
+    global _shards
+    with _shards_lock:
+        if _shards is None:
+            _shards = InboxShards()
+            if len(_shards.services) > 1:
+                logger.info("📬 %d buzones centrales (enrutamiento %s)",
+                            len(_shards.services), _shards.routing)
+        return _shards
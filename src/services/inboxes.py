@@ -0,0 +1,52 @@
+from bisect import bisect
+from hashlib import blake2b
+from os import getenv
+
+# Buzón central histórico, usado cuando no se configura CENTRAL_INBOXES
+DEFAULT_CENTRAL_EMAIL = "serviciosnetplus@gmail.com"
+
+
+class CentralInbox:
+    """Cuenta de Gmail central a la que se reenvían los correos de Netflix"""
+
+    __slots__ = ("email", "password")
+
+    def __init__(self, email: str, password: str):
+        self.email = email
+        self.password = password
+
+
+def load_inboxes() -> list[CentralInbox]:
+    """Buzones centrales configurados
+
+    CENTRAL_INBOXES es una lista "correo:contraseña,correo:contraseña"; si un
+    correo no trae contraseña se usa GMAIL_APP_PASSWORD. Sin la variable se
+    usa el buzón histórico con GMAIL_APP_PASSWORD.
+    """
+    default_password = getenv("GMAIL_APP_PASSWORD")
+    inboxes = []
+    for item in filter(None, (part.strip() for part in getenv("CENTRAL_INBOXES", "").split(","))):
+        address, _, password = item.partition(":")
+        inboxes.append(CentralInbox(address.strip().lower(), password.strip() or default_password))
+    return inboxes or [CentralInbox(DEFAULT_CENTRAL_EMAIL, default_password)]
+
+
+class HashRing:
+    """Anillo de hashing consistente de destinatarios a buzones centrales
+
+    Cada buzón ocupa ``replicas`` puntos del anillo; agregar o quitar un
+    buzón solo reasigna la fracción de destinatarios que le corresponde.
+    """
+
+    def __init__(self, nodes: list[str], replicas: int = 100):
+        self._ring = sorted((self._hash(f"{node}#{replica}"), node)
+                            for node in nodes for replica in range(replicas))
+        self._points = [point for point, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(blake2b(value.encode(), digest_size=8).digest(), "big")
+
+    def owner(self, key: str) -> str:
+        index = bisect(self._points, self._hash(key.lower())) % len(self._ring)
+        return self._ring[index][1]
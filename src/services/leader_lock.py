@@ -0,0 +1,53 @@
+import logging
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso, siempre líder
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLock:
+    """Elección de líder entre procesos con un ``flock`` sobre un archivo.
+
+    Solo un worker a la vez obtiene el bloqueo; el sistema operativo lo
+    libera si el proceso muere, así que otro worker lo toma en su siguiente
+    intento. No bloquea: ``acquire`` devuelve False si otro proceso es líder.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            self._fd = -1
+            return True
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        logger.info("👑 Proceso %d elegido líder del ingestor IMAP", os.getpid())
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        if self._fd >= 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        self._fd = None
@@ -0,0 +1,127 @@
+from html import unescape
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Anclas completas en orden de documento; finditer es perezoso, así que el
+# recorrido se detiene en el primer botón que cumple las reglas
+_ANCHOR_RE = re.compile(r'<a(?=[\s>])([^>]*)>(.*?)</a\s*>', re.IGNORECASE | re.DOTALL)
+_ANCHOR_OPEN_RE = re.compile(r'<a[\s>]', re.IGNORECASE)
+# Contenido con el que lxml reestructura el ancla (anidadas, tablas, texto crudo)
+_RESTRUCTURE_RE = re.compile(
+    r'<(?:a|table|tbody|thead|tfoot|tr|td|th|caption|colgroup|col|script|style|'
+    r'textarea|title|select|option|form|button|iframe|object|svg|math|template|'
+    r'noscript|html|head|body)[\s>/]|<!\[CDATA\[', re.IGNORECASE)
+# Etiquetas dentro del ancla: lxml solo conserva la estructura si cierran en orden
+_INNER_TAG_RE = re.compile(r'<(/?)([a-z][a-z0-9]*)(?=[\s>/])', re.IGNORECASE)
+_VOID_TAGS = frozenset(("area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+                        "meta", "param", "source", "track", "wbr"))
+_ATTR_RE = re.compile(
+    r'''([^\s=/>"']+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?''')
+_COMMENT_RE = re.compile(r'<!--.*?-->', re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]*>')
+
+
+def _attributes(raw: str) -> dict:
+    attrs = {}
+    for name, dq, sq, uq in _ATTR_RE.findall(raw):
+        name = name.lower()
+        if name not in attrs:
+            attrs[name] = unescape(dq or sq or uq)
+    return attrs
+
+
+def _balanced_tags(inner: str) -> bool:
+    """Indica si las etiquetas del contenido del ancla (div, p, span...) cierran en orden"""
+    open_tags = []
+    for closing, name in _INNER_TAG_RE.findall(inner):
+        name = name.lower()
+        if name in _VOID_TAGS:
+            continue
+        if not closing:
+            open_tags.append(name)
+        elif not open_tags or open_tags.pop() != name:
+            return False
+    return not open_tags
+
+
+def _anchor_text(inner: str) -> str:
+    if '<' in inner:
+        inner = _TAG_RE.sub('', _COMMENT_RE.sub('', inner))
+    return unescape(inner).lower()
+
+
+def classify_link(href: str, text: str, style: str) -> str:
+    """Aplica las reglas del botón de código de Netflix a un enlace
+
+    Returns:
+        str: code_type del enlace o None si no es un botón de código
+    """
+    if 'netflix.com' not in href:
+        return None
+
+    if ('codigo' in text or 'code' in text or
+            'obtener' in text or 'get' in text or
+            '#e50914' in style):
+        return "netflix_code"
+
+    # Caso de "Cómo actualizar tu hogar con Netflix"
+    if 'actualizar' in text or 'update' in text:
+        return "netflix_code"
+
+    # Botón "Sí, la envié yo" en emails de actualización de hogar
+    if 'sí, la envié yo' in text or 'si, la envie yo' in text:
+        return "netflix_home_update"
+
+    return None
+
+
+def find_code_link_soup(body: str) -> tuple[str, str]:
+    """Búsqueda sobre el árbol completo de BeautifulSoup (HTML malformado)"""
+    # bs4 y lxml se cargan solo si llega un correo que los necesita
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(body, 'lxml')
+    for link in soup.find_all('a'):
+        href = link.get('href', '')
+        code_type = classify_link(href, link.get_text().lower(), link.get('style', ''))
+        if code_type:
+            return href, code_type
+    return None, None
+
+
+def find_code_link(body: str) -> tuple[str, str]:
+    """Busca el primer botón de código de Netflix sin construir el DOM
+
+    Recorre las etiquetas ``<a>`` con expresiones precompiladas y se detiene en
+    la primera que cumple las reglas. Si el HTML tiene anclas sin cerrar o
+    anidadas, o anclas con tablas o etiquetas sin cerrar dentro, recurre a
+    BeautifulSoup para devolver exactamente lo mismo que el árbol completo.
+
+    Returns:
+        tuple: (code_url, code_type) o (None, None) si no hay botón
+    """
+    if 'netflix.com' not in body:
+        return None, None
+
+    seen = 0
+    for match in _ANCHOR_RE.finditer(body):
+        raw_attrs, inner = match.groups()
+        if '<' in inner and (_RESTRUCTURE_RE.search(inner) or not _balanced_tags(inner)):
+            # Ancla sin cerrar, con tablas o etiquetas sin cerrar: el DOM real es distinto
+            return find_code_link_soup(body)
+        seen += 1
+        if 'netflix.com' not in raw_attrs:
+            continue
+
+        attrs = _attributes(raw_attrs)
+        href = attrs.get('href', '')
+        code_type = classify_link(href, _anchor_text(inner), attrs.get('style', ''))
+        if code_type:
+            logger.debug("Botón de código encontrado (%s): %s", code_type, href)
+            return href, code_type
+
+    if seen != len(_ANCHOR_OPEN_RE.findall(body)):
+        return find_code_link_soup(body)
+    return None, None
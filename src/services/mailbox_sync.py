@@ -0,0 +1,232 @@
+from datetime import datetime, timedelta
+from email.header import decode_header, make_header
+from email.utils import getaddresses, parseaddr
+from os import getenv
+import logging
+import threading
+import time
+
+from src.services.code_cache import code_cache
+from src.services.metrics import registry
+from src.services.mime_reader import ParsedMessage
+from src.services.pipeline_stats import pipeline_stats, response_size
+from src.services.providers import ProviderIndex
+from src.services.sync_store import SyncStore
+
+logger = logging.getLogger(__name__)
+
+# Cuerpos completos por FETCH al procesar mensajes nuevos
+BODY_FETCH_CHUNK = 50
+
+SYNC_MESSAGES = registry.histogram(
+    "code_sync_messages", "Mensajes nuevos analizados por sincronización",
+    buckets=(0, 1, 2, 5, 10, 20, 50, 80, 100, 200, 500))
+
+
+class MailboxSync:
+    """Sincronización incremental por UID de un buzón hacia el ``SyncStore``.
+
+    Cada llamada a ``sync`` procesa solo los UIDs mayores que el último
+    guardado: un FETCH de cabeceras para todos y el cuerpo solo de los que
+    siguen vigentes. Si UIDNEXT no cambió desde la última vez no se envía ni
+    siquiera el SEARCH. Las consultas se responden desde el store.
+
+    Un solo barrido sirve a todos los proveedores: el SEARCH une sus
+    remitentes con OR y cada mensaje se analiza con el extractor del
+    proveedor de su remitente.
+
+    ``last_uid`` en el store es compartido: si otro proceso lo avanzó, los
+    códigos que ese proceso guardó y este todavía no devolvió se leen del
+    store (``_applied_uid`` es el cursor propio del proceso).
+    """
+
+    def __init__(self, service, store: SyncStore, providers: ProviderIndex,
+                 validity_seconds: int, mailbox: str = "INBOX", max_messages: int = 500,
+                 retention: int = None):
+        self.service = service
+        self.store = store
+        self.providers = providers
+        self.validity_seconds = validity_seconds
+        self.mailbox = mailbox
+        # Clave en el store: cada buzón central guarda su propio estado
+        self.key = f"{service.central_email}/{mailbox}"
+        self.max_messages = max_messages
+        self.retention = retention or int(getenv("SYNC_STORE_RETENTION", "86400"))
+        self.prune_interval = 60
+
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self._applied_uid = 0
+
+    def sync(self, mail) -> list[ParsedMessage]:
+        """Selecciona el buzón y procesa los mensajes nuevos de los proveedores
+
+        Returns:
+            list: Registros con código vigente encontrados, uno por destinatario
+        """
+        with self._lock:
+            started = time.perf_counter()
+            mail.select(self.mailbox)
+            pipeline_stats.record("select", 0, time.perf_counter() - started)
+            _, uidvalidity = mail.response("UIDVALIDITY")
+            _, uidnext = mail.response("UIDNEXT")
+            uidvalidity = uidvalidity[0].decode() if uidvalidity and uidvalidity[0] else None
+            uidnext = int(uidnext[0]) if uidnext and uidnext[0] else None
+            if uidnext:
+                code_cache.observe_uidnext(uidnext, self.key)
+
+            stored_validity, last_uid = self.store.load_state(self.key)
+            if stored_validity != uidvalidity:
+                if stored_validity is not None:
+                    logger.warning("UIDVALIDITY cambió en %s: se reconstruye el estado", self.key)
+                self.store.reset(self.key, uidvalidity)
+                last_uid = 0
+                self._applied_uid = 0
+
+            found = []
+            if last_uid > self._applied_uid:
+                # Otro proceso procesó esos UIDs: sus códigos salen del store
+                found = self._stored_codes(self._applied_uid)
+            if not uidnext or uidnext - 1 > last_uid:
+                uids = self._search_new(mail, last_uid)
+                SYNC_MESSAGES.observe(len(uids))
+                rows, processed = self._process(mail, uids)
+                found.extend(processed)
+                new_last_uid = max([last_uid, (uidnext or 1) - 1] + uids)
+                self.store.commit(self.key, uidvalidity, new_last_uid, rows)
+                last_uid = new_last_uid
+                if uids:
+                    logger.info("Sincronización %s: %d mensajes nuevos, %d códigos "
+                                "(último UID %d)", self.key, len(uids), len(processed),
+                                new_last_uid)
+            self._applied_uid = max(self._applied_uid, last_uid)
+
+            if time.monotonic() - self._last_prune > self.prune_interval:
+                self._last_prune = time.monotonic()
+                self.store.prune(time.time() - self.retention)
+            return found
+
+    def _search_new(self, mail, last_uid: int) -> list[int]:
+        """UIDs de los proveedores mayores que ``last_uid``
+
+        A lo sumo los ``max_messages`` más nuevos.
+        """
+        senders = self.providers.search_criteria
+        if last_uid:
+            criteria = f'(UID {last_uid + 1}:* {senders})'
+        else:
+            start_time = self.service._get_current_time() - timedelta(minutes=20)
+            criteria = f'(SINCE "{start_time.strftime("%d-%b-%Y")}" {senders})'
+
+        started = time.perf_counter()
+        _, data = mail.uid("SEARCH", None, criteria.encode())
+        pipeline_stats.record("search", response_size(data), time.perf_counter() - started)
+        # "UID n:*" siempre incluye el último mensaje aunque sea menor que n
+        uids = sorted(uid for uid in map(int, (data[0] or b"").split()) if uid > last_uid)
+        return uids[-self.max_messages:]
+
+    def _process(self, mail, uids: list[int]) -> tuple[list[tuple], list[ParsedMessage]]:
+        """Analiza los mensajes nuevos: cabeceras de todos, cuerpo de los vigentes"""
+        rows = []
+        found = []
+        if not uids:
+            return rows, found
+
+        pending = {}
+        validate_seconds = 0.0
+        headers = self.service._fetch_headers(mail, [str(uid).encode() for uid in uids])
+        for uid, header_message in headers:
+            provider = self.providers.for_sender(parseaddr(header_message.get("From", ""))[1])
+            if provider is None:
+                continue
+            recipients = list(dict.fromkeys(
+                address.lower() for _, address in getaddresses(header_message.get_all("To", []))
+                if address))
+            if not recipients:
+                continue
+            started = time.perf_counter()
+            is_valid, email_date = self.service._is_email_valid(header_message)
+            validate_seconds += time.perf_counter() - started
+            if email_date is None:
+                continue
+            records = [ParsedMessage(int(uid), recipient, email_date) for recipient in recipients]
+            if is_valid and provider.accepts_subject(_subject(header_message)):
+                pending[uid] = provider, records
+            else:
+                rows.extend(record.row() for record in records)
+        pipeline_stats.record("validate_date", 0, validate_seconds, items=len(headers))
+
+        pending_uids = list(pending)
+        for start in range(0, len(pending_uids), BODY_FETCH_CHUNK):
+            chunk = pending_uids[start:start + BODY_FETCH_CHUNK]
+            bodies = self.service._fetch_bodies(mail, chunk)
+            for uid in chunk:
+                provider, records = pending[uid]
+                body = bodies.pop(uid, None)
+                code_url, code_type = None, None
+                if body:
+                    started = time.perf_counter()
+                    code_url, code_type = provider.extract(body)
+                    pipeline_stats.record("find_link", len(body), time.perf_counter() - started)
+                for record in records:
+                    record.set_code(code_url, code_type)
+                    rows.append(record.row())
+                    if code_url:
+                        found.append(record)
+        return rows, found
+
+    def lookup(self, email_address: str) -> dict:
+        """Responde desde el store con la misma forma que check_email_for_codes"""
+        entry, seen = self.store.lookup(self.key, email_address)
+        if entry:
+            email_date = datetime.fromtimestamp(entry["email_date"], self.service.timezone)
+            age = self.service._get_current_time() - email_date
+            if age.total_seconds() < self.validity_seconds:
+                return self.service._build_code_response(
+                    email_address, entry["code_url"], entry["code_type"], email_date)
+        if seen:
+            return self.service._build_no_code_response(email_address)
+        return self.service._build_no_code_response(
+            email_address, "No se encontraron códigos pendientes")
+
+    def recent_entries(self) -> list[ParsedMessage]:
+        """Códigos aún vigentes guardados, para precargar un índice en memoria"""
+        with self._lock:
+            # El estado se lee antes que las filas: las que se guarden entre
+            # ambas lecturas se vuelven a devolver en el próximo sync
+            _, last_uid = self.store.load_state(self.key)
+            entries = self._stored_codes(0)
+            self._applied_uid = max(self._applied_uid, last_uid)
+            return entries
+
+    def _stored_codes(self, after_uid: int) -> list[ParsedMessage]:
+        """Códigos vigentes del store en mensajes de UID mayor a ``after_uid``"""
+        since = time.time() - self.validity_seconds
+        return [
+            ParsedMessage(uid, recipient, datetime.fromtimestamp(email_date, self.service.timezone),
+                          code_url, code_type)
+            for recipient, uid, email_date, code_url, code_type
+            in self.store.recent_codes(self.key, since, after_uid)
+        ]
+
+
+def _subject(header_message) -> str:
+    """Asunto decodificado (RFC 2047); vacío si no se puede decodificar"""
+    try:
+        return str(make_header(decode_header(header_message.get("Subject", ""))))
+    except Exception:
+        return ""
+
+
+_syncs: dict[str, MailboxSync] = {}
+_syncs_lock = threading.Lock()
+
+
+def get_mailbox_sync(account: str, factory) -> MailboxSync:
+    """Devuelve el sincronizador del proceso para la cuenta, creándolo la primera vez"""
+    with _syncs_lock:
+        mailbox_sync = _syncs.get(account)
+        if mailbox_sync is None:
+            mailbox_sync = factory()
+            _syncs[account] = mailbox_sync
+        return mailbox_sync
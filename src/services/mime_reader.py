@@ -0,0 +1,160 @@
+from datetime import datetime
+from email.parser import BytesFeedParser
+from io import BytesIO
+from os import getenv
+import binascii
+import quopri
+import re
+
+# Bytes que se piden por mensaje (FETCH parcial) y bytes de texto que se decodifican
+MAX_MESSAGE_BYTES = int(getenv("MAIL_MAX_MESSAGE_BYTES", "524288"))
+MAX_BODY_BYTES = int(getenv("MAIL_MAX_BODY_BYTES", "262144"))
+
+_GUID_RE = re.compile(r'messageGuid=([^&]+)')
+
+
+class ParsedMessage:
+    """Resultado compacto de analizar un correo para uno de sus destinatarios
+
+    Es lo único que se conserva del mensaje: ni el ``Message`` ni el cuerpo
+    sobreviven al análisis. ``code_url`` es la URL del botón (o el código, para
+    proveedores que lo envían en el texto) y es None si no había o venció.
+    """
+
+    __slots__ = ("uid", "recipient", "date", "code_url", "code_type", "message_guid")
+
+    def __init__(self, uid: int, recipient: str, date: datetime, code_url: str = None,
+                 code_type: str = None):
+        self.uid = uid
+        self.recipient = recipient
+        self.date = date
+        self.code_url = code_url
+        self.code_type = code_type
+        self.message_guid = message_guid(code_url)
+
+    def set_code(self, code_url: str, code_type: str):
+        self.code_url = code_url
+        self.code_type = code_type
+        self.message_guid = message_guid(code_url)
+
+    def row(self) -> tuple:
+        """Fila para ``SyncStore.commit``: (uid, destinatario, fecha epoch, url, tipo)"""
+        return self.uid, self.recipient, self.date.timestamp(), self.code_url, self.code_type
+
+
+def message_guid(code_url: str) -> str:
+    match = _GUID_RE.search(code_url) if code_url else None
+    return match.group(1) if match else None
+
+
+def read_body(raw: bytes, max_bytes: int = MAX_BODY_BYTES) -> str:
+    """Texto de la primera parte text/html del correo (o text/plain si no hay html)
+
+    Recorre el mensaje línea a línea sin construir el árbol MIME: las
+    cabeceras de cada parte se analizan con ``BytesFeedParser`` y solo se
+    guarda el cuerpo de la parte elegida, hasta ``max_bytes``. Los adjuntos y
+    demás partes se saltan sin copiarlos, y la lectura se detiene en cuanto
+    aparece el html. Acepta mensajes truncados (FETCH parcial).
+
+    Returns:
+        str: Cuerpo decodificado, o None si el correo no tiene partes de texto
+    """
+    reader = _MimeReader(BytesIO(raw), max_bytes)
+    reader.read_part(())
+    return reader.html if reader.html is not None else reader.plain
+
+
+class _MimeReader:
+    def __init__(self, stream, max_bytes: int):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.html = None
+        self.plain = None
+
+    def read_part(self, boundaries: tuple) -> tuple:
+        """Lee una parte hasta la frontera que la cierra
+
+        Returns:
+            tuple: (frontera, es_cierre) de la línea que terminó la parte, o None al final
+        """
+        headers = self._headers()
+        if headers.get_content_maintype() == "multipart" and headers.get_boundary():
+            inner = b"--" + headers.get_boundary().encode("latin-1")
+            scope = boundaries + (inner,)
+            delimiter = self._skip(scope)  # preámbulo
+            while delimiter == (inner, False) and self.html is None:
+                delimiter = self.read_part(scope)
+            if self.html is not None:
+                return None
+            if delimiter == (inner, True):
+                delimiter = self._skip(boundaries)  # epílogo
+            return delimiter
+
+        content_type = headers.get_content_type()
+        wanted = headers.get_content_disposition() != "attachment" and (
+            (content_type == "text/html" and self.html is None)
+            or (content_type == "text/plain" and self.plain is None))
+        if not wanted:
+            return self._skip(boundaries)
+
+        lines = []
+        size = 0
+        delimiter = None
+        for line in self.stream:
+            delimiter = _delimiter(line, boundaries)
+            if delimiter:
+                break
+            if size < self.max_bytes:
+                lines.append(line)
+                size += len(line)
+        text = _decode(b"".join(lines), headers)
+        if content_type == "text/html":
+            self.html = text
+        else:
+            self.plain = text
+        return delimiter
+
+    def _headers(self):
+        parser = BytesFeedParser()
+        for line in self.stream:
+            parser.feed(line)
+            if line in (b"\r\n", b"\n"):
+                break
+        return parser.close()
+
+    def _skip(self, boundaries: tuple) -> tuple:
+        for line in self.stream:
+            delimiter = _delimiter(line, boundaries)
+            if delimiter:
+                return delimiter
+        return None
+
+
+def _delimiter(line: bytes, boundaries: tuple) -> tuple:
+    if not boundaries or not line.startswith(b"--"):
+        return None
+    line = line.rstrip()
+    # La frontera más interna primero
+    for boundary in reversed(boundaries):
+        if line == boundary:
+            return boundary, False
+        if line == boundary + b"--":
+            return boundary, True
+    return None
+
+
+def _decode(payload: bytes, headers) -> str:
+    encoding = str(headers.get("Content-Transfer-Encoding", "")).strip().lower()
+    try:
+        if encoding == "base64":
+            compact = b"".join(payload.split())
+            # Un FETCH parcial puede cortar el último bloque de 4 caracteres
+            payload = binascii.a2b_base64(compact[:len(compact) - len(compact) % 4])
+        elif encoding == "quoted-printable":
+            payload = quopri.decodestring(payload)
+    except binascii.Error:
+        return ""
+    try:
+        return payload.decode(headers.get_content_charset() or "utf-8", errors="ignore")
+    except LookupError:
+        return payload.decode("utf-8", errors="ignore")
@@ -0,0 +1,65 @@
+import threading
+
+from src.services.metrics import registry
+
+STAGE_SECONDS = registry.histogram(
+    "code_pipeline_stage_seconds", "Duración de cada etapa del pipeline de búsqueda", ("stage",))
+STAGE_BYTES = registry.counter(
+    "code_pipeline_stage_bytes_total", "Bytes recibidos o analizados por etapa", ("stage",))
+STAGE_ITEMS = registry.counter(
+    "code_pipeline_stage_items_total", "Mensajes procesados por etapa", ("stage",))
+
+
+def response_size(data) -> int:
+    """Cuenta los bytes de una respuesta de imaplib (bytes y tuplas de literales)"""
+    if data is None:
+        return 0
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    if isinstance(data, (list, tuple)):
+        return sum(response_size(item) for item in data)
+    return 0
+
+
+class PipelineStats:
+    """Contadores por etapa del pipeline de búsqueda IMAP.
+
+    Para cada etapa acumula llamadas, bytes recibidos y segundos, de modo
+    que se pueda medir el ahorro de la búsqueda por etapas. Cada registro
+    alimenta también los histogramas de ``/metrics``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: dict[str, dict] = {}
+
+    def record(self, stage: str, nbytes: int, seconds: float, items: int = 1):
+        with self._lock:
+            counters = self._stages.setdefault(
+                stage, {"calls": 0, "items": 0, "bytes": 0, "seconds": 0.0})
+            counters["calls"] += 1
+            counters["items"] += items
+            counters["bytes"] += nbytes
+            counters["seconds"] += seconds
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        STAGE_BYTES.inc(nbytes, stage=stage)
+        STAGE_ITEMS.inc(items, stage=stage)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                stage: {
+                    **counters,
+                    "seconds": round(counters["seconds"], 6),
+                    "avg_ms": round(counters["seconds"] * 1000 / counters["calls"], 3),
+                }
+                for stage, counters in self._stages.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+# Contadores compartidos por todas las instancias de EmailCodeService
+pipeline_stats = PipelineStats()
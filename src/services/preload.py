@@ -0,0 +1,51 @@
+from os import getenv
+import gc
+import importlib
+import logging
+import time
+
+from src.services.providers import get_provider_index
+
+logger = logging.getLogger(__name__)
+
+# Módulos que la aplicación importa recién al primer uso
+_PARSER_MODULES = ("bs4", "lxml.etree")
+_DATABASE_MODULES = ("sqlalchemy.orm", "src.models.authorized_domain",
+                     "src.models.email_account", "psycopg2")
+
+
+def preload_enabled() -> bool:
+    """APP_PRELOAD=true cuando gunicorn arranca con ``--preload``"""
+    return getenv("APP_PRELOAD", "false").lower() == "true"
+
+
+def preload():
+    """Carga en el proceso maestro todo lo que los workers solo leen.
+
+    Con ``gunicorn --preload`` el maestro importa la aplicación una vez y los
+    workers nacen por fork: los módulos pesados (bs4/lxml, SQLAlchemy y los
+    modelos), las reglas de extracción ya compiladas y el índice de
+    proveedores se comparten copy-on-write en lugar de cargarse en cada
+    worker. No abre conexiones, hilos ni archivos:
+    el engine, los pools IMAP y el SyncStore los crea cada worker en el
+    lifespan.
+
+    Al final congela el GC para que las recolecciones de los workers no
+    recorran (ni copien) las páginas heredadas.
+    """
+    started = time.perf_counter()
+    modules = _PARSER_MODULES
+    if getenv("ACCESS_CONTROL_ENABLED", "true").lower() == "true":
+        modules += _DATABASE_MODULES
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning("⚠️ No se pudo precargar %s: %s", name, e)
+
+    get_provider_index()
+
+    gc.collect()
+    gc.freeze()
+    logger.info("📦 Precarga lista en %.0fms (%d objetos congelados)",
+                (time.perf_counter() - started) * 1000, gc.get_freeze_count())
@@ -0,0 +1,146 @@
+from os import getenv
+import logging
+import threading
+
+from src.services.code_extractor import CodeExtractor
+from src.services.link_extractor import find_code_link
+
+logger = logging.getLogger(__name__)
+
+
+class Provider:
+    """Servicio de streaming cuyos correos de código se procesan
+
+    ``senders`` son direcciones completas o dominios (sin "@"), que también
+    cubren sus subdominios. Si ``subject_hints`` no está vacío, solo se
+    descarga el cuerpo de los correos cuyo asunto contiene alguna de las
+    pistas. ``extractor`` recibe el cuerpo decodificado y devuelve
+    (valor, code_type): la URL del botón si ``link`` es True, o el código.
+    """
+
+    __slots__ = ("name", "senders", "subject_hints", "extractor", "code_types", "link")
+
+    def __init__(self, name: str, senders: tuple, extractor, code_types: tuple,
+                 subject_hints: tuple = (), link: bool = False):
+        self.name = name
+        self.senders = tuple(sender.lower() for sender in senders)
+        self.subject_hints = tuple(hint.lower() for hint in subject_hints)
+        self.extractor = extractor
+        self.code_types = code_types
+        self.link = link
+
+    def accepts_subject(self, subject: str) -> bool:
+        if not self.subject_hints or not subject:
+            return True
+        subject = subject.lower()
+        return any(hint in subject for hint in self.subject_hints)
+
+    def extract(self, body: str) -> tuple[str, str]:
+        return self.extractor(body)
+
+
+def text_code_extractor(service: str, code_type: str):
+    """Extractor para proveedores que envían el código en el texto (``CodeExtractor``)"""
+    def extract(body: str) -> tuple[str, str]:
+        code = CodeExtractor.extract_code_from_body(body, service)
+        return (code, code_type) if code else (None, None)
+    return extract
+
+
+_providers: dict[str, Provider] = {}
+_by_code_type: dict[str, Provider] = {}
+
+
+def register_provider(provider: Provider) -> Provider:
+    """Registra un proveedor con sus remitentes, pistas de asunto y extractor"""
+    _providers[provider.name] = provider
+    for code_type in provider.code_types:
+        _by_code_type[code_type] = provider
+    return provider
+
+
+def provider_for_code_type(code_type: str) -> Provider:
+    return _by_code_type.get(code_type)
+
+
+class ProviderIndex:
+    """Índice precalculado de los proveedores activos para un barrido del buzón
+
+    ``search_criteria`` une todos los remitentes con OR en un solo criterio
+    SEARCH, y ``for_sender`` resuelve el proveedor de cada mensaje con una
+    búsqueda en diccionario por dirección y luego por dominio.
+    """
+
+    def __init__(self, providers: list[Provider]):
+        if not providers:
+            raise ValueError("No hay proveedores de códigos activos")
+        self.providers = providers
+        self._by_address = {}
+        self._by_domain = {}
+        for provider in providers:
+            for sender in provider.senders:
+                if "@" in sender:
+                    self._by_address[sender] = provider
+                else:
+                    self._by_domain[sender] = provider
+
+        senders = [sender for provider in providers for sender in provider.senders]
+        criteria = f'FROM "{senders[-1]}"'
+        for sender in reversed(senders[:-1]):
+            criteria = f'OR FROM "{sender}" {criteria}'
+        self.search_criteria = criteria if len(senders) == 1 else f"({criteria})"
+
+    @property
+    def names(self) -> list[str]:
+        return [provider.name for provider in self.providers]
+
+    def for_sender(self, address: str) -> Provider:
+        """Proveedor del remitente, o None si el mensaje no es de ninguno"""
+        address = address.lower()
+        provider = self._by_address.get(address)
+        if provider:
+            return provider
+        domain = address.rpartition("@")[2]
+        while domain:
+            provider = self._by_domain.get(domain)
+            if provider:
+                return provider
+            domain = domain.partition(".")[2]
+        return None
+
+
+_index: ProviderIndex = None
+_index_lock = threading.Lock()
+
+
+def get_provider_index() -> ProviderIndex:
+    """Proveedores activos del proceso según CODE_PROVIDERS (todos por defecto)"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            names = [name.strip().lower() for name in getenv("CODE_PROVIDERS", "").split(",")
+                     if name.strip()] or list(_providers)
+            unknown = [name for name in names if name not in _providers]
+            if unknown:
+                raise ValueError(
+                    f"Proveedores desconocidos en CODE_PROVIDERS: {', '.join(unknown)}")
+            _index = ProviderIndex([_providers[name] for name in names])
+            logger.info("📨 Proveedores de códigos activos: %s", ", ".join(_index.names))
+        return _index
+
+
+# Sin filtro de asunto: los botones se reconocen en el cuerpo y Netflix
+# cambia los asuntos según el idioma y la campaña
+register_provider(Provider(
+    "netflix", ("info@account.netflix.com",), find_code_link,
+    code_types=("netflix_code", "netflix_home_update"), link=True))
+
+register_provider(Provider(
+    "disney", ("disneyplus.com",), text_code_extractor("disney", "disney_code"),
+    code_types=("disney_code",),
+    subject_hints=("código", "codigo", "code", "passcode")))
+
+register_provider(Provider(
+    "max", ("hbomax.com", "max.com"), text_code_extractor("max", "max_code"),
+    code_types=("max_code",),
+    subject_hints=("código", "codigo", "code")))
@@ -0,0 +1,185 @@
+from os import getenv, getpid
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_state (
+    mailbox     TEXT PRIMARY KEY,
+    uidvalidity TEXT,
+    last_uid    INTEGER NOT NULL DEFAULT 0,
+    updated_at  REAL
+);
+CREATE TABLE IF NOT EXISTS processed_messages (
+    mailbox    TEXT NOT NULL,
+    uid        INTEGER NOT NULL,
+    recipient  TEXT NOT NULL,
+    email_date REAL NOT NULL,
+    code_url   TEXT,
+    code_type  TEXT,
+    PRIMARY KEY (mailbox, recipient, uid)
+);
+CREATE INDEX IF NOT EXISTS ix_processed_messages_date
+    ON processed_messages (email_date);
+CREATE TABLE IF NOT EXISTS ingester_status (
+    mailbox    TEXT PRIMARY KEY,
+    pid        INTEGER,
+    ready      INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL
+);
+"""
+
+
+class SyncStore:
+    """Estado persistente de la sincronización incremental del buzón.
+
+    Guarda en un archivo SQLite local, por buzón, el UIDVALIDITY y el último
+    UID procesado, y una fila por (mensaje, destinatario) con el resultado ya
+    analizado (``code_url`` es la URL del botón o el código según el
+    proveedor, y NULL si el correo no tenía código o llegó vencido).
+
+    Tras un reinicio la sincronización continúa desde ``last_uid`` sin volver
+    a descargar ni analizar los mensajes vistos. En modo WAL varios workers
+    pueden leer el archivo mientras el líder escribe.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        logger.info("📦 Estado de sincronización en %s", path)
+
+    def load_state(self, mailbox: str) -> tuple[str, int]:
+        """Devuelve (uidvalidity, last_uid) del buzón o (None, 0)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT uidvalidity, last_uid FROM sync_state WHERE mailbox = ?",
+                (mailbox,)).fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+
+    def reset(self, mailbox: str, uidvalidity: str):
+        """Descarta lo procesado del buzón (cambió UIDVALIDITY)"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM processed_messages WHERE mailbox = ?", (mailbox,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (mailbox, uidvalidity, last_uid, updated_at) "
+                "VALUES (?, ?, 0, ?)", (mailbox, uidvalidity, time.time()))
+
+    def commit(self, mailbox: str, uidvalidity: str, last_uid: int, rows: list[tuple]):
+        """Guarda en una transacción los mensajes procesados y el nuevo last_uid
+
+        Args:
+            rows: (uid, recipient, email_date_ts, code_url, code_type)
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO processed_messages "
+                "(mailbox, uid, recipient, email_date, code_url, code_type) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(mailbox, *row) for row in rows])
+            # Nunca retrocede: otro proceso puede haber guardado un UID mayor
+            self._conn.execute(
+                "INSERT INTO sync_state (mailbox, uidvalidity, last_uid, updated_at) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT (mailbox) DO UPDATE SET "
+                "last_uid = MAX(last_uid, excluded.last_uid), updated_at = excluded.updated_at",
+                (mailbox, uidvalidity, last_uid, time.time()))
+
+    def lookup(self, mailbox: str, recipient: str) -> tuple[dict, bool]:
+        """Busca el último código del destinatario
+
+        Returns:
+            tuple: (fila con código más reciente o None, si hay algún correo del destinatario)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT uid, email_date, code_url, code_type FROM processed_messages "
+                "WHERE mailbox = ? AND recipient = ? "
+                "ORDER BY code_url IS NULL, email_date DESC LIMIT 1",
+                (mailbox, recipient)).fetchone()
+        if row is None:
+            return None, False
+        if row[2] is None:
+            return None, True
+        return {"uid": row[0], "email_date": row[1], "code_url": row[2], "code_type": row[3]}, True
+
+    def recent_codes(self, mailbox: str, since: float, after_uid: int = 0) -> list[tuple]:
+        """Filas con código desde ``since`` (epoch) y UID mayor a ``after_uid``"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT recipient, uid, email_date, code_url, code_type FROM processed_messages "
+                "WHERE mailbox = ? AND email_date >= ? AND uid > ? AND code_url IS NOT NULL "
+                "ORDER BY email_date", (mailbox, since, after_uid)).fetchall()
+
+    def code_recipients_after(self, mailbox: str, uid: int) -> list[str]:
+        """Destinatarios con códigos en mensajes de UID mayor a ``uid``"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT recipient FROM processed_messages "
+                "WHERE mailbox = ? AND uid > ? AND code_url IS NOT NULL",
+                (mailbox, uid)).fetchall()
+        return [row[0] for row in rows]
+
+    def prune(self, before: float) -> int:
+        """Elimina las filas con fecha anterior a ``before`` (epoch)"""
+        with self._lock, self._conn:
+            deleted = self._conn.execute(
+                "DELETE FROM processed_messages WHERE email_date < ?", (before,)).rowcount
+        if deleted:
+            logger.info("Estado de sincronización: %d mensajes antiguos eliminados", deleted)
+        return deleted
+
+    def set_ingester_ready(self, mailbox: str, ready: bool):
+        """Publica si el ingestor líder tiene el buzón sincronizado"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingester_status (mailbox, pid, ready, updated_at) "
+                "VALUES (?, ?, ?, ?)", (mailbox, getpid(), int(ready), time.time()))
+
+    def ingester_ready(self, mailbox: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT ready FROM ingester_status WHERE mailbox = ?", (mailbox,)).fetchone()
+        return bool(row and row[0])
+
+    def stats(self) -> dict:
+        with self._lock:
+            messages = self._conn.execute("SELECT COUNT(*) FROM processed_messages").fetchone()[0]
+            mailboxes = self._conn.execute(
+                "SELECT mailbox, uidvalidity, last_uid FROM sync_state").fetchall()
+        return {
+            "path": self.path,
+            "messages": messages,
+            "mailboxes": {mailbox: {"uidvalidity": uidvalidity, "last_uid": last_uid}
+                          for mailbox, uidvalidity, last_uid in mailboxes},
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store: SyncStore = None
+_store_lock = threading.Lock()
+
+
+def get_sync_store() -> SyncStore:
+    """Devuelve el store del proceso; con SYNC_STORE_PATH vacío vive solo en memoria"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SyncStore(getenv("SYNC_STORE_PATH", "sync_state.db") or ":memory:")
+        return _store
+
+
+def close_sync_store():
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
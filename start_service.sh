@@ -4,6 +4,7 @@ echo "🚀 Iniciando servicio..."
 
 # Cargar variables de entorno
 source .env
+LOG_LEVEL=${LOG_LEVEL:-info}
 echo "📚 Variables de entorno cargadas"
 
 # Mostrar configuración
@@ -11,14 +12,21 @@ echo "🔧 Configuración:"
 echo "- Workers: $WORKERS"
 echo "- Puerto: $API_PORT"
 echo "- Orígenes permitidos: $ALLOWED_ORIGINS"
+echo "- Recarga automática: ${RELOAD:-false}"
+
+# --reload solo en desarrollo: vigila los archivos y arranca un único proceso
+RELOAD_FLAG=""
+if [ "${RELOAD:-false}" = "true" ]; then
+    RELOAD_FLAG="--reload"
+fi
 
 # Iniciar uvicorn con logging mejorado
 uvicorn main:app \
     --workers $WORKERS \
     --host 0.0.0.0 \
     --port $API_PORT \
-    --log-level debug \
-    --reload \
+    --log-level ${LOG_LEVEL,,} \
+    $RELOAD_FLAG \
     --access-log \
     --use-colors
 
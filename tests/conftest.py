@@ -0,0 +1,49 @@
+"""Fixtures compartidas: servidor IMAP falso y la aplicación apuntando a él.
+
+El servicio lee su configuración al importarse, así que el IMAP falso
+arranca y se configura aquí, antes de que cualquier prueba importe main. La
+sesión comparte un solo buzón, el pool, la caché y el store; cada prueba usa
+destinatarios propios para no depender del orden.
+"""
+import os
+
+import pytest
+
+from benchmarks.common import configure_fake_imap
+from benchmarks.fake_imap import FakeImapServer
+from helpers import new_recipient
+
+_imap = FakeImapServer().start()
+configure_fake_imap(_imap.address)
+# /wait con el ingestor frío consulta cada CODE_WAIT_POLL_INTERVAL segundos
+os.environ.setdefault("CODE_WAIT_POLL_INTERVAL", "0.2")
+
+
+@pytest.fixture(scope="session")
+def imap():
+    yield _imap
+    _imap.stop()
+
+
+@pytest.fixture(scope="session")
+def client(imap):
+    """TestClient de la app con su lifespan (ingestor deshabilitado)"""
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def service(imap):
+    from src.services.email_service import EmailCodeService
+
+    return EmailCodeService()
+
+
+@pytest.fixture
+def recipient(request):
+    """Destinatario que ninguna otra prueba usa"""
+    return new_recipient(request.node.name)
@@ -0,0 +1,30 @@
+"""Utilidades de las pruebas (destinatarios únicos, fechas y esperas)."""
+from datetime import datetime, timedelta, timezone
+import asyncio
+import itertools
+import time
+
+_ids = itertools.count()
+
+
+def new_recipient(prefix: str = "user") -> str:
+    prefix = "".join(char for char in prefix.lower() if char.isalnum() or char == "_")
+    return f"{prefix[:40]}.{next(_ids)}@example.com"
+
+
+def minutes_ago(minutes: float) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(minutes=minutes)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def wait_until(condition, timeout: float = 5, interval: float = 0.05):
+    """Espera a que ``condition()`` sea verdadera; devuelve su último valor"""
+    deadline = time.monotonic() + timeout
+    while True:
+        value = condition()
+        if value or time.monotonic() >= deadline:
+            return value
+        time.sleep(interval)
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+from helpers import new_recipient
+from src.services.access_control import (INACTIVE_ACCOUNT, INVALID_EMAIL, UNAUTHORIZED_DOMAIN,
+                                         AccessIndex)
+
+
+def test_start_does_not_wait_for_the_database():
+    release = threading.Event()
+
+    def unavailable():
+        release.wait(5)
+        raise ConnectionError("base caída")
+
+    index = AccessIndex(session_factory=unavailable, enabled=True)
+    started = time.perf_counter()
+    index.start()
+    try:
+        assert time.perf_counter() - started < 1
+        # Sin cargar deja pasar todo
+        assert index.check("cualquiera@ejemplo.com") is None
+        assert index.stats()["loaded"] is False
+    finally:
+        release.set()
+        index.stop()
+
+
+@pytest.fixture
+def sessions():
+    """Sesiones sobre un SQLite en memoria con las tablas de dominios y cuentas"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from src.models.authorized_domain import AuthorizedDomain
+    from src.models.email_account import EmailAccount
+
+    engine = create_engine("sqlite://", poolclass=StaticPool,
+                           connect_args={"check_same_thread": False})
+    for model in (AuthorizedDomain, EmailAccount):
+        model.__table__.create(engine)
+    factory = sessionmaker(bind=engine)
+
+    def add(domains=(), accounts=()):
+        with factory() as session:
+            session.add_all(AuthorizedDomain(domain=domain) for domain in domains)
+            session.add_all(EmailAccount(email=email, status=status)
+                            for email, status in accounts)
+            session.commit()
+
+    factory.add = add
+    yield factory
+    engine.dispose()
+
+
+@pytest.fixture
+def index(sessions):
+    sessions.add(domains=["ejemplo.com"],
+                 accounts=[("Activa@Otro.com", "active"), ("baja@ejemplo.com", "inactive")])
+    index = AccessIndex(session_factory=sessions, enabled=True)
+    index.refresh(full=True)
+    return index
+
+
+def test_empty_tables_allow_every_address(sessions):
+    index = AccessIndex(session_factory=sessions, enabled=True)
+    index.refresh(full=True)
+
+    assert index.loaded and not index.configured
+    assert index.check("cualquiera@ejemplo.com") is None
+
+
+def test_domains_accounts_and_subdomains(index):
+    assert index.check("alguien@ejemplo.com") is None
+    assert index.check("alguien@mail.ejemplo.com") is None
+    assert index.check("activa@otro.com") is None
+    assert index.check("alguien@otro.com") == UNAUTHORIZED_DOMAIN
+    assert index.check("alguien@noejemplo.com") == UNAUTHORIZED_DOMAIN
+    assert index.check("sin-arroba") == INVALID_EMAIL
+    # La cuenta inactiva se rechaza aunque su dominio esté autorizado
+    assert index.check("baja@ejemplo.com") == INACTIVE_ACCOUNT
+    assert "Activa@Otro.com" in index._pending
+
+
+@pytest.fixture
+def restricted(client, index, monkeypatch):
+    """La aplicación con el índice de acceso de ``index``"""
+    import main
+
+    for name in ("enabled", "loaded", "_domains", "_accounts"):
+        monkeypatch.setattr(main.access_index, name, getattr(index, name))
+    return client
+
+
+def test_unauthorized_address_gets_403_before_imap(restricted, imap):
+    imap.reset_stats()
+
+    response = restricted.get("/api/check-code/alguien@otro.com")
+
+    assert response.status_code == 403
+    detail = response.json()["detail"]
+    assert detail["authorized"] is False
+    assert detail["message"] == UNAUTHORIZED_DOMAIN
+    assert imap.commands["SELECT"] == 0
+
+
+def test_batch_marks_rejected_addresses(restricted):
+    allowed = new_recipient("lote").replace("example.com", "ejemplo.com")
+
+    response = restricted.post("/api/check-codes",
+                               json={"emails": [allowed, "baja@ejemplo.com", "x@otro.com"]})
+
+    assert response.status_code == 200
+    results = response.json()["data"]["results"]
+    assert results[allowed]["has_code"] is False
+    assert "authorized" not in results[allowed]
+    assert results["baja@ejemplo.com"]["authorized"] is False
+    assert results["baja@ejemplo.com"]["message"] == INACTIVE_ACCOUNT
+    assert results["x@otro.com"]["message"] == UNAUTHORIZED_DOMAIN
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+from helpers import new_recipient, run
+from src.services.admission import AdmissionLimiter, AdmissionRejected, RecipientRateLimiter
+
+
+async def _saturate(limiter: AdmissionLimiter, requests: int) -> list:
+    """Lanza ``requests`` etapas de 0.3s a la vez; devuelve resultados o excepciones"""
+    return await asyncio.gather(*(limiter.run(time.sleep, 0.3) for _ in range(requests)),
+                                return_exceptions=True)
+
+
+def test_full_queue_is_rejected_with_503():
+    limiter = AdmissionLimiter(limit=1, max_queue=1, max_wait=5)
+
+    results = run(_saturate(limiter, 3))
+
+    rejected, = [result for result in results if isinstance(result, AdmissionRejected)]
+    assert (rejected.status, rejected.reason) == (503, "queue_full")
+    assert rejected.retry_after >= 1
+    assert limiter.stats()["admitted"] == 2
+    assert limiter.active == 0
+
+
+def test_queue_wait_times_out_with_503():
+    limiter = AdmissionLimiter(limit=1, max_queue=5, max_wait=0.05)
+
+    results = run(_saturate(limiter, 2))
+
+    assert results[0] is None
+    assert (results[1].status, results[1].reason) == (503, "queue_timeout")
+    assert limiter.active == 0
+
+
+def test_recipient_rate_limit():
+    limiter = RecipientRateLimiter(rate=0.5, burst=2)
+    limiter.take("a@example.com")
+    limiter.take("a@example.com")
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        limiter.take("a@example.com")
+
+    assert (rejected.value.status, rejected.value.reason) == (429, "rate_limited")
+    assert rejected.value.retry_after == 2
+    # Cada destinatario tiene su propio bucket
+    limiter.take("b@example.com")
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    """Límite de una búsqueda por destinatario; ``limited(email)`` la agota"""
+    from src.services.admission import recipient_limiter
+
+    monkeypatch.setattr(recipient_limiter, "rate", 0.5)
+    monkeypatch.setattr(recipient_limiter, "burst", 1)
+    return recipient_limiter.take
+
+
+def test_rate_limited_lookup_gets_429_with_retry_after(client, limited, recipient):
+    limited(recipient)
+
+    response = client.get(f"/api/check-code/{recipient}")
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+    assert response.json()["detail"]["retry_after"] == 2
+
+
+def test_batch_reports_rate_limited_recipients(client, limited, recipient):
+    other = new_recipient("otro")
+    limited(recipient)
+
+    response = client.post("/api/check-codes", json={"emails": [recipient, other]})
+
+    assert response.status_code == 200
+    results = response.json()["data"]["results"]
+    assert results[recipient]["rate_limited"] is True
+    assert results[recipient]["retry_after"] == 2
+    assert "rate_limited" not in results[other]
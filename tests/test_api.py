@@ -0,0 +1,91 @@
+import threading
+
+from benchmarks.corpus import netflix_message
+from helpers import minutes_ago, new_recipient
+
+
+def test_health(client):
+    response = client.get("/health")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok", "code_index": "disabled"}
+
+
+def test_check_code(client, imap, recipient):
+    imap.mailbox.append(netflix_message(recipient, date=minutes_ago(3)))
+
+    response = client.get(f"/api/check-code/{recipient}")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "success"
+    assert body["data"]["has_code"] is True
+    assert body["data"]["type"] == "netflix_code"
+    assert "timestamp" in body
+
+
+def test_check_code_without_code(client, recipient):
+    response = client.get(f"/api/check-code/{recipient}")
+
+    assert response.status_code == 200
+    assert response.json()["data"]["has_code"] is False
+
+
+def test_check_codes_batch(client, imap):
+    with_code, expired, unknown = (new_recipient("lote") for _ in range(3))
+    imap.mailbox.append(netflix_message(with_code, date=minutes_ago(1)))
+    imap.mailbox.append(netflix_message(expired, date=minutes_ago(20)))
+
+    response = client.post("/api/check-codes",
+                           json={"emails": [with_code, expired.upper(), unknown]})
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["count"] == 3
+    assert data["results"][with_code]["has_code"] is True
+    assert data["results"][expired]["has_code"] is False
+    assert data["results"][unknown]["has_code"] is False
+
+
+def test_check_codes_validates_body(client):
+    assert client.post("/api/check-codes", json={"emails": []}).status_code == 422
+
+
+def test_wait_returns_when_code_arrives(client, imap, recipient):
+    timer = threading.Timer(0.5, lambda: imap.mailbox.append(
+        netflix_message(recipient, date=minutes_ago(0))))
+    timer.start()
+    try:
+        response = client.get(f"/api/check-code/{recipient}/wait", params={"timeout": 10})
+    finally:
+        timer.cancel()
+
+    assert response.status_code == 200
+    assert response.json()["data"]["has_code"] is True
+
+
+def test_wait_times_out(client, recipient):
+    response = client.get(f"/api/check-code/{recipient}/wait", params={"timeout": 0.5})
+
+    assert response.status_code == 200
+    assert response.json()["data"]["has_code"] is False
+
+
+def test_stream_sends_code_event(client, imap, recipient):
+    imap.mailbox.append(netflix_message(recipient, date=minutes_ago(1)))
+
+    response = client.get(f"/api/check-code/{recipient}/stream", params={"timeout": 1})
+
+    assert response.status_code == 200
+    assert response.text.startswith("event: code\n")
+    assert "event: timeout" in response.text
+
+
+def test_metrics(client, imap, recipient):
+    imap.mailbox.append(netflix_message(recipient, date=minutes_ago(1)))
+    client.get(f"/api/check-code/{recipient}")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert "code_lookups_total" in response.text
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.corpus import netflix_message
+from helpers import minutes_ago, new_recipient, run
+from src.services.code_cache import CodeResultCache, SingleFlight
+
+
+def _with_code(minutes: float = 1) -> dict:
+    email_date = datetime.now(timezone.utc) - timedelta(minutes=minutes)
+    return {"has_code": True, "email_date": email_date.isoformat()}
+
+
+def test_negative_result_expires():
+    cache = CodeResultCache(negative_ttl=0.1)
+    cache.put("a@example.com", {"has_code": False})
+
+    assert cache.get("a@example.com") == {"has_code": False}
+    time.sleep(0.15)
+    assert cache.get("a@example.com") is None
+
+
+def test_code_lives_until_its_validity_ends():
+    cache = CodeResultCache(validity_seconds=900)
+    cache.put("fresh@example.com", _with_code(minutes=1))
+    cache.put("expired@example.com", _with_code(minutes=16))
+
+    assert cache.get("fresh@example.com")["has_code"] is True
+    assert cache.get("expired@example.com") is None
+
+
+def test_new_mail_invalidates_every_result():
+    cache = CodeResultCache()
+    cache.observe_uidnext(10)
+    cache.put("a@example.com", _with_code())
+    cache.put("b@example.com", {"has_code": False})
+
+    cache.observe_uidnext(10)
+    assert cache.get("a@example.com") is not None
+
+    cache.observe_uidnext(11)
+    assert cache.get("a@example.com") is None
+    assert cache.get("b@example.com") is None
+
+
+def test_result_from_before_a_mailbox_change_is_not_cached():
+    cache = CodeResultCache()
+    generation = cache.generation
+    cache.mailbox_changed()
+
+    cache.put("a@example.com", _with_code(), generation)
+
+    assert cache.get("a@example.com") is None
+
+
+def test_invalidate_and_eviction():
+    cache = CodeResultCache(max_entries=2)
+    for address in ("a@example.com", "b@example.com", "c@example.com"):
+        cache.put(address, _with_code())
+
+    assert cache.get("a@example.com") is None
+    cache.invalidate("b@example.com")
+    assert cache.get("b@example.com") is None
+    assert cache.get("c@example.com") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_single_flight_shares_one_execution():
+    flights = SingleFlight()
+    calls = []
+
+    async def lookup():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "resultado"
+
+    async def main():
+        return await asyncio.gather(*(flights.do("clave", lookup) for _ in range(5)))
+
+    assert run(main()) == ["resultado"] * 5
+    assert len(calls) == 1
+    assert flights.stats()["shared"] == 4
+
+
+def test_newer_code_replaces_cached_one(imap, service, recipient):
+    imap.mailbox.append(netflix_message(recipient, date=minutes_ago(5)))
+    first = run(service.check_email_for_codes(recipient))
+
+    imap.mailbox.append(netflix_message(recipient, date=minutes_ago(1)))
+    # La sincronización la dispara la consulta de otro destinatario
+    run(service.check_email_for_codes(new_recipient("otro")))
+
+    single = run(service.check_email_for_codes(recipient))
+    batch = run(service.check_emails_for_codes([recipient]))[recipient]
+    assert single["message_guid"] != first["message_guid"]
+    assert batch["message_guid"] == single["message_guid"]
+    assert single["email_date"] > first["email_date"]
@@ -0,0 +1,36 @@
+"""Corpus dorado de CodeExtractor (benchmarks/golden/code_extractor.json).
+
+Cada caso trae el cuerpo en ``body`` o un correo guardado en
+``benchmarks/samples`` en ``sample``.
+"""
+import json
+
+import pytest
+
+from benchmarks.bench_code_extractor import GOLDEN_PATH, SAMPLES_DIR, as_message
+from src.services.code_extractor import CodeExtractor
+from src.services.mime_reader import read_body
+
+GOLDEN = json.loads(GOLDEN_PATH.read_text(encoding="utf-8"))
+
+
+def _message(case: dict):
+    if "sample" in case:
+        return (SAMPLES_DIR / case["sample"]).read_bytes()
+    return as_message(case["body"])
+
+
+@pytest.mark.parametrize("case", GOLDEN, ids=[case["name"] for case in GOLDEN])
+def test_golden(case):
+    message = _message(case)
+    if "sample" in case:
+        assert read_body(message)
+
+    assert CodeExtractor.extract_code_from_email(message) == case["expected"]
+
+
+def test_digits_in_links_are_not_codes():
+    body = ('<p>Tu código llega en el botón</p>'
+            '<a href="https://help.netflix.com/legal/0?trkid=2000">')
+
+    assert CodeExtractor.extract_code_from_body(body) is None
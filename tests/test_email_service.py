@@ -0,0 +1,111 @@
+import email
+
+from benchmarks.corpus import netflix_message, provider_message
+from helpers import minutes_ago, new_recipient, run
+
+
+def test_finds_code_button(imap, service, recipient):
+    imap.mailbox.append(netflix_message(recipient, date=minutes_ago(2)))
+
+    result = run(service.check_email_for_codes(recipient))
+
+    assert result["has_code"] is True
+    assert result["type"] == "netflix_code"
+    assert result["provider"] == "netflix"
+    assert "netflix.com/account/travel/verify" in result["code_url"]
+    assert result["message_guid"]
+    assert result["email"] == recipient
+
+
+def test_home_update_button(imap, service, recipient):
+    imap.mailbox.append(netflix_message(recipient, date=minutes_ago(1), kind="home"))
+
+    result = run(service.check_email_for_codes(recipient))
+
+    assert result["has_code"] is True
+    assert "update-primary-location" in result["code_url"]
+
+
+def test_netflix_subject_is_not_filtered(imap, service, recipient):
+    message = email.message_from_bytes(netflix_message(recipient, date=minutes_ago(1)))
+    message.replace_header("Subject", "Importante: ¿fuiste tú?")
+    imap.mailbox.append(message.as_bytes())
+
+    result = run(service.check_email_for_codes(recipient))
+
+    assert result["has_code"] is True
+
+
+def test_expired_code_is_not_returned(imap, service, recipient):
+    imap.mailbox.append(netflix_message(recipient, date=minutes_ago(17)))
+
+    result = run(service.check_email_for_codes(recipient))
+
+    assert result["has_code"] is False
+
+
+def test_message_without_button(imap, service, recipient):
+    imap.mailbox.append(netflix_message(recipient, date=minutes_ago(1), kind="other"))
+
+    result = run(service.check_email_for_codes(recipient))
+
+    assert result["has_code"] is False
+    assert result["message"] == "No se encontraron códigos válidos"
+
+
+def test_unknown_recipient(service, recipient):
+    result = run(service.check_email_for_codes(recipient))
+
+    assert result["has_code"] is False
+    assert result["message"] == "No se encontraron códigos pendientes"
+
+
+def test_newest_code_wins(imap, service, recipient):
+    imap.mailbox.append(netflix_message(recipient, date=minutes_ago(6)))
+    imap.mailbox.append(netflix_message(recipient, date=minutes_ago(1), kind="home"))
+
+    result = run(service.check_email_for_codes(recipient))
+
+    assert "update-primary-location" in result["code_url"]
+
+
+def test_text_code_provider(imap, service, recipient):
+    imap.mailbox.append(provider_message(recipient, "disney", date=minutes_ago(1),
+                                         code="482913"))
+
+    result = run(service.check_email_for_codes(recipient))
+
+    assert result["has_code"] is True
+    assert result["provider"] == "disney"
+    assert result["code"] == "482913"
+    assert result["code_url"] is None
+
+
+def test_unknown_sender_is_ignored(imap, service, recipient):
+    imap.mailbox.append(provider_message(recipient, "spam", date=minutes_ago(1)))
+
+    result = run(service.check_email_for_codes(recipient))
+
+    assert result["has_code"] is False
+
+
+def test_mixed_case_address(imap, service, recipient):
+    imap.mailbox.append(netflix_message(recipient.upper(), date=minutes_ago(1)))
+
+    result = run(service.check_email_for_codes(recipient.title()))
+
+    assert result["has_code"] is True
+    assert result["email"] == recipient
+
+
+def test_batch_single_sync(imap, service):
+    with_code, without_code = new_recipient("batch"), new_recipient("batch")
+    imap.mailbox.append(netflix_message(with_code, date=minutes_ago(1)))
+    imap.mailbox.append(netflix_message(without_code, date=minutes_ago(1), kind="other"))
+    imap.reset_stats()
+
+    results = run(service.check_emails_for_codes([with_code, without_code]))
+
+    assert results[with_code]["has_code"] is True
+    assert results[without_code]["has_code"] is False
+    assert imap.commands["SEARCH"] <= 1
@@ -0,0 +1,74 @@
+import pytest
+
+from benchmarks.corpus import netflix_message
+from helpers import minutes_ago, new_recipient, wait_until
+
+
+@pytest.fixture
+def ingester(service):
+    from src.services.code_index import CodeIndex
+    from src.services.imap_ingester import ImapIdleIngester
+
+    ingester = ImapIdleIngester(service, CodeIndex(), idle_timeout=30)
+    ingester.start()
+    assert wait_until(lambda: ingester.is_ready)
+    yield ingester
+    ingester.stop()
+
+
+def test_indexes_new_message_during_idle(imap, ingester, recipient):
+    assert ingester.lookup(recipient)["has_code"] is False
+
+    imap.mailbox.append(netflix_message(recipient, date=minutes_ago(0)))
+
+    assert wait_until(lambda: ingester.lookup(recipient)["has_code"])
+    result = ingester.lookup(recipient)
+    assert result["type"] == "netflix_code"
+    assert "netflix.com/account/travel/verify" in result["code_url"]
+
+
+def test_preloads_codes_already_synced(imap, service, recipient):
+    from src.services.code_index import CodeIndex
+    from src.services.imap_ingester import ImapIdleIngester
+
+    imap.mailbox.append(netflix_message(recipient, date=minutes_ago(2)))
+    with service.pool.connection() as mail:
+        service.mailbox_sync.sync(mail)
+
+    ingester = ImapIdleIngester(service, CodeIndex(), idle_timeout=30)
+    ingester.start()
+    try:
+        assert wait_until(lambda: ingester.is_ready)
+        assert ingester.lookup(recipient)["has_code"] is True
+    finally:
+        ingester.stop()
+
+
+def test_notifies_waiters(imap, service, recipient):
+    from src.services.code_index import CodeIndex
+    from src.services.imap_ingester import ImapIdleIngester
+
+    notified = []
+    ingester = ImapIdleIngester(service, CodeIndex(), idle_timeout=30, on_code=notified.append)
+    ingester.start()
+    try:
+        assert wait_until(lambda: ingester.is_ready)
+        imap.mailbox.append(netflix_message(recipient, date=minutes_ago(0)))
+        assert wait_until(lambda: recipient in notified)
+    finally:
+        ingester.stop()
+
+
+def test_exists_in_same_segment_as_continuation(imap, ingester, recipient):
+    # Con la latencia el segundo correo llega mientras el servidor demora la
+    # respuesta al IDLE siguiente: "+ idling" y "* N EXISTS" salen juntos
+    first, second = recipient, new_recipient("segmento")
+    imap.latency = {"IDLE": 0.5}
+    try:
+        imap.mailbox.append(netflix_message(first, date=minutes_ago(0)))
+        assert wait_until(lambda: ingester.lookup(first)["has_code"])
+        imap.mailbox.append(netflix_message(second, date=minutes_ago(0)))
+
+        assert wait_until(lambda: ingester.lookup(second)["has_code"])
+    finally:
+        imap.latency = 0.0
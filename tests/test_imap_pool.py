@@ -0,0 +1,28 @@
+import time
+
+from src.services.imap_pool import ImapConnectionPool
+
+
+class _Connection:
+    def __init__(self):
+        self.closed = False
+
+    def noop(self):
+        pass
+
+    def logout(self):
+        self.closed = True
+
+
+def test_reap_closes_only_expired_connections():
+    pool = ImapConnectionPool(_Connection, size=2, max_idle=0.2)
+    pool.warm(1)
+    time.sleep(0.15)
+    pool.warm(2)
+    (old, _), (recent, _) = pool._idle
+    time.sleep(0.1)
+
+    assert pool.reap() == 1
+
+    assert old.closed and not recent.closed
+    assert pool.stats()["idle"] == 1
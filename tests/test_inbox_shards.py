@@ -0,0 +1,92 @@
+import pytest
+
+from benchmarks.corpus import netflix_message
+from benchmarks.fake_imap import FakeMailbox
+from helpers import minutes_ago, new_recipient, run, wait_until
+
+
+@pytest.fixture
+def make_shards(imap):
+    """Dos buzones centrales, cada uno con su propio buzón en el IMAP falso"""
+    from src.services.inbox_shards import InboxShards
+    from src.services.inboxes import CentralInbox
+
+    def make(routing: str = "hash") -> InboxShards:
+        accounts = [new_recipient("central") for _ in range(2)]
+        for account in accounts:
+            imap.mailboxes[account] = FakeMailbox()
+        return InboxShards([CentralInbox(account, "secret") for account in accounts], routing)
+
+    return make
+
+
+def _other(shards, recipient):
+    """Servicio que no es el dueño del destinatario según el anillo"""
+    owner = shards.route(recipient)
+    return next(service for service in shards.services if service is not owner)
+
+
+def test_batch_unknown_recipients_sync_each_inbox_once(imap, recipient):
+    from src.services.inbox_shards import InboxShards
+    from src.services.inboxes import CentralInbox
+
+    shards = InboxShards([CentralInbox(new_recipient("central"), "secret") for _ in range(2)])
+    unknown = new_recipient("desconocido")
+    imap.mailbox.append(netflix_message(recipient, date=minutes_ago(1)))
+    imap.reset_stats()
+
+    results = run(shards.check_emails_for_codes([recipient, unknown]))
+
+    assert results[recipient]["has_code"] is True
+    assert results[unknown]["has_code"] is False
+    assert imap.commands["SELECT"] == 2
+
+
+def test_code_in_another_inbox_is_found(imap, make_shards, recipient):
+    shards = make_shards()
+    other = _other(shards, recipient)
+    imap.mailboxes[other.central_email].append(netflix_message(recipient, date=minutes_ago(1)))
+
+    assert run(shards.check_email_for_codes(recipient))["has_code"] is True
+    assert shards.fan_outs == 1
+    # Con hashing el dueño no cambia aunque el código llegara a otro buzón
+    assert shards.route(recipient) is not other
+
+
+def test_batch_returns_newest_code_across_inboxes(imap, make_shards, recipient):
+    shards = make_shards()
+    owner, other = shards.route(recipient), _other(shards, recipient)
+    imap.mailboxes[owner.central_email].append(netflix_message(recipient, date=minutes_ago(5)))
+    imap.mailboxes[other.central_email].append(netflix_message(recipient, date=minutes_ago(1)))
+
+    single = run(shards._lookup_all([owner], [recipient]))[recipient]
+    result = run(shards.check_emails_for_codes([recipient]))[recipient]
+
+    assert result["email_date"] > single["email_date"]
+
+
+def test_learned_routing_tries_last_inbox_first(imap, make_shards, recipient):
+    shards = make_shards("learned")
+    other = _other(shards, recipient)
+    imap.mailboxes[other.central_email].append(netflix_message(recipient, date=minutes_ago(1)))
+
+    run(shards.check_email_for_codes(recipient))
+
+    assert shards.route(recipient) is other
+
+
+def test_ingester_group_falls_back_to_other_inboxes(imap, make_shards, recipient):
+    from src.services.inbox_shards import IngesterGroup
+
+    shards = make_shards()
+    other = _other(shards, recipient)
+    group = IngesterGroup(shards)
+    group.start()
+    try:
+        assert wait_until(lambda: group.is_ready)
+        imap.mailboxes[other.central_email].append(
+            netflix_message(recipient, date=minutes_ago(0)))
+
+        assert wait_until(lambda: group.lookup(recipient)["has_code"])
+    finally:
+        group.stop()
@@ -0,0 +1,34 @@
+"""El extractor por expresiones devuelve lo mismo que el árbol de BeautifulSoup."""
+import pytest
+
+from benchmarks.bench_link_extractor import legacy_find_code_link, load_bodies
+from src.services.link_extractor import find_code_link
+
+SAMPLES = load_bodies()
+
+MALFORMED = {
+    "bloque_sin_cerrar": '<a href="https://www.netflix.com/a"><div><img src=x></a>'
+                         '<a href="https://www.netflix.com/b">get code</a>',
+    "parrafo_sin_cerrar": '<a href="https://www.netflix.com/a"><p>hola</a>'
+                          '<a href="https://www.netflix.com/b">get code</a>',
+    "cierre_suelto": '<a href="https://www.netflix.com/a">hola</span></a>'
+                     '<a href="https://www.netflix.com/b">get code</a>',
+    "mal_anidado": '<a href="https://www.netflix.com/a"><div><span>hola</div></span></a>'
+                   '<a href="https://www.netflix.com/b">get code</a>',
+    "ancla_sin_cerrar": '<a href="https://www.netflix.com/a">hola'
+                        '<a href="https://www.netflix.com/b">get code</a>',
+    "tabla_dentro": '<a href="https://www.netflix.com/a"><table><tr><td>get code</td></tr>'
+                    '</table></a>',
+    "bloques_cerrados": '<a href="https://www.netflix.com/a"><div><span>Obtener código'
+                        '</span></div></a>',
+}
+
+
+@pytest.mark.parametrize("name", sorted(SAMPLES))
+def test_samples_match_legacy(name):
+    assert find_code_link(SAMPLES[name]) == legacy_find_code_link(SAMPLES[name])
+
+
+@pytest.mark.parametrize("name", sorted(MALFORMED))
+def test_malformed_html_matches_legacy(name):
+    assert find_code_link(MALFORMED[name]) == legacy_find_code_link(MALFORMED[name])
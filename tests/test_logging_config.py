@@ -0,0 +1,44 @@
+import io
+import logging
+
+import pytest
+
+from src.config import logging_config
+from src.config.logging_config import SAMPLED_LOGGERS, setup_logging
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    monkeypatch.delenv("LOG_DEBUG_SAMPLE_EVERY", raising=False)
+    root = logging.getLogger()
+    level, handlers = root.level, root.handlers[:]
+    output = io.StringIO()
+    yield output
+    logging_config._uninstall()
+    root.setLevel(level)
+    root.handlers[:] = handlers
+
+
+def _debug_lines(stream, name: str, count: int) -> int:
+    logger = logging.getLogger(name)
+    for number in range(count):
+        logger.debug("registro %d", number)
+    return stream.getvalue().count(f" - {name} - ")
+
+
+def test_debug_is_not_sampled_by_default(stream):
+    setup_logging(level="DEBUG", use_queue=False, stream=stream)
+
+    assert _debug_lines(stream, SAMPLED_LOGGERS[0], 20) == 20
+
+
+def test_sampling_only_applies_to_hot_path_loggers(stream):
+    setup_logging(level="DEBUG", use_queue=False, sample_every=10, stream=stream)
+
+    assert _debug_lines(stream, SAMPLED_LOGGERS[0], 20) == 2
+    assert _debug_lines(stream, "src.services.sync_store", 20) == 20
+    logging.getLogger(SAMPLED_LOGGERS[0]).warning("aviso")
+    assert "aviso" in stream.getvalue()
+
+    setup_logging(level="DEBUG", use_queue=False, sample_every=1, stream=stream)
+    assert not logging.getLogger(SAMPLED_LOGGERS[0]).filters
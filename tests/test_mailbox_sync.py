@@ -0,0 +1,65 @@
+"""Varios procesos sobre el mismo archivo del ``SyncStore``."""
+import time
+
+import pytest
+
+from benchmarks.corpus import netflix_message
+from helpers import minutes_ago, wait_until
+
+
+@pytest.fixture
+def make_sync(service, tmp_path):
+    """Sincronizadores independientes (uno por "proceso") sobre el mismo archivo"""
+    from src.services.email_service import CODE_VALIDITY_SECONDS
+    from src.services.mailbox_sync import MailboxSync
+    from src.services.providers import get_provider_index
+    from src.services.sync_store import SyncStore
+
+    stores = []
+
+    def make():
+        stores.append(SyncStore(str(tmp_path / "sync_state.db")))
+        return MailboxSync(service, stores[-1], get_provider_index(), CODE_VALIDITY_SECONDS)
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def test_sync_returns_codes_processed_by_another_process(imap, service, make_sync, recipient):
+    first, second = make_sync(), make_sync()
+    imap.mailbox.append(netflix_message(recipient, date=minutes_ago(1)))
+
+    with service.pool.connection() as mail:
+        assert recipient in [record.recipient for record in first.sync(mail)]
+        found = second.sync(mail)
+        # Ya aplicado: la siguiente vuelta no lo repite
+        assert second.sync(mail) == []
+
+    record, = [record for record in found if record.recipient == recipient]
+    assert "netflix.com/account/travel/verify" in record.code_url
+
+
+def test_two_ingesters_on_one_store(imap, service, make_sync, recipient):
+    from src.services.code_index import CodeIndex
+    from src.services.imap_ingester import ImapIdleIngester
+
+    ingesters = []
+    for _ in range(2):
+        ingester = ImapIdleIngester(service, CodeIndex(), idle_timeout=30)
+        ingester.sync = make_sync()
+        ingesters.append(ingester)
+    # El segundo sincroniza siempre después de que el primero guardó el UID
+    late = ingesters[1].sync
+    late.sync = lambda mail, sync=late.sync: time.sleep(0.3) or sync(mail)
+    for ingester in ingesters:
+        ingester.start()
+    try:
+        assert wait_until(lambda: all(ingester.is_ready for ingester in ingesters))
+        imap.mailbox.append(netflix_message(recipient, date=minutes_ago(0)))
+
+        for ingester in ingesters:
+            assert wait_until(lambda: ingester.lookup(recipient)["has_code"])
+    finally:
+        for ingester in ingesters:
+            ingester.stop()
@@ -0,0 +1,68 @@
+"""Escenarios de ``benchmarks.replay`` con resultados verificados."""
+import random
+
+from benchmarks.corpus import netflix_message
+from benchmarks.replay import Arrivals, _drive_service
+from helpers import minutes_ago, new_recipient, run
+
+
+class _Recording:
+    """Misma interfaz que el servicio; guarda (correo, has_code) de cada respuesta"""
+
+    def __init__(self, service):
+        self.service = service
+        self.results = []
+
+    async def check_email_for_codes(self, email_address: str) -> dict:
+        result = await self.service.check_email_for_codes(email_address)
+        self.results.append((email_address, result["has_code"]))
+        return result
+
+
+def _seed(imap, count: int) -> dict:
+    """Destinatarios con código vigente, vencido, sin botón o sin correos; devuelve lo esperado"""
+    expected = {}
+    for position in range(count):
+        address = new_recipient("replay")
+        kind = position % 4
+        if kind == 0:
+            imap.mailbox.append(netflix_message(address, date=minutes_ago(position % 10)))
+        elif kind == 1:
+            imap.mailbox.append(netflix_message(address, date=minutes_ago(18)))
+        elif kind == 2:
+            imap.mailbox.append(netflix_message(address, date=minutes_ago(1), kind="other"))
+        expected[address] = kind == 0
+    return expected
+
+
+def test_concurrent_replay_matches_mailbox(imap, service):
+    expected = _seed(imap, 40)
+    rng = random.Random(0)
+    addresses = list(expected)
+    recording = _Recording(service)
+
+    latencies = run(_drive_service(recording, lambda: rng.choice(addresses), 8, 1.0))
+
+    assert len(latencies) == len(recording.results) > len(addresses)
+    for address, has_code in recording.results:
+        assert has_code is expected[address], address
+
+
+def test_replay_with_arrivals(imap, service):
+    expected = _seed(imap, 20)
+    addresses = list(expected)
+    arriving = [new_recipient("llegada") for _ in range(5)]
+    rng = random.Random(1)
+    recording = _Recording(service)
+
+    with Arrivals(imap, arriving, [1.0] * len(arriving), 20, rng) as arrivals:
+        run(_drive_service(recording, lambda: rng.choice(addresses), 8, 1.0))
+    assert arrivals.delivered > 0
+
+    for address, has_code in recording.results:
+        assert has_code is expected[address], address
+    delivered = {address for address in arriving
+                 if any(message.raw.find(address.encode()) >= 0
+                        for message in imap.mailbox.snapshot())}
+    results = run(service.check_emails_for_codes(sorted(delivered)))
+    assert all(result["has_code"] for result in results.values())